@@ -1,14 +1,11 @@
 @echo off
-REM ===== COPIA DEL EXCEL =====
-set ORIGEN="C:\gestor_proveedores\Financiero.xlsx"
-set DESTINO="C:\gestor_proveedores\destino\Financiero_%date:~-4%%date:~3,2%%date:~0,2%.xlsx"
-
-REM Copiar con fecha en el nombre para no sobrescribir
-copy %ORIGEN% %DESTINO%
-
 REM ===== INICIO DEL SERVIDOR DJANGO =====
 cd C:\gestor_proveedores
 
+REM ===== RESPALDO INCREMENTAL DEL EXCEL =====
+REM Solo guarda las hojas/filas que cambiaron desde el ultimo respaldo
+python manage.py respaldo crear --origen inicio
+
 REM Obtener la IP local del equipo
 for /f "tokens=2 delims=:" %%i in ('ipconfig ^| findstr /c:"IPv4"') do set IP=%%i
 set IP=%IP: =%
@@ -0,0 +1,30 @@
+import os
+import sys
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+def _calentar_al_arrancar():
+    """
+    True si este proceso debe calentar (ver excelapp/calentamiento.py).
+
+    Los comandos de manage.py no atienden peticiones; con runserver solo
+    calienta el proceso hijo del recargador automático.
+    """
+    if not getattr(settings, 'CALENTAR_AL_ARRANCAR', False):
+        return False
+    if os.path.basename(sys.argv[0]) == 'manage.py':
+        return sys.argv[1:2] == ['runserver'] and (os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv)
+    return True
+
+
+class ExcelappConfig(AppConfig):
+    name = 'excelapp'
+
+    def ready(self):
+        if _calentar_al_arrancar():
+            # Se importa aquí para que los comandos no carguen las hojas ni openpyxl al arrancar
+            from . import calentamiento
+
+            calentamiento.iniciar()
@@ -0,0 +1,416 @@
+"""
+Libros anuales: el Excel activo guarda el año en curso y los años cerrados
+pasan a libros de archivo de solo lectura.
+
+Al rotar un año, las filas de movimientos y gastos con fecha de ese año (o
+anterior) se mueven a `FinancieroG_<año>.xlsx` dentro de RUTA_ARCHIVO y el
+libro activo conserva el resto. Por cada proveedor o cliente con saldo al 31
+de diciembre se agregan al libro activo facturas de saldo inicial (una por
+factura abierta, con su fecha original), así que el resumen, los saldos, la
+antigüedad y las cadenas de facturas siguen cuadrando sin abrir el archivo.
+
+Un manifiesto JSON registra qué años están archivados y, por hoja, el rango
+de fechas, los meses con datos y el último Id. Con eso se sabe sin abrir
+ningún libro si una consulta necesita años archivados; los libros de archivo
+se leen solo entonces y quedan en caché mientras no cambien.
+
+Las cadenas de facturas ya cerradas que se compactan (ver compactacion.py)
+van a otro libro, `FinancieroG_cadenas.xlsx`, con su propio manifiesto; se
+lee igual, solo cuando alguien pide esas filas.
+"""
+import json
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from django.conf import settings
+from openpyxl import Workbook, load_workbook
+
+from . import indices, libros, pendientes, registros, respaldo, saldos
+
+RUTA_ARCHIVO = getattr(settings, 'RUTA_ARCHIVO', os.path.join(settings.BASE_DIR, 'archivo'))
+
+# Hojas que se reparten por año; el resto (resúmenes) queda solo en el libro activo
+HOJAS_ANUALES = ('Proveedores', 'ProveedoresCliente', 'Gastos')
+HOJAS_MOVIMIENTOS = ('Proveedores', 'ProveedoresCliente')
+
+OBS_APERTURA = 'Saldo inicial'
+# La apertura de cada factura abierta guarda su fecha original al final de la observación
+_FECHA_APERTURA = re.compile(r'del (\d{4}-\d{2}-\d{2})$')
+
+_lock = threading.RLock()
+_cache = {'json': {}, 'libros': {}}
+
+
+def _ruta_manifiesto():
+    return os.path.join(RUTA_ARCHIVO, 'archivo.json')
+
+
+def _ruta_libro(sufijo):
+    nombre = os.path.splitext(os.path.basename(settings.RUTA_EXCEL))[0]
+    return os.path.join(RUTA_ARCHIVO, f"{nombre}_{sufijo}.xlsx")
+
+
+def ruta_anio(anio):
+    return _ruta_libro(anio)
+
+
+def _firma(ruta):
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _leer_json(ruta, vacio):
+    """Contenido del JSON, leído de nuevo solo cuando el archivo cambia"""
+    with _lock:
+        firma = _firma(ruta)
+        guardado = _cache['json'].get(ruta)
+        if guardado and guardado[0] == firma:
+            return guardado[1]
+        if firma is None:
+            contenido = vacio
+        else:
+            with open(ruta, encoding='utf-8') as f:
+                contenido = json.load(f)
+        _cache['json'][ruta] = (firma, contenido)
+        return contenido
+
+
+def manifiesto():
+    """Años archivados: {'anios': {'AAAA': {'archivo', 'fecha', 'hojas', 'aperturas'}}}"""
+    return _leer_json(_ruta_manifiesto(), {'anios': {}})
+
+
+def anios_archivados():
+    return sorted(int(anio) for anio in manifiesto()['anios'])
+
+
+def anio_archivado(fecha):
+    """True si la fecha (date, año o 'AAAA-MM') cae en un año que ya pasó al archivo"""
+    anios = anios_archivados()
+    if isinstance(fecha, str):
+        anio = int(fecha[:4])
+    else:
+        anio = fecha if isinstance(fecha, int) else fecha.year
+    return bool(anios) and anio <= anios[-1]
+
+
+def es_apertura(fila):
+    """True si la fila es la factura de saldo inicial que deja la rotación de año"""
+    return len(fila) > 4 and str(fila[4] or '').startswith(OBS_APERTURA)
+
+
+def fecha_apertura(fila):
+    """Fecha de la factura que arrastra una fila de saldo inicial, o None si no es apertura o no la trae"""
+    if not es_apertura(fila):
+        return None
+    match = _FECHA_APERTURA.search(str(fila[4]))
+    return date.fromisoformat(match.group(1)) if match else None
+
+
+def ultimo_id_archivado(sheet_name):
+    """Mayor Id de la hoja en los libros de archivo y en las cadenas compactadas (0 si no hay)"""
+    return max(
+        [datos['hojas'].get(sheet_name, {}).get('ultimo_id', 0) for datos in manifiesto()['anios'].values()]
+        + [manifiesto_cadenas().get(sheet_name, {}).get('ultimo_id', 0)]
+    )
+
+
+def meses_archivados(sheet_name):
+    """Meses con datos de la hoja en los libros de archivo, en orden"""
+    meses = []
+    for anio in anios_archivados():
+        meses.extend(manifiesto()['anios'][str(anio)]['hojas'].get(sheet_name, {}).get('meses', []))
+    return meses
+
+
+def anios_en_rango(desde=None, hasta=None):
+    """
+    Libros de archivo que toca el rango; sin límites de fecha no se consulta el archivo.
+
+    Cada libro guarda su año y los anteriores que no estaban archivados
+    todavía, así que el primero cubre todo lo que hay antes de su año.
+    """
+    if desde is None and hasta is None:
+        return []
+    resultado, anterior = [], None
+    for anio in anios_archivados():
+        if (desde is None or desde.year <= anio) and (hasta is None or anterior is None or hasta.year > anterior):
+            resultado.append(anio)
+        anterior = anio
+    return resultado
+
+
+# Lectura de los libros de archivo
+
+class HojaArchivada:
+    """Filas de una hoja archivada ordenadas por fecha, para resolver rangos con bisect"""
+
+    __slots__ = ('encabezados', 'ordinales', 'filas')
+
+    def __init__(self, encabezados, filas):
+        self.encabezados = encabezados
+        pares = []
+        for fila in filas:
+            fecha = indices.fecha_de_celda(fila[1]) if len(fila) > 1 else None
+            if fecha:
+                pares.append((fecha.toordinal(), indices.id_numerico(fila[0]), fila))
+        pares.sort(key=lambda par: par[:2])
+        self.ordinales = [ordinal for ordinal, _, _ in pares]
+        self.filas = [fila for _, _, fila in pares]
+
+    def en_rango(self, desde=None, hasta=None):
+        inicio = bisect_left(self.ordinales, desde.toordinal()) if desde else 0
+        fin = bisect_right(self.ordinales, hasta.toordinal()) if hasta else len(self.ordinales)
+        return self.filas[inicio:fin]
+
+
+def leer_libro(ruta):
+    """Hojas de un libro de archivo, leído una vez por versión del archivo"""
+    with _lock:
+        firma = _firma(ruta)
+        guardado = _cache['libros'].get(ruta)
+        if guardado and guardado[0] == firma:
+            return guardado[1]
+        hojas = {}
+        if firma is not None:
+            wb = load_workbook(ruta, read_only=True, data_only=True)
+            try:
+                for ws in wb.worksheets:
+                    filas = tuple(ws.iter_rows(values_only=True))
+                    hojas[ws.title] = HojaArchivada(filas[0] if filas else (), filas[1:])
+            finally:
+                wb.close()
+        _cache['libros'][ruta] = (firma, hojas)
+        return hojas
+
+
+def filas_archivadas(sheet_name, desde=None, hasta=None):
+    """Filas archivadas de la hoja dentro del rango, en orden de fecha (abre solo los años necesarios)"""
+    filas = []
+    for anio in anios_en_rango(desde, hasta):
+        hoja = leer_libro(ruta_anio(anio)).get(sheet_name)
+        if hoja:
+            filas.extend(hoja.en_rango(desde, hasta))
+    return filas
+
+
+def registros_archivados(sheet_name, clase, desde=None, hasta=None):
+    """Registros archivados de la hoja dentro del rango"""
+    resultado = []
+    for anio in anios_en_rango(desde, hasta):
+        hoja = leer_libro(ruta_anio(anio)).get(sheet_name)
+        if hoja:
+            resultado.extend(registros.construir_registros(clase, hoja.encabezados, hoja.en_rango(desde, hasta)))
+    return resultado
+
+
+def filas_en_rango(sheet_name, desde=None, hasta=None):
+    """Como indices.filas_en_rango, sumando antes las filas de los años archivados que toca el rango"""
+    activas = indices.filas_en_rango(sheet_name, desde, hasta)
+    archivadas = filas_archivadas(sheet_name, desde, hasta)
+    return archivadas + list(activas) if archivadas else activas
+
+
+def registros_en_rango(sheet_name, clase, desde=None, hasta=None):
+    """Como registros.registros_en_rango, sumando antes los registros de los años archivados"""
+    activos = registros.registros_en_rango(sheet_name, clase, desde, hasta)
+    archivados = registros_archivados(sheet_name, clase, desde, hasta)
+    return archivados + list(activos) if archivados else activos
+
+
+# Cadenas compactadas
+
+def ruta_cadenas():
+    return _ruta_libro('cadenas')
+
+
+def _ruta_manifiesto_cadenas():
+    return os.path.join(RUTA_ARCHIVO, 'cadenas.json')
+
+
+def manifiesto_cadenas():
+    """Cadenas compactadas por hoja: {hoja: {'cadenas', 'huellas', 'ultimo_id'}}"""
+    return _leer_json(_ruta_manifiesto_cadenas(), {})
+
+
+def guardar_manifiesto_cadenas(contenido):
+    libros.escribir_atomico(_ruta_manifiesto_cadenas(), json.dumps(contenido, ensure_ascii=False).encode('utf-8'))
+
+
+def huellas_compactadas(sheet_name):
+    """Huellas de las filas compactadas de cada mes: {'AAAA-MM': [huella, ...]}"""
+    return manifiesto_cadenas().get(sheet_name, {}).get('huellas', {})
+
+
+def totales_compactados(sheet_name):
+    """Facturas y abonos de las cadenas compactadas de cada proveedor: {proveedor: {'facturas', 'abonos'}}"""
+    totales = {}
+    for cadena in manifiesto_cadenas().get(sheet_name, {}).get('cadenas', {}).values():
+        proveedor = totales.setdefault(cadena['proveedor'], {'facturas': 0, 'abonos': 0})
+        proveedor['facturas'] += cadena['facturas']
+        proveedor['abonos'] += cadena['abonos']
+    return totales
+
+
+def filas_compactadas(sheet_name, desde=None, hasta=None):
+    """Filas compactadas de la hoja dentro del rango; el libro se abre solo si el rango toca esos meses"""
+    meses = huellas_compactadas(sheet_name)
+    inicio = f"{desde.year}-{desde.month:02d}" if desde else ''
+    fin = f"{hasta.year}-{hasta.month:02d}" if hasta else '9999-99'
+    if not any(inicio <= mes <= fin for mes in meses):
+        return []
+    hoja = leer_libro(ruta_cadenas()).get(sheet_name)
+    return hoja.en_rango(desde, hasta) if hoja else []
+
+
+def movimientos_de_cadena(sheet_name, proveedor, id_factura):
+    """Registros compactados de una cadena (proveedor + IdFactura), en orden de fecha"""
+    hoja = leer_libro(ruta_cadenas()).get(sheet_name)
+    if not hoja:
+        return []
+    clave = (indices.clave_normalizada(proveedor), indices.clave_normalizada(id_factura))
+    filas = [
+        fila for fila in hoja.filas
+        if (indices.clave_normalizada(fila[2]), indices.clave_normalizada(fila[6])) == clave
+    ]
+    return list(registros.construir_registros(registros.Movimiento, hoja.encabezados, filas))
+
+
+# Rotación de año
+
+def aperturas(sheet_name, anio):
+    """
+    Facturas de saldo inicial para el año siguiente, con el saldo de cada proveedor al 31/12.
+
+    Cada factura que seguía abierta al 31/12 tiene su propia apertura, con la
+    fecha original en la observación, para que la antigüedad de saldos siga
+    contando desde esa fecha; un saldo a favor o en cero queda en una sola
+    fila. Si el proveedor tiene filas activas en el año, las aperturas entran
+    en esa cadena como activas y las reemplazan en el resumen (aunque el saldo
+    sea cero, para que siga apareciendo). Si su cadena activa empezó después,
+    la factura de esa cadena ya arrastra el saldo anterior y las aperturas
+    quedan inactivas: solo cuentan para los saldos por fecha.
+    """
+    corte = date(anio, 12, 31)
+    filas = indices.leer_hoja(sheet_name)
+    resultado = []
+    for cuenta in saldos.cuentas(sheet_name).values():
+        fin = bisect_right(cuenta.ordinales, corte.toordinal())
+        del_anio = [filas[p] for p in cuenta.posiciones[:fin]]
+        activas = [fila for fila in del_anio if len(fila) > 7 and str(fila[7] or '').lower() == 'activa']
+        saldo = cuenta.saldo_al(corte)
+        if not del_anio or not (saldo or activas):
+            continue
+        vigente = (activas or del_anio)[-1]
+        id_factura, estado = vigente[6] if len(vigente) > 6 else '', 'Activa' if activas else 'Inactiva'
+        obs = f"{OBS_APERTURA} {anio + 1}"
+        abiertas = cuenta.facturas_abiertas(fin, saldo)[0]
+        montos = [
+            (f"{obs} - factura {factura or 's/n'} del {date.fromordinal(ordinal).isoformat()}", pendiente)
+            for ordinal, factura, pendiente in abiertas
+        ] or [(obs, saldo)]
+        for observacion, monto in montos:
+            resultado.append([
+                None, datetime(anio + 1, 1, 1), cuenta.proveedor, 'Factura', observacion, monto, id_factura, estado,
+            ])
+    return resultado
+
+
+def _por_proveedor(filas):
+    """Saldo inicial de cada proveedor, sumando sus aperturas"""
+    saldos_iniciales = {}
+    for fila in filas:
+        saldos_iniciales[str(fila[2])] = saldos_iniciales.get(str(fila[2]), 0) + fila[5]
+    return saldos_iniciales
+
+
+def rotar_anio(anio):
+    """
+    Pasa las filas del año `anio` y anteriores a su libro de archivo.
+
+    Antes de tocar el libro activo se crea un respaldo. Devuelve un resumen
+    con las filas archivadas y las aperturas agregadas por hoja.
+    """
+    if anio >= date.today().year:
+        raise ValueError(f"El año {anio} todavía no ha terminado")
+    if anio_archivado(anio):
+        raise ValueError(f"El año {anio} ya está archivado")
+    rutas_activas = sorted({libros.ruta_hoja(sheet_name) for sheet_name in HOJAS_ANUALES})
+    if not all(os.path.exists(ruta) for ruta in rutas_activas):
+        raise ValueError("No existe el archivo Excel activo")
+
+    # Con el candado de la cola tomado durante toda la rotación nadie encola ni
+    # aplica cambios entre la revisión y la reescritura de los libros activos
+    with pendientes._lock, _lock:
+        if pendientes.hay_pendientes(HOJAS_ANUALES):
+            raise ValueError("Hay cambios pendientes de escribir en el Excel; espere a que se guarden")
+
+        for ruta in rutas_activas:
+            respaldo.crear_instantanea(ruta, origen=f'rotacion:{anio}')
+
+        nuevas = {sheet_name: aperturas(sheet_name, anio) for sheet_name in HOJAS_MOVIMIENTOS}
+        siguiente_id = {sheet_name: indices.ultimo_id(sheet_name) for sheet_name in HOJAS_MOVIMIENTOS}
+
+        activos = {ruta: load_workbook(ruta) for ruta in rutas_activas}
+        archivado = Workbook()
+        archivado.remove(archivado.active)
+
+        hojas, resumen = {}, {}
+        for sheet_name in HOJAS_ANUALES:
+            activo = activos[libros.ruta_hoja(sheet_name)]
+            if sheet_name not in activo.sheetnames:
+                continue
+            ws = activo[sheet_name]
+            filas = list(ws.iter_rows(values_only=True))
+            encabezados, datos = (filas[0], filas[1:]) if filas else ((), [])
+            viejas, quedan = [], []
+            for fila in datos:
+                fecha = indices.fecha_de_celda(fila[1]) if len(fila) > 1 else None
+                (viejas if fecha and fecha.year <= anio else quedan).append(fila)
+
+            destino = archivado.create_sheet(sheet_name)
+            destino.append(encabezados)
+            for fila in viejas:
+                destino.append(fila)
+
+            aperturas_hoja = nuevas.get(sheet_name, [])
+            for apertura in aperturas_hoja:
+                siguiente_id[sheet_name] += 1
+                apertura[0] = siguiente_id[sheet_name]
+            if ws.max_row > 1:
+                ws.delete_rows(2, ws.max_row)
+            for fila in aperturas_hoja + quedan:
+                ws.append(fila)
+
+            fechas = sorted(indices.fecha_de_celda(fila[1]) for fila in viejas)
+            hojas[sheet_name] = {
+                'filas': len(viejas),
+                'ultimo_id': max((indices.id_numerico(fila[0]) for fila in viejas), default=0),
+                'desde': fechas[0].isoformat() if fechas else None,
+                'hasta': fechas[-1].isoformat() if fechas else None,
+                'meses': sorted({f"{f.year}-{f.month:02d}" for f in fechas}),
+            }
+            resumen[sheet_name] = {'archivadas': len(viejas), 'aperturas': len(aperturas_hoja)}
+
+        # Primero el archivo; los libros activos solo se reescriben si el archivo quedó en disco
+        libros.guardar_libro(archivado, ruta_anio(anio))
+        for ruta, activo in activos.items():
+            libros.guardar_libro(activo, ruta)
+
+        datos_manifiesto = json.loads(json.dumps(manifiesto()))
+        datos_manifiesto['anios'][str(anio)] = {
+            'archivo': os.path.basename(ruta_anio(anio)),
+            'fecha': datetime.now().isoformat(),
+            'hojas': hojas,
+            'aperturas': {
+                sheet_name: _por_proveedor(filas) for sheet_name, filas in nuevas.items()
+            },
+        }
+        libros.escribir_atomico(_ruta_manifiesto(), json.dumps(datos_manifiesto, ensure_ascii=False).encode('utf-8'))
+        return resumen
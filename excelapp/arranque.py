@@ -0,0 +1,87 @@
+"""
+Tiempo de arranque del proceso.
+
+Cada comando y cada worker pagan al iniciar la importación de Django, de la
+aplicación y de sus dependencias. `medir` arranca un intérprete nuevo con
+`python -X importtime`, importa lo mismo que un worker (django.setup() y las
+vistas) y devuelve el tiempo total y lo que tarda cada paquete. Cada medición
+se agrega a RUTA_METRICAS/arranque.jsonl para seguir la métrica entre
+versiones y ver si alguna dependencia pesada volvió a cargarse al arrancar.
+"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from django.conf import settings
+
+RUTA_METRICAS = getattr(settings, 'RUTA_METRICAS', os.path.join(settings.BASE_DIR, 'metricas'))
+
+# Lo que importa un worker al arrancar
+CODIGO = 'import django; django.setup(); import excelapp.views, excelapp.urls'
+
+
+def ruta_registro():
+    return os.path.join(RUTA_METRICAS, 'arranque.jsonl')
+
+
+def _leer_importtime(salida):
+    """{paquete: microsegundos} y el total, de la salida de -X importtime"""
+    paquetes, total = {}, 0
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:'):
+            continue
+        propio, _, nombre = linea[len('import time:'):].split('|')
+        if not propio.strip().isdigit():
+            continue  # encabezado
+        # Se suma el tiempo propio de cada módulo a su paquete, lo importe quien lo importe
+        paquete = nombre.strip().split('.')[0]
+        paquetes[paquete] = paquetes.get(paquete, 0) + int(propio)
+        total += int(propio)
+    return paquetes, total
+
+
+def medir(repeticiones=3):
+    """
+    Mide la importación en `repeticiones` intérpretes nuevos y se queda con la más rápida.
+
+    Devuelve {'total_ms', 'paquetes': {paquete: ms}}.
+    """
+    entorno = dict(os.environ)
+    entorno.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    mejor = None
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CODIGO],
+            cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+        )
+        if proceso.returncode != 0:
+            raise RuntimeError(proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'falló')
+        paquetes, total = _leer_importtime(proceso.stderr)
+        if mejor is None or total < mejor[1]:
+            mejor = (paquetes, total)
+    paquetes, total = mejor
+    return {
+        'total_ms': round(total / 1000, 1),
+        'paquetes': {paquete: round(micro / 1000, 1) for paquete, micro in paquetes.items()},
+    }
+
+
+def anterior():
+    """Última medición registrada, o None"""
+    try:
+        with open(ruta_registro(), encoding='utf-8') as f:
+            lineas = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    return json.loads(lineas[-1]) if lineas else None
+
+
+def registrar(medicion):
+    """Agrega la medición al registro, con la fecha"""
+    os.makedirs(RUTA_METRICAS, exist_ok=True)
+    registro = {'fecha': datetime.now().isoformat(timespec='seconds'), **medicion}
+    with open(ruta_registro(), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    return registro
@@ -0,0 +1,213 @@
+"""
+Búsqueda de texto sobre movimientos y gastos mediante un índice invertido.
+
+Cada fila es un documento; sus términos (observación, proveedor, IdFactura,
+placa, conductor...) apuntan al documento en el índice. Una consulta solo
+recorre las listas de los términos buscados, así que el tiempo no crece con
+el tamaño de la historia sino con la cantidad de coincidencias.
+
+El índice se mantiene de forma incremental: cuando la hoja cambia se
+comparan las filas nuevas con las indexadas y solo se vuelven a tokenizar
+las que se agregaron, modificaron o eliminaron.
+"""
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from . import indices
+
+# Hoja -> (tipo, {columna: peso}); los pesos favorecen coincidencias en campos clave
+FUENTES = {
+    'Proveedores': ('Proveedor', {2: 3.0, 6: 3.0, 4: 1.0, 3: 0.5}),
+    'ProveedoresCliente': ('Cliente', {2: 3.0, 6: 3.0, 4: 1.0, 3: 0.5}),
+    'Gastos': ('Gasto', {3: 3.0, 4: 3.0, 2: 1.0}),
+}
+
+_TERMINO = re.compile(r'[a-z0-9]+(?:-[a-z0-9]+)*')
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes, para que 'Garcia' encuentre 'García'"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return texto.lower()
+
+
+def tokenizar(texto):
+    """Términos de un texto; 'F-001' produce 'f-001', 'f' y '001'"""
+    terminos = []
+    for termino in _TERMINO.findall(normalizar_texto(texto)):
+        terminos.append(termino)
+        if '-' in termino:
+            terminos.extend(parte for parte in termino.split('-') if parte)
+    return terminos
+
+
+class IndiceInvertido:
+    """Listas de documentos por término con frecuencias ponderadas por campo"""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)   # termino -> {doc: peso}
+        self.documentos = {}                # doc -> (fila, {termino: peso})
+        self.vocabulario = []               # términos ordenados, para búsqueda por prefijo
+        self._vocabulario_sucio = False
+
+    def _pesos(self, fila, columnas):
+        pesos = defaultdict(float)
+        for columna, peso in columnas.items():
+            if columna < len(fila) and fila[columna] not in (None, ''):
+                for termino in tokenizar(fila[columna]):
+                    pesos[termino] += peso
+        return pesos
+
+    def agregar(self, doc, fila, columnas):
+        pesos = self._pesos(fila, columnas)
+        self.documentos[doc] = (fila, pesos)
+        for termino, peso in pesos.items():
+            if termino not in self.postings:
+                self._vocabulario_sucio = True
+            self.postings[termino][doc] = peso
+
+    def quitar(self, doc):
+        _, pesos = self.documentos.pop(doc)
+        for termino in pesos:
+            lista = self.postings[termino]
+            lista.pop(doc, None)
+            if not lista:
+                del self.postings[termino]
+                self._vocabulario_sucio = True
+
+    def terminos_con_prefijo(self, prefijo):
+        if self._vocabulario_sucio:
+            self.vocabulario = sorted(self.postings)
+            self._vocabulario_sucio = False
+        i = bisect_left(self.vocabulario, prefijo)
+        while i < len(self.vocabulario) and self.vocabulario[i].startswith(prefijo):
+            yield self.vocabulario[i]
+            i += 1
+
+
+_lock = threading.Lock()
+_indice = IndiceInvertido()
+_filas_indexadas = {}   # hoja -> tupla de filas ya indexada
+
+
+def _clave_documento(sheet_name, posicion, fila):
+    identificador = fila[0] if fila and fila[0] is not None else f'#{posicion}'
+    return (sheet_name, identificador)
+
+
+def sincronizar():
+    """Aplica al índice solo las filas que cambiaron desde la última versión indexada"""
+    with _lock:
+        for sheet_name, (_, columnas) in FUENTES.items():
+            filas = indices.leer_hoja(sheet_name)
+            if _filas_indexadas.get(sheet_name) is filas:
+                continue
+
+            actuales = {_clave_documento(sheet_name, p, fila): fila for p, fila in enumerate(filas)}
+            for doc in [d for d in _indice.documentos if d[0] == sheet_name and d not in actuales]:
+                _indice.quitar(doc)
+            for doc, fila in actuales.items():
+                anterior = _indice.documentos.get(doc)
+                if anterior is not None and anterior[0] == fila:
+                    continue
+                if anterior is not None:
+                    _indice.quitar(doc)
+                _indice.agregar(doc, fila, columnas)
+
+            _filas_indexadas[sheet_name] = filas
+
+
+def _a_resultado(doc, fila, puntaje):
+    sheet_name = doc[0]
+    tipo = FUENTES[sheet_name][0]
+    fila = tuple(fila) + ('',) * (8 - len(fila))
+    fecha = fila[1]
+    resultado = {
+        'tipo': tipo,
+        'id': fila[0],
+        'fecha': fecha.date().isoformat() if hasattr(fecha, 'date') else (str(fecha) if fecha else ''),
+        'puntaje': round(puntaje, 3),
+    }
+    if tipo == 'Gasto':
+        resultado.update({
+            'titulo': f"{fila[2]} - {fila[3] or ''}".strip(' -'),
+            'descripcion': fila[4] or '',
+            'total': fila[5] or 0,
+        })
+    else:
+        resultado.update({
+            'titulo': fila[2] or '',
+            'descripcion': f"{fila[3] or ''} {fila[6] or ''} - {fila[4] or ''}".strip(' -'),
+            'total': fila[5] or 0,
+            'id_factura': fila[6] or '',
+            'estado': fila[7] or '',
+        })
+    return resultado
+
+
+def buscar(consulta, pagina=1, por_pagina=20, tipo=None):
+    """
+    Busca documentos que contengan todos los términos de la consulta.
+
+    El último término se toma como prefijo para que la búsqueda funcione
+    mientras se escribe. Los resultados se ordenan por TF-IDF y se paginan.
+    """
+    sincronizar()
+    # En la consulta 'F-00' se conserva entero para que funcione como prefijo de 'f-001'
+    terminos = list(dict.fromkeys(_TERMINO.findall(normalizar_texto(consulta))))
+    if not terminos:
+        return {'consulta': consulta, 'total': 0, 'pagina': 1, 'paginas': 0, 'resultados': []}
+
+    with _lock:
+        total_documentos = len(_indice.documentos) or 1
+        listas = []
+        for termino in terminos:
+            if termino == terminos[-1]:
+                # Prefijo: unir las listas de todos los términos que empiezan así
+                combinada = {}
+                for variante in _indice.terminos_con_prefijo(termino):
+                    for doc, peso in _indice.postings[variante].items():
+                        combinada[doc] = max(combinada.get(doc, 0), peso)
+            else:
+                combinada = _indice.postings.get(termino, {})
+            listas.append(combinada)
+
+        listas.sort(key=len)
+        candidatos = set(listas[0]) if listas else set()
+        for lista in listas[1:]:
+            candidatos.intersection_update(lista)
+            if not candidatos:
+                break
+
+        if tipo:
+            candidatos = {doc for doc in candidatos if FUENTES[doc[0]][0].lower() == tipo.lower()}
+
+        puntajes = []
+        for doc in candidatos:
+            puntaje = 0.0
+            for lista in listas:
+                idf = math.log(1 + total_documentos / len(lista))
+                puntaje += lista[doc] * idf
+            puntajes.append((puntaje, doc))
+
+        puntajes.sort(key=lambda par: (-par[0], str(par[1])))
+        paginas = max(1, math.ceil(len(puntajes) / por_pagina))
+        pagina = min(max(1, pagina), paginas)
+        inicio = (pagina - 1) * por_pagina
+
+        resultados = [
+            _a_resultado(doc, _indice.documentos[doc][0], puntaje)
+            for puntaje, doc in puntajes[inicio:inicio + por_pagina]
+        ]
+
+    return {
+        'consulta': consulta,
+        'total': len(puntajes),
+        'pagina': pagina,
+        'paginas': paginas,
+        'resultados': resultados,
+    }
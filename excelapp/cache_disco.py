@@ -0,0 +1,91 @@
+"""
+Copia en disco de la caché de hojas para arrancar sin volver a leer el Excel.
+
+Junto a cada libro se guarda `<libro>.cache`: las filas ya interpretadas de
+sus hojas, los encabezados, los índices que dependen solo de esas filas y
+las huellas de las partes del zip con que se leyeron. Al arrancar, indices.py
+toma esta copia como lectura anterior y la valida contra las huellas del
+libro: las hojas cuya parte no cambió se usan tal cual y solo las demás se
+vuelven a leer.
+
+El formato es pickle comprimido, pero al cargarlo solo se aceptan las clases
+de fechas y las de índices y registros de la aplicación.
+"""
+import datetime
+import decimal
+import hashlib
+import io
+import os
+import pickle
+import zlib
+
+from . import libros
+
+_CABECERA = b'GANADO-CACHE-1\n'
+
+_CLASES_PERMITIDAS = {
+    ('datetime', 'datetime'): datetime.datetime,
+    ('datetime', 'date'): datetime.date,
+    ('datetime', 'time'): datetime.time,
+    ('datetime', 'timedelta'): datetime.timedelta,
+    ('decimal', 'Decimal'): decimal.Decimal,
+    ('builtins', 'set'): set,
+    ('builtins', 'frozenset'): frozenset,
+}
+
+
+def ruta_cache(ruta):
+    return f"{ruta}.cache"
+
+
+def _version_codigo():
+    """
+    Identifica el código de la aplicación con que se armaron los índices.
+
+    Si cambia algún módulo (por ejemplo la clave de un índice ordenado o los
+    campos de un registro) la copia guardada deja de valer.
+    """
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for entrada in sorted(os.scandir(carpeta), key=lambda e: e.name):
+        if entrada.name.endswith('.py'):
+            stat = entrada.stat()
+            h.update(f"{entrada.name}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    return h.hexdigest()[:16].encode('ascii')
+
+
+class _Cargador(pickle.Unpickler):
+    def find_class(self, modulo, nombre):
+        if (modulo, nombre) in _CLASES_PERMITIDAS:
+            return _CLASES_PERMITIDAS[modulo, nombre]
+        if modulo in ('excelapp.indices', 'excelapp.registros'):
+            from . import indices, registros
+            clase = getattr(indices if modulo == 'excelapp.indices' else registros, nombre, None)
+            if clase in (indices.IndiceOrdenado, indices.IndiceFechas) or (
+                isinstance(clase, type) and issubclass(clase, registros.Registro)
+            ):
+                return clase
+        raise pickle.UnpicklingError(f"Clase no permitida en la caché: {modulo}.{nombre}")
+
+
+def cargar(ruta):
+    """Estado guardado para el libro, o None si no hay copia o no se puede leer"""
+    try:
+        with open(ruta_cache(ruta), 'rb') as f:
+            contenido = f.read()
+    except OSError:
+        return None
+    cabecera = _CABECERA + _version_codigo() + b'\n'
+    if not contenido.startswith(cabecera):
+        return None
+    try:
+        return _Cargador(io.BytesIO(zlib.decompress(contenido[len(cabecera):]))).load()
+    except Exception as e:
+        print(f"Error al leer la caché de {ruta}: {e}")
+        return None
+
+
+def guardar(ruta, estado):
+    """Escribe la copia del estado del libro (huellas, hojas, encabezados e índices persistentes)"""
+    contenido = pickle.dumps(estado, protocol=pickle.HIGHEST_PROTOCOL)
+    libros.escribir_atomico(ruta_cache(ruta), _CABECERA + _version_codigo() + b'\n' + zlib.compress(contenido, 1))
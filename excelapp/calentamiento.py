@@ -0,0 +1,127 @@
+"""
+Calentamiento del servidor al arrancar.
+
+Después de reiniciar, la primera petición paga todo lo que está frío: leer
+el Excel, construir los índices, calcular los agregados y renderizar las
+plantillas. Con CALENTAR_AL_ARRANCAR, ExcelappConfig.ready (apps.py) hace ese
+trabajo en un hilo en segundo plano, por etapas, mientras el servidor ya
+atiende. La vista `listo` devuelve el avance con lo que tardó cada etapa,
+para usarla como sonda de disponibilidad.
+"""
+import threading
+import time
+from datetime import datetime
+
+from django.db import connections
+
+from . import busqueda, cierres, indices, libros, registros, replica, saldos
+
+# Páginas que se renderizan al final: el inicio con sus KPI y los listados,
+# que construyen sus índices de paginación
+PAGINAS = (
+    '/',
+    '/proveedores/movimiento/agregar/',
+    '/clientes/movimiento/agregar/',
+    '/proveedores/movimientos/',
+    '/clientes/movimientos/',
+    '/gastos/',
+)
+
+_lock = threading.Lock()
+_estado = {'estado': 'desactivado', 'inicio': None, 'fin': None, 'total_ms': None, 'etapas': []}
+
+
+def _instantaneas():
+    """Lee las hojas de todos los archivos y arma sus registros"""
+    for hojas in libros.HOJAS_POR_ENTIDAD.values():
+        for sheet_name in hojas:
+            indices.leer_hoja(sheet_name)
+    for sheet_name, (_, clase, _) in replica.TABLAS.items():
+        registros.registros_hoja(sheet_name, clase)
+
+
+def _indices():
+    """Índices de fechas, búsqueda y cuentas por proveedor"""
+    for sheet_name in cierres.HOJAS:
+        indices.indice_fechas(sheet_name)
+    busqueda.sincronizar()
+    for sheet_name, tipo in cierres.HOJAS.items():
+        if tipo == 'movimientos':
+            saldos.cuentas(sheet_name)
+
+
+def _agregados():
+    """Agregados mensuales de los dashboards (cierres y mes abierto)"""
+    for sheet_name in cierres.HOJAS:
+        cierres.agregados_mensuales(sheet_name)
+
+
+def _paginas():
+    """Renderiza las páginas de PAGINAS sin pasar por la red"""
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    fabrica = RequestFactory()
+    for ruta in PAGINAS:
+        coincidencia = resolve(ruta)
+        coincidencia.func(fabrica.get(ruta), *coincidencia.args, **coincidencia.kwargs)
+
+
+def _replica():
+    # ready() corre antes de que wsgi.py llame a replica.iniciar: el esquema se prepara aquí también
+    if replica.activa():
+        replica.preparar()
+        replica.sincronizar()
+
+
+ETAPAS = (
+    ('instantaneas', _instantaneas),
+    ('indices', _indices),
+    ('agregados', _agregados),
+    ('replica', _replica),
+    ('paginas', _paginas),
+)
+
+
+def estado():
+    """Copia del avance: estado ('desactivado', 'en_curso', 'listo' o 'con_errores') y cada etapa"""
+    with _lock:
+        return {**_estado, 'listo': _estado['estado'] != 'en_curso', 'etapas': list(_estado['etapas'])}
+
+
+def calentar():
+    """Corre las etapas en orden; un error en una etapa se anota y se sigue con la siguiente"""
+    with _lock:
+        _estado.update(estado='en_curso', inicio=datetime.now().isoformat(timespec='seconds'), etapas=[])
+    comienzo = time.perf_counter()
+    errores = 0
+    try:
+        for nombre, etapa in ETAPAS:
+            inicio = time.perf_counter()
+            resultado = {'etapa': nombre}
+            try:
+                etapa()
+            except Exception as e:
+                print(f"Error al calentar ({nombre}): {e}")
+                resultado['error'] = str(e)
+                errores += 1
+            resultado['ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            with _lock:
+                _estado['etapas'].append(resultado)
+    finally:
+        connections.close_all()
+        with _lock:
+            _estado.update(
+                estado='con_errores' if errores else 'listo',
+                fin=datetime.now().isoformat(timespec='seconds'),
+                total_ms=round((time.perf_counter() - comienzo) * 1000, 1),
+            )
+
+
+def iniciar():
+    """Arranca el calentamiento en segundo plano (ExcelappConfig.ready lo llama si corresponde)"""
+    with _lock:
+        if _estado['estado'] == 'en_curso':
+            return
+        _estado['estado'] = 'en_curso'
+    threading.Thread(target=calentar, name='calentamiento', daemon=True).start()
@@ -0,0 +1,307 @@
+"""
+Cierres mensuales: agregados por mes congelados en archivos JSON.
+
+Al cerrar un mes se guardan, para las hojas de movimientos de proveedores y
+clientes y para la de gastos, los totales del mes (facturas y abonos por
+proveedor; gastos por categoría, placa y conductor) junto con una huella de
+las filas del mes. Los reportes toman los meses cerrados de estos archivos y
+solo calculan en vivo los meses abiertos o los que el rango de fechas corta
+a la mitad.
+
+Los meses de años ya archivados (ver archivo.py) conservan su último cierre:
+sus filas salieron del libro activo, así que no se revisan ni se vuelven a
+cerrar, y los reportes solo abren el libro del año si falta el cierre.
+
+Los cierres no se modifican: volver a cerrar un mes escribe una versión
+nueva que deja registrado qué hojas cambiaron. Cuando un guardado altera
+filas de un mes cerrado, su huella deja de coincidir y el mes se vuelve a
+cerrar automáticamente (solo ese mes).
+"""
+import calendar
+import hashlib
+import json
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from django.conf import settings
+
+from . import archivo, dinero, indices, libros
+
+RUTA_CIERRES = getattr(settings, 'RUTA_CIERRES', os.path.join(settings.BASE_DIR, 'cierres'))
+
+# Hojas que se cierran y el tipo de agregado de cada una
+HOJAS = {
+    'Proveedores': 'movimientos',
+    'ProveedoresCliente': 'movimientos',
+    'Gastos': 'gastos',
+}
+
+_ARCHIVO = re.compile(r'^(\d{4}-\d{2})\.v(\d+)\.json$')
+
+_lock = threading.Lock()
+_cache = {'firma': None, 'cierres': {}}
+
+
+def clave_mes(fecha):
+    return f"{fecha.year}-{fecha.month:02d}"
+
+
+def rango_mes(mes):
+    """Primer y último día del mes 'AAAA-MM'"""
+    anio, numero = map(int, mes.split('-'))
+    return date(anio, numero, 1), date(anio, numero, calendar.monthrange(anio, numero)[1])
+
+
+def meses_entre(desde, hasta):
+    """Claves de los meses desde la fecha `desde` hasta la fecha `hasta` (inclusive)"""
+    anio, numero = desde.year, desde.month
+    meses = []
+    while (anio, numero) <= (hasta.year, hasta.month):
+        meses.append(f"{anio}-{numero:02d}")
+        anio, numero = (anio + 1, 1) if numero == 12 else (anio, numero + 1)
+    return meses
+
+
+# Agregados
+
+def agregar_movimientos(filas):
+    """Facturas y abonos del conjunto de filas, en total y por proveedor"""
+    agregado = {'cantidad': 0, 'facturas': 0, 'abonos': 0, 'por_proveedor': {}}
+    for fila in filas:
+        if len(fila) < 6:
+            continue
+        detalle, total = fila[3], dinero.a_pesos(fila[5])
+        if detalle not in ('Factura', 'Abono') or archivo.es_apertura(fila):
+            continue
+        campo = 'facturas' if detalle == 'Factura' else 'abonos'
+        proveedor = agregado['por_proveedor'].setdefault(str(fila[2] or ''), {'facturas': 0, 'abonos': 0})
+        proveedor[campo] += total
+        agregado[campo] += total
+        agregado['cantidad'] += 1
+    return agregado
+
+
+def agregar_gastos(filas):
+    """Total de gastos del conjunto de filas y su reparto por categoría, placa y conductor"""
+    agregado = {'cantidad': 0, 'total': 0, 'por_categoria': {}, 'por_placa': {}, 'por_conductor': {}}
+    for fila in filas:
+        if len(fila) < 6:
+            continue
+        precio = dinero.a_pesos(fila[5])
+        agregado['cantidad'] += 1
+        agregado['total'] += precio
+        for campo, valor in (('por_categoria', fila[2]), ('por_placa', fila[3]), ('por_conductor', fila[4])):
+            if valor:
+                agregado[campo][str(valor)] = agregado[campo].get(str(valor), 0) + precio
+    return agregado
+
+
+_AGREGADORES = {'movimientos': agregar_movimientos, 'gastos': agregar_gastos}
+
+
+def _filas_entre(sheet_name, desde, hasta):
+    if archivo.anio_archivado(desde):
+        return archivo.filas_archivadas(sheet_name, desde, hasta)
+    filas = indices.leer_hoja(sheet_name)
+    activas = [filas[p] for p in indices.indice_fechas(sheet_name).posiciones_en_rango(desde, hasta)]
+    return archivo.filas_compactadas(sheet_name, desde, hasta) + activas
+
+
+def agregado_vivo(sheet_name, mes, desde=None, hasta=None):
+    """Agregado calculado desde el Excel para el mes (o la parte del mes dentro del rango)"""
+    inicio, fin = rango_mes(mes)
+    desde, hasta = max(inicio, desde or inicio), min(fin, hasta or fin)
+    agregar = _AGREGADORES[HOJAS[sheet_name]]
+    if (desde, hasta) == (inicio, fin):
+        return indices.obtener_indice(
+            sheet_name, f'mes:{mes}', lambda _: agregar(_filas_entre(sheet_name, inicio, fin)),
+        )
+    return agregar(_filas_entre(sheet_name, desde, hasta))
+
+
+def huellas_mes(sheet_name):
+    """Huella de las filas de cada mes de la hoja, calculada una vez por versión del archivo"""
+    def construir(filas):
+        por_mes = {}
+        indice = indices.indice_fechas(sheet_name)
+        for ordinal, posicion in zip(indice.ordinales, indice.posiciones):
+            mes = clave_mes(date.fromordinal(ordinal))
+            por_mes.setdefault(mes, hashlib.sha256()).update(repr(filas[posicion]).encode('utf-8'))
+        for mes, huellas in archivo.huellas_compactadas(sheet_name).items():
+            for huella in huellas:
+                por_mes.setdefault(mes, hashlib.sha256()).update(huella.encode('ascii'))
+        return {mes: h.hexdigest() for mes, h in por_mes.items()}
+
+    return indices.obtener_indice(sheet_name, 'huellas_mes', construir)
+
+
+def huella_vacia():
+    return hashlib.sha256().hexdigest()
+
+
+# Almacén de cierres
+
+def _firma_carpeta():
+    try:
+        return os.stat(RUTA_CIERRES).st_mtime_ns
+    except OSError:
+        return None
+
+
+def cierres():
+    """Último cierre de cada mes: {'AAAA-MM': cierre}"""
+    with _lock:
+        firma = _firma_carpeta()
+        if firma != _cache['firma']:
+            vigentes = {}
+            if firma is not None:
+                for nombre in os.listdir(RUTA_CIERRES):
+                    coincidencia = _ARCHIVO.match(nombre)
+                    if not coincidencia:
+                        continue
+                    mes, version = coincidencia.group(1), int(coincidencia.group(2))
+                    if mes not in vigentes or version > vigentes[mes][0]:
+                        vigentes[mes] = (version, nombre)
+            cargados = {}
+            for mes, (version, nombre) in vigentes.items():
+                anterior = _cache['cierres'].get(mes)
+                if anterior and anterior['version'] == version:
+                    cargados[mes] = anterior
+                else:
+                    with open(os.path.join(RUTA_CIERRES, nombre), encoding='utf-8') as f:
+                        cargados[mes] = json.load(f)
+            _cache['firma'] = firma
+            _cache['cierres'] = cargados
+        return _cache['cierres']
+
+
+def mes_cerrado(fecha):
+    """True si el mes de la fecha (date o 'AAAA-MM') ya tiene cierre"""
+    mes = fecha if isinstance(fecha, str) else clave_mes(fecha)
+    return mes in cierres()
+
+
+def cerrar_mes(mes, origen='manual'):
+    """
+    Congela los agregados del mes en una versión nueva de su cierre.
+
+    No se cierran el mes en curso ni meses futuros. Devuelve el cierre escrito.
+    """
+    if rango_mes(mes)[1] >= date.today():
+        raise ValueError(f"El mes {mes} todavía no ha terminado")
+    if archivo.anio_archivado(mes):
+        raise ValueError(f"El mes {mes} pertenece a un año archivado")
+
+    anterior = cierres().get(mes)
+    hojas = {}
+    for sheet_name in HOJAS:
+        hojas[sheet_name] = {
+            'huella': huellas_mes(sheet_name).get(mes, huella_vacia()),
+            'agregado': agregado_vivo(sheet_name, mes),
+        }
+
+    cierre = {
+        'mes': mes,
+        'version': anterior['version'] + 1 if anterior else 1,
+        'fecha': datetime.now().isoformat(),
+        'origen': origen,
+        'hojas': hojas,
+        'alteradas': [
+            sheet_name for sheet_name in HOJAS
+            if anterior and anterior['hojas'].get(sheet_name, {}).get('huella') != hojas[sheet_name]['huella']
+        ],
+    }
+    ruta = os.path.join(RUTA_CIERRES, f"{mes}.v{cierre['version']}.json")
+    libros.escribir_atomico(ruta, json.dumps(cierre, ensure_ascii=False).encode('utf-8'))
+    return cierre
+
+
+def meses_pendientes():
+    """Meses ya terminados con datos que todavía no tienen cierre"""
+    con_datos = set()
+    for sheet_name in HOJAS:
+        con_datos.update(huellas_mes(sheet_name))
+    actual = clave_mes(date.today())
+    cerrados = cierres()
+    return sorted(mes for mes in con_datos if mes < actual and mes not in cerrados)
+
+
+def cerrar_pendientes(origen='manual'):
+    """Cierra todos los meses terminados que no tienen cierre; devuelve los meses cerrados"""
+    return [cerrar_mes(mes, origen)['mes'] for mes in meses_pendientes()]
+
+
+def meses_alterados(hojas=None):
+    """Meses cerrados cuyas filas cambiaron desde el cierre: {'AAAA-MM': [hojas]}"""
+    alterados = {}
+    for mes, cierre in cierres().items():
+        if archivo.anio_archivado(mes):
+            continue
+        for sheet_name in hojas or HOJAS:
+            actual = huellas_mes(sheet_name).get(mes, huella_vacia())
+            if cierre['hojas'].get(sheet_name, {}).get('huella') != actual:
+                alterados.setdefault(mes, []).append(sheet_name)
+    return alterados
+
+
+def recerrar_alterados(sheet_name=None, origen='recierre'):
+    """
+    Vuelve a cerrar solo los meses cerrados cuyas filas cambiaron.
+
+    Con `sheet_name` se revisa solo esa hoja (la que se acaba de guardar).
+    Devuelve los meses que se volvieron a cerrar.
+    """
+    if not cierres() or (sheet_name and sheet_name not in HOJAS):
+        return []
+    alterados = meses_alterados([sheet_name] if sheet_name else None)
+    for mes in sorted(alterados):
+        cerrar_mes(mes, origen)
+    return sorted(alterados)
+
+
+# Consultas para los reportes
+
+def agregados_mensuales(sheet_name, desde=None, hasta=None):
+    """
+    Agregado de cada mes con datos de la hoja dentro del rango, en orden.
+
+    Los meses cerrados que quedan completos dentro del rango salen del
+    cierre mientras su huella coincida con la de las filas actuales; el resto
+    (y los meses que cambiaron sin volver a cerrarse, por ejemplo editados
+    directamente en Excel o con el guardado todavía en la cola) se calcula
+    desde el Excel (o desde el libro de archivo del año, si el mes ya se
+    archivó).
+    """
+    indice = indices.indice_fechas(sheet_name)
+    inicio = bisect_left(indice.ordinales, desde.toordinal()) if desde else 0
+    fin = bisect_right(indice.ordinales, hasta.toordinal()) if hasta else len(indice.ordinales)
+
+    meses = [
+        mes for mes in archivo.meses_archivados(sheet_name)
+        if (desde is None or rango_mes(mes)[1] >= desde) and (hasta is None or rango_mes(mes)[0] <= hasta)
+    ]
+    if inicio < fin:
+        primera, ultima = date.fromordinal(indice.ordinales[inicio]), date.fromordinal(indice.ordinales[fin - 1])
+        meses.extend(mes for mes in meses_entre(primera, ultima) if not archivo.anio_archivado(mes))
+
+    cerrados = cierres()
+    huellas = huellas_mes(sheet_name) if cerrados else {}
+    resultado = {}
+    for mes in meses:
+        primer_dia, ultimo_dia = rango_mes(mes)
+        completo = (desde is None or desde <= primer_dia) and (hasta is None or hasta >= ultimo_dia)
+        cierre = cerrados[mes]['hojas'].get(sheet_name) if mes in cerrados else None
+        # Los meses archivados ya no están en el libro activo: su cierre vale tal cual
+        if completo and cierre and (
+            archivo.anio_archivado(mes) or cierre['huella'] == huellas.get(mes, huella_vacia())
+        ):
+            agregado = cierre['agregado']
+        else:
+            agregado = agregado_vivo(sheet_name, mes, desde, hasta)
+        if agregado['cantidad']:
+            resultado[mes] = agregado
+    return resultado
+
@@ -0,0 +1,162 @@
+"""
+Compactación de cadenas de facturas cerradas.
+
+Cuando una cadena (proveedor + IdFactura) queda inactiva porque su saldo ya
+pasó a la factura siguiente, sus filas no vuelven a cambiar pero el resumen,
+el guardado de movimientos y los listados las siguen recorriendo. La
+compactación las mueve al libro de cadenas del archivo y deja en la hoja una
+sola fila 'Resumen cadena' con el efecto neto de la cadena en el saldo,
+fechada el día de su último movimiento.
+
+Solo se compactan cadenas cuyos meses ya tienen cierre: los reportes de esos
+meses salen del cierre, así que no hace falta abrir el libro de cadenas para
+armarlos. La huella de las filas movidas queda en el manifiesto para que los
+cierres no las den por alteradas.
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from openpyxl import Workbook, load_workbook
+
+from . import archivo, cierres, indices, libros, pendientes, respaldo, saldos
+
+ENCABEZADOS = ['Id', 'Fecha', 'Proveedor', 'Detalle', 'Obs', 'Total', 'IdFactura', 'Estado']
+
+
+def _clave_cadena(fila):
+    return f"{indices.clave_normalizada(fila[2])}|{fila[6]}"
+
+
+def cadenas_cerradas(sheet_name):
+    """
+    Cadenas que se pueden compactar: {clave: posiciones en la hoja}.
+
+    Todas sus filas deben estar inactivas, tener fecha válida y caer en
+    meses cerrados; una cadena de una sola fila no se compacta.
+    """
+    filas = indices.leer_hoja(sheet_name)
+    grupos = {}
+    for posicion, fila in enumerate(filas):
+        if len(fila) >= 8 and fila[2] and fila[6]:
+            grupos.setdefault(_clave_cadena(fila), []).append(posicion)
+
+    cerradas = {}
+    for clave, posiciones in grupos.items():
+        cadena = [filas[p] for p in posiciones]
+        if len(cadena) < 2:
+            continue
+        if any(str(fila[7] or '').lower() != 'inactiva' or fila[3] == saldos.DETALLE_CADENA for fila in cadena):
+            continue
+        fechas = [indices.fecha_de_celda(fila[1]) for fila in cadena]
+        if not all(fechas) or not all(cierres.mes_cerrado(fecha) for fecha in fechas):
+            continue
+        cerradas[clave] = posiciones
+    return cerradas
+
+
+def totales_propios(cadena):
+    """Facturas (por su monto propio) y abonos de la cadena, como en el resumen de movimientos"""
+    totales = {'facturas': 0, 'abonos': 0}
+    for fila in cadena:
+        efecto = saldos.efecto_en_saldo(fila)
+        if str(fila[3] or '').lower() == 'factura':
+            totales['facturas'] += efecto
+        elif str(fila[3] or '').lower() == 'abono':
+            totales['abonos'] -= efecto
+    return totales
+
+
+def fila_resumen(cadena):
+    """Fila que reemplaza a la cadena: conserva el Id de su primera fila y suma su efecto en el saldo"""
+    facturas = sum(1 for fila in cadena if str(fila[3] or '').lower() == 'factura')
+    abonos = sum(1 for fila in cadena if str(fila[3] or '').lower() == 'abono')
+    ultima = max(indices.fecha_de_celda(fila[1]) for fila in cadena)
+    return (
+        cadena[0][0], datetime(ultima.year, ultima.month, ultima.day), cadena[0][2], saldos.DETALLE_CADENA,
+        f"{len(cadena)} movimientos archivados ({facturas} facturas, {abonos} abonos)",
+        sum(saldos.efecto_en_saldo(fila) for fila in cadena), cadena[0][6], 'Inactiva',
+    )
+
+
+def _huellas_por_mes(movidas):
+    """Huella de las filas movidas de cada mes, en orden de fecha como en cierres.huellas_mes"""
+    por_mes = {}
+    for fila in sorted(movidas, key=lambda f: (indices.fecha_de_celda(f[1]), indices.id_numerico(f[0]))):
+        mes = cierres.clave_mes(indices.fecha_de_celda(fila[1]))
+        por_mes.setdefault(mes, hashlib.sha256()).update(repr(fila).encode('utf-8'))
+    return {mes: h.hexdigest() for mes, h in por_mes.items()}
+
+
+def compactar(sheet_name):
+    """
+    Mueve las cadenas cerradas de la hoja al libro de cadenas.
+
+    Antes se crea un respaldo; el libro de cadenas y su manifiesto se
+    escriben primero y la hoja activa al final, siempre con temporal +
+    rename. Devuelve (cadenas compactadas, filas movidas).
+    """
+    # Con el candado de la cola nadie encola ni aplica cambios de la hoja mientras se reescribe
+    with pendientes._lock:
+        cerradas = cadenas_cerradas(sheet_name)
+        if not cerradas:
+            return 0, 0
+        if pendientes.hay_pendientes([sheet_name]):
+            raise ValueError(f"{sheet_name} tiene cambios pendientes de escribir en el Excel; espere a que se guarden")
+
+        respaldo.crear_instantanea(libros.ruta_hoja(sheet_name), origen=f'compactacion:{sheet_name}')
+
+        filas = indices.leer_hoja(sheet_name)
+        resumenes, quitar, movidas = {}, set(), []
+        for posiciones in cerradas.values():
+            cadena = [filas[p] for p in posiciones]
+            resumenes[posiciones[0]] = fila_resumen(cadena)
+            quitar.update(posiciones[1:])
+            movidas.extend(cadena)
+
+        # Libro de cadenas: se agregan las filas movidas a la hoja de la entidad
+        ruta = archivo.ruta_cadenas()
+        try:
+            libro = load_workbook(ruta)
+        except FileNotFoundError:
+            libro = Workbook()
+            libro.remove(libro.active)
+        if sheet_name not in libro.sheetnames:
+            libro.create_sheet(sheet_name).append(ENCABEZADOS)
+        hoja = libro[sheet_name]
+        for fila in movidas:
+            hoja.append(fila)
+
+        contenido = json.loads(json.dumps(archivo.manifiesto_cadenas()))
+        datos = contenido.setdefault(sheet_name, {'cadenas': {}, 'huellas': {}, 'ultimo_id': 0})
+        ahora = datetime.now().isoformat()
+        for clave, posiciones in cerradas.items():
+            cadena = [filas[p] for p in posiciones]
+            datos['cadenas'][clave] = {
+                'proveedor': cadena[0][2],
+                'id': cadena[0][0],
+                'filas': len(cadena),
+                'fecha': ahora,
+                **totales_propios(cadena),
+            }
+        for mes, huella in _huellas_por_mes(movidas).items():
+            datos['huellas'].setdefault(mes, []).append(huella)
+        datos['ultimo_id'] = max([datos['ultimo_id']] + [indices.id_numerico(fila[0]) for fila in movidas])
+
+        libros.guardar_libro(libro, ruta)
+        archivo.guardar_manifiesto_cadenas(contenido)
+
+        # Hoja activa: cada cadena queda reducida a su fila de resumen, en el lugar de su primera fila
+        activo = load_workbook(libros.ruta_hoja(sheet_name))
+        ws = activo[sheet_name]
+        if ws.max_row > 1:
+            ws.delete_rows(2, ws.max_row)
+        for posicion, fila in enumerate(filas):
+            if posicion in quitar:
+                continue
+            ws.append(resumenes.get(posicion, fila))
+        libros.guardar_libro(activo, libros.ruta_hoja(sheet_name))
+
+    # Las huellas de los meses cambian de forma; sus agregados no
+    cierres.recerrar_alterados(sheet_name, origen='compactacion')
+    return len(cerradas), len(movidas)
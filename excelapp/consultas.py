@@ -0,0 +1,165 @@
+"""
+Consultas de listados y dashboards sobre la réplica de lectura.
+
+Cada función traduce los filtros GET de una vista a una consulta del ORM
+sobre las tablas de replica.py (que MultiDBRouter manda a la base
+'lectura'), de modo que el filtrado, el orden y los agregados se resuelven
+en SQL con los índices de models.py y a Python solo llegan las filas de una
+página o los totales ya agrupados. Los filtros de texto de los listados
+comparan los valores normalizados que copia la réplica (columnas *_norm),
+sin distinguir mayúsculas ni espacios alrededor, igual que
+indices.clave_normalizada.
+
+Los años archivados (archivo.py) no están en la réplica: quien necesite
+esos meses suma aparte sus filas.
+"""
+from datetime import date
+
+from django.db.models import DateField, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from . import indices, registros, replica
+from .paginacion import paginar_consulta
+
+
+def _ordinal(fecha):
+    return fecha.toordinal() if fecha and fecha != date.min else 0
+
+
+def _de_ordinal(ordinal):
+    return date.fromordinal(ordinal) if ordinal else date.min
+
+
+# Claves de paginación (campo, a cursor, de cursor) con los mismos valores que
+# los índices ordenados de views.py, así los cursores sirven en ambos caminos;
+# la llave de la réplica desempata las filas con el mismo Id de la hoja
+CLAVES_FECHA = (('fecha_orden', _ordinal, _de_ordinal), ('id_orden', int, int), ('id', int, int))
+CLAVES_FACTURA_FECHA = (('factura_orden', str, str),) + CLAVES_FECHA
+
+
+def _tabla(sheet_name):
+    replica.asegurar(sheet_name)
+    return replica.TABLAS[sheet_name][0].objects.all()
+
+
+def _por_texto(consulta, campo, valor):
+    """Igualdad sin distinguir mayúsculas ni espacios, sobre la columna normalizada que tiene índice"""
+    if not valor:
+        return consulta
+    return consulta.filter(**{f'{campo}_norm': indices.clave_normalizada(valor)})
+
+
+def _por_fecha(consulta, desde=None, hasta=None):
+    if desde:
+        consulta = consulta.filter(fecha__gte=desde)
+    if hasta:
+        consulta = consulta.filter(fecha__lte=hasta)
+    return consulta
+
+
+def movimientos(sheet_name, proveedor=None, estado=None, id_factura=None, desde=None, hasta=None):
+    """Movimientos de la hoja con los filtros de los listados"""
+    consulta = _tabla(sheet_name)
+    consulta = _por_texto(consulta, 'proveedor', proveedor)
+    consulta = _por_texto(consulta, 'estado', estado)
+    consulta = _por_texto(consulta, 'id_factura', id_factura)
+    return _por_fecha(consulta, desde, hasta)
+
+
+def de_factura(sheet_name, id_factura, proveedor=None, desde=None, hasta=None):
+    """Facturas y abonos de una factura; aquí los filtros son exactos, como en el dashboard"""
+    consulta = _tabla(sheet_name).filter(id_factura=id_factura, detalle__in=['Factura', 'Abono'])
+    if proveedor:
+        consulta = consulta.filter(proveedor=proveedor)
+    return _por_fecha(consulta, desde, hasta)
+
+
+def gastos(sheet_name, categoria=None, placa=None, desde=None, hasta=None):
+    """Gastos de la hoja; la categoría es exacta y la placa se busca como parte del texto normalizado"""
+    consulta = _por_fecha(_tabla(sheet_name), desde, hasta)
+    if categoria:
+        consulta = consulta.filter(categoria=categoria)
+    if placa:
+        consulta = consulta.filter(placa_norm__contains=indices.clave_normalizada(placa))
+    return consulta
+
+
+# Campos del modelo que llenan cada campo del registro, en el orden de __slots__
+CAMPOS_REGISTRO = {
+    registros.Movimiento: ('id_hoja', 'fecha', 'proveedor', 'detalle', 'obs', 'total', 'id_factura', 'estado'),
+    registros.Gasto: ('id_hoja', 'fecha', 'categoria', 'placa', 'conductor', 'precio'),
+}
+_MONTOS = {'total', 'precio'}
+
+
+def registro(clase, fila):
+    """Registro de la clase armado con una fila de values() de la réplica (los montos vuelven a int)"""
+    return clase(*(
+        int(fila[campo]) if campo in _MONTOS else fila[campo] for campo in CAMPOS_REGISTRO[clase]
+    ))
+
+
+def registros_de(consulta, clase):
+    """Registros de las filas de la consulta, sin pasar por las filas de la hoja en memoria"""
+    return [registro(clase, fila) for fila in consulta.values(*CAMPOS_REGISTRO[clase])]
+
+
+def ordenable(consulta, factura=False):
+    """
+    Anota las claves de CLAVES_FECHA (y de CLAVES_FACTURA_FECHA con `factura`).
+
+    Sin fecha, sin Id numérico o sin factura la fila ordena primero, como en
+    los índices en memoria.
+    """
+    consulta = consulta.annotate(
+        fecha_orden=Coalesce('fecha', Value(date.min), output_field=DateField()),
+        id_orden=Coalesce('id_hoja', Value(0)),
+    )
+    if factura:
+        consulta = consulta.annotate(factura_orden=Coalesce('id_factura', Value('')))
+    return consulta
+
+
+def totales_por_mes(consulta, campo, *agrupar):
+    """
+    {(valores de `agrupar`..., 'AAAA-MM'): total} de la consulta; las filas sin fecha no cuentan.
+
+    Los montos de la réplica son pesos enteros, así que los totales se
+    devuelven como int.
+    """
+    filas = (
+        consulta.exclude(fecha=None)
+        .annotate(mes=TruncMonth('fecha'))
+        .values(*agrupar, 'mes')
+        .annotate(total=Sum(campo))
+        .order_by()
+    )
+    return {
+        tuple(fila[clave] for clave in agrupar) + (fila['mes'].strftime('%Y-%m'),): int(fila['total'] or 0)
+        for fila in filas
+    }
+
+
+def totales_por(consulta, campo, clave):
+    """[(clave, total, primera fecha, primer Id)] de la consulta, agrupada por `clave` (sin las filas sin fecha)"""
+    filas = (
+        consulta.exclude(fecha=None)
+        .values(clave)
+        .annotate(total=Sum(campo), primera=Min('fecha'), primer_id=Min('id_hoja'))
+        .order_by()
+    )
+    return [(fila[clave], int(fila['total'] or 0), fila['primera'], fila['primer_id']) for fila in filas]
+
+
+def pagina(consulta, clase, factura=False, por_pagina=10, despues=None, antes=None):
+    """
+    Página por cursor de la consulta, de la más reciente a la más antigua.
+
+    Ordena por fecha e Id (por IdFactura antes con `factura`) y arma los
+    registros de la página con las filas que devuelve el mismo SQL.
+    """
+    return paginar_consulta(
+        ordenable(consulta, factura), CLAVES_FACTURA_FECHA if factura else CLAVES_FECHA,
+        lambda fila: registro(clase, fila), campos=CAMPOS_REGISTRO[clase],
+        por_pagina=por_pagina, despues=despues, antes=antes,
+    )
@@ -0,0 +1,6 @@
+from . import pendientes
+
+
+def escrituras_pendientes(request):
+    """Cambios que todavía no se pudieron escribir en el Excel, para el aviso de base.html"""
+    return {'escrituras_pendientes': pendientes.resumen()}
@@ -0,0 +1,208 @@
+"""
+Diario de cambios de las hojas.
+
+Los guardados reemplazan la hoja completa, pero lo que cambia en cada uno son
+pocos registros. Antes de guardar se compara la hoja nueva con la vigente por
+Id y cada diferencia se agrega como un evento (crear, editar, desactivar o
+eliminar) a RUTA_DIARIO/<hoja>.jsonl, un archivo al que solo se le agregan
+líneas. Con el diario se puede ver la historia de un registro y reconstruir
+la hoja tal como estaba en una fecha.
+
+El primer evento de cada hoja es una 'base' con todas sus filas. Si la hoja
+cambió por fuera del diario (editada en Excel, compactada, rotada de año) se
+agrega una base nueva antes de los eventos, así que repetir el diario siempre
+da la hoja vigente. Cada guardado deja en su último evento la huella de la
+hoja resultante para detectarlo.
+
+De las hojas de resumen solo se registran los nombres por Id (personas); los
+totales se recalculan desde los movimientos.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from django.conf import settings
+
+from . import indices
+from .pendientes import _a_json, _como_celda, _de_json
+
+RUTA_DIARIO = getattr(settings, 'RUTA_DIARIO', os.path.join(settings.BASE_DIR, 'diario'))
+
+# Hoja -> tipo de registro
+HOJAS = {
+    'Proveedores': 'movimiento',
+    'ProveedoresCliente': 'movimiento',
+    'Gastos': 'gasto',
+    'Resumen': 'persona',
+    'ResumenCliente': 'persona',
+}
+
+_lock = threading.Lock()
+_ultimos = {}  # hoja -> (número del último evento, huella de la hoja después de él)
+
+
+def ruta_diario(sheet_name):
+    return os.path.join(RUTA_DIARIO, f'{sheet_name}.jsonl')
+
+
+def _normalizar(sheet_name, fila):
+    """Fila como quedará al leerla del Excel, sin las celdas vacías del final"""
+    valores = [_como_celda(valor) for valor in fila]
+    if HOJAS[sheet_name] == 'persona':
+        valores = valores[:2]
+    while valores and valores[-1] is None:
+        valores.pop()
+    return tuple(valores)
+
+
+def _huella(filas):
+    return hashlib.sha256(repr(filas).encode('utf-8')).hexdigest()[:16]
+
+
+def _columna_estado(encabezados):
+    for posicion, encabezado in enumerate(encabezados or ()):
+        if str(encabezado or '').strip().lower() == 'estado':
+            return posicion
+    return None
+
+
+def _activa(fila, columna):
+    return columna is not None and len(fila) > columna and str(fila[columna] or '').lower() == 'activa'
+
+
+def eventos_entre(sheet_name, actuales, nuevas, encabezados=None):
+    """Eventos que llevan las filas `actuales` a las `nuevas` (ya normalizadas), comparando por Id"""
+    anteriores = {fila[0]: fila for fila in actuales if fila}
+    columna = _columna_estado(encabezados or indices.leer_encabezados(sheet_name))
+    eventos, vistos = [], set()
+    for fila in nuevas:
+        if not fila:
+            continue
+        vistos.add(fila[0])
+        anterior = anteriores.get(fila[0])
+        if anterior is None:
+            eventos.append({'op': 'crear', 'id': fila[0], 'v': fila})
+        elif anterior != fila:
+            desactivada = _activa(anterior, columna) and not _activa(fila, columna)
+            eventos.append({'op': 'desactivar' if desactivada else 'editar', 'id': fila[0], 'v': fila})
+    eventos.extend({'op': 'eliminar', 'id': id_fila} for id_fila in anteriores if id_fila not in vistos)
+    return eventos
+
+
+def _leer(sheet_name):
+    """Eventos del diario de la hoja, en orden"""
+    try:
+        with open(ruta_diario(sheet_name), encoding='utf-8') as f:
+            lineas = f.readlines()
+    except FileNotFoundError:
+        return []
+    eventos = []
+    for linea in lineas:
+        try:
+            evento = json.loads(linea)
+        except ValueError:
+            # Una línea cortada por un corte de luz: se descarta
+            print(f"Error al leer el diario de {sheet_name}: línea incompleta")
+            continue
+        if evento['op'] == 'base':
+            evento['v'] = [tuple(_de_json(valor) for valor in fila) for fila in evento['v']]
+        elif 'v' in evento:
+            evento['v'] = tuple(_de_json(valor) for valor in evento['v'])
+        eventos.append(evento)
+    return eventos
+
+
+def _ultimo(sheet_name):
+    if sheet_name not in _ultimos:
+        eventos = _leer(sheet_name)
+        huella = next((evento['s'] for evento in reversed(eventos) if 's' in evento), None)
+        _ultimos[sheet_name] = (eventos[-1]['n'] if eventos else 0, huella)
+    return _ultimos[sheet_name]
+
+
+def _agregar(sheet_name, eventos):
+    """Agrega los eventos al final del diario y espera a que queden en disco"""
+    os.makedirs(RUTA_DIARIO, exist_ok=True)
+    lineas = []
+    for evento in eventos:
+        registro = {'n': evento['n'], 'f': evento['f'], **evento}
+        if evento['op'] == 'base':
+            registro['v'] = [[_a_json(v) for v in fila] for fila in evento['v']]
+        elif 'v' in evento:
+            registro['v'] = [_a_json(v) for v in evento['v']]
+        lineas.append(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n')
+    with open(ruta_diario(sheet_name), 'a', encoding='utf-8') as f:
+        f.writelines(lineas)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def registrar(sheet_name, datos, encabezados=None, modo='overwrite'):
+    """
+    Registra en el diario los cambios de un guardado de la hoja.
+
+    Se llama antes de guardar; devuelve los eventos agregados.
+    """
+    if sheet_name not in HOJAS:
+        return []
+    nuevas = [_normalizar(sheet_name, fila) for fila in datos]
+    with _lock:
+        actuales = [_normalizar(sheet_name, fila) for fila in indices.leer_hoja(sheet_name)]
+        if modo != 'overwrite':
+            nuevas = actuales + nuevas
+        numero, huella = _ultimo(sheet_name)
+        fecha = datetime.now().isoformat(timespec='seconds')
+
+        eventos = []
+        if huella != _huella(actuales):
+            eventos.append({'op': 'base', 'v': actuales})
+        eventos.extend(eventos_entre(sheet_name, actuales, nuevas, encabezados))
+        if not eventos:
+            return []
+
+        for evento in eventos:
+            numero += 1
+            evento.update(n=numero, f=fecha)
+        eventos[-1]['s'] = _huella(nuevas)
+        _agregar(sheet_name, eventos)
+        _ultimos[sheet_name] = (numero, eventos[-1]['s'])
+    return eventos
+
+
+def reconstruir(sheet_name, hasta=None):
+    """
+    Filas de la hoja según el diario, hasta el evento número o la fecha `hasta` (inclusive).
+
+    Parte de la última base anterior y le aplica los eventos siguientes en orden.
+    """
+    eventos = _leer(sheet_name)
+    if isinstance(hasta, datetime):
+        eventos = [evento for evento in eventos if datetime.fromisoformat(evento['f']) <= hasta]
+    elif hasta is not None:
+        eventos = [evento for evento in eventos if evento['n'] <= hasta]
+
+    filas = {}
+    for evento in eventos:
+        if evento['op'] == 'base':
+            filas = {fila[0]: fila for fila in evento['v'] if fila}
+        elif evento['op'] == 'eliminar':
+            filas.pop(evento['id'], None)
+        else:
+            filas[evento['id']] = evento['v']
+    return list(filas.values())
+
+
+def historial(sheet_name, id_fila):
+    """Eventos de un registro, del más antiguo al más reciente (las bases se omiten)"""
+    return [
+        evento for evento in _leer(sheet_name)
+        if evento['op'] != 'base' and evento['id'] == id_fila
+    ]
+
+
+def verificar(sheet_name):
+    """True si repetir el diario da la hoja vigente"""
+    actuales = [_normalizar(sheet_name, fila) for fila in indices.leer_hoja(sheet_name)]
+    return reconstruir(sheet_name) == [fila for fila in actuales if fila]
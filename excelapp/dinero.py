@@ -0,0 +1,70 @@
+"""
+Montos en pesos como enteros.
+
+Los valores se convierten a `int` una sola vez, al leer una celda del Excel,
+un campo del formulario o el texto de una observación; de ahí en adelante
+sumas, saldos y reportes trabajan con aritmética entera, sin mezclar
+Decimal y float ni arrastrar errores de redondeo.
+"""
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Parte decimal al final del texto: ',5' o '.50' (uno o dos dígitos)
+_DECIMALES = re.compile(r'[.,](\d{1,2})$')
+# Monto que aparece en la observación de una factura encadenada: "... por : 5000 + saldo ..."
+_MONTO_OBS = re.compile(r":\s*([\d.,]+)")
+
+
+def _redondear(valor):
+    return int(Decimal(valor).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def desde_texto(texto):
+    """
+    Pesos de un texto escrito a mano: '$ 1.500.000', '1,500,000' o '2500,50'.
+
+    Los puntos y comas se toman como separadores de miles, salvo que al final
+    queden uno o dos dígitos, que se interpretan como centavos y se redondean.
+    """
+    texto = str(texto).strip()
+    negativo = texto.lstrip('$ ').startswith('-') or (texto.startswith('(') and texto.endswith(')'))
+    centavos = _DECIMALES.search(texto)
+    if centavos:
+        texto = texto[:centavos.start()]
+    digitos = re.sub(r'[^\d]', '', texto)
+    if not digitos and not centavos:
+        return 0
+    valor = Decimal(digitos or '0')
+    if centavos:
+        valor += Decimal(f'0.{centavos.group(1)}')
+    pesos = _redondear(valor)
+    return -pesos if negativo else pesos
+
+
+def a_pesos(valor):
+    """Pesos enteros de una celda o un campo (int, float, Decimal, texto); vacío cuenta como 0"""
+    if valor is None or isinstance(valor, bool):
+        return int(valor or 0)
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, (float, Decimal)):
+        try:
+            return _redondear(repr(valor) if isinstance(valor, float) else valor)
+        except (InvalidOperation, ValueError, OverflowError):
+            return 0  # NaN o infinito
+    return desde_texto(valor)
+
+
+def sumar(valores):
+    return sum(a_pesos(valor) for valor in valores)
+
+
+def monto_en_obs(obs):
+    """Monto propio de una factura encadenada, tomado de su observación; None si no lo tiene"""
+    match = _MONTO_OBS.search(str(obs or ''))
+    if not match:
+        return None
+    try:
+        return _redondear(Decimal(match.group(1).replace(",", ".")))
+    except InvalidOperation:
+        return None
@@ -0,0 +1,93 @@
+"""
+Libro de costos por vehículo (placa) y por conductor.
+
+Los gastos se agrupan con los índices por placa y por conductor de la hoja
+de gastos y cada grupo guarda su total, cantidad, serie mensual y reparto
+por categoría. Cuando el archivo cambia solo se recalculan los grupos cuyas
+filas cambiaron, así que agregar o editar un gasto no obliga a recorrer toda
+la hoja de nuevo. Los acumulados se guardan por versión del archivo con los
+demás índices.
+
+Solo cuentan los gastos con fecha válida, igual que en el dashboard.
+"""
+from . import dinero, indices
+
+COLUMNAS = {'placa': 3, 'conductor': 4}
+
+
+class Acumulado:
+    """Totales de los gastos de una placa o un conductor"""
+
+    __slots__ = ('nombre', 'contenido', 'cantidad', 'total', 'por_mes', 'por_categoria', 'ultima_fecha')
+
+    def __init__(self, nombre, contenido):
+        self.nombre = nombre
+        self.contenido = contenido  # filas del grupo, para detectar cambios
+        self.cantidad = 0
+        self.total = 0
+        self.por_mes = {}
+        self.por_categoria = {}
+        self.ultima_fecha = None
+        for fila in contenido:
+            fecha = indices.fecha_de_celda(fila[1]) if len(fila) >= 6 else None
+            if not fecha:
+                continue
+            precio = dinero.a_pesos(fila[5])
+            mes = f"{fecha.year}-{fecha.month:02d}"
+            categoria = fila[2] or 'Sin categoría'
+            self.cantidad += 1
+            self.total += precio
+            self.por_mes[mes] = self.por_mes.get(mes, 0) + precio
+            self.por_categoria[categoria] = self.por_categoria.get(categoria, 0) + precio
+            if self.ultima_fecha is None or fecha > self.ultima_fecha:
+                self.ultima_fecha = fecha
+
+    @property
+    def promedio(self):
+        return round(self.total / self.cantidad) if self.cantidad else 0
+
+    def como_dict(self):
+        return {
+            'nombre': self.nombre,
+            'cantidad': self.cantidad,
+            'total': self.total,
+            'promedio': self.promedio,
+            'ultima_fecha': self.ultima_fecha,
+            'por_mes': dict(sorted(self.por_mes.items())),
+            'por_categoria': dict(sorted(self.por_categoria.items(), key=lambda x: x[1], reverse=True)),
+        }
+
+
+_ultimos = {}  # (hoja, agrupación) -> acumulados de la última versión armada, para reusar los que no cambiaron
+
+
+def acumulados(sheet_name, agrupacion):
+    """Acumulados de la hoja por 'placa' o por 'conductor' en la versión que ve la petición"""
+    columna = COLUMNAS[agrupacion]
+    clave_cache = (sheet_name, agrupacion)
+
+    def construir(filas):
+        anteriores = _ultimos.get(clave_cache, {})
+        actuales = {}
+        for clave, posiciones in indices.indice_hash(sheet_name, columna).items():
+            contenido = tuple(filas[p] for p in posiciones)
+            acumulado = anteriores.get(clave)
+            if acumulado is None or acumulado.contenido != contenido:
+                acumulado = Acumulado(contenido[0][columna], contenido)
+            if acumulado.cantidad:
+                actuales[clave] = acumulado
+        _ultimos[clave_cache] = actuales
+        return actuales
+
+    return indices.obtener_indice(sheet_name, f'flota:{agrupacion}', construir)
+
+
+def acumulado(sheet_name, agrupacion, valor):
+    """Acumulado de una placa o un conductor (sin distinguir mayúsculas), o None"""
+    return acumulados(sheet_name, agrupacion).get(indices.clave_normalizada(valor))
+
+
+def ranking(sheet_name, agrupacion, limite=None):
+    """Acumulados ordenados de mayor a menor total"""
+    ordenados = sorted(acumulados(sheet_name, agrupacion).values(), key=lambda a: a.total, reverse=True)
+    return ordenados[:limite] if limite else ordenados
@@ -1,10 +1,7 @@
 from django import forms
-import os
-from openpyxl import load_workbook
-from django.conf import settings
 from decimal import Decimal
 
-ruta_excel = settings.RUTA_EXCEL
+from . import indices
 
 class MovimientoForm(forms.Form):
     DETALLE_CHOICES = (
@@ -33,15 +30,12 @@ class MovimientoForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         
+        # Las filas salen de la instantánea en memoria de indices.py, sin abrir el Excel
         choices = []
-        if os.path.exists(ruta_excel):
-            wb = load_workbook(ruta_excel)
-            if 'Resumen' in wb.sheetnames:
-                ws = wb['Resumen']
-                for row in ws.iter_rows(min_row=2, values_only=True):
-                    nombre = row[0]
-                    if nombre:
-                        choices.append((nombre, nombre))
+        for row in indices.leer_hoja('Resumen'):
+            nombre = row[0] if row else None
+            if nombre:
+                choices.append((nombre, nombre))
         self.fields['proveedor'].choices = choices
         # Estilos Bootstrap
         self.fields['proveedor'].widget.attrs.update({'class': 'form-control'})
@@ -74,15 +68,12 @@ class MovimientoClienteForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # Las filas salen de la instantánea en memoria de indices.py, sin abrir el Excel
         choices = []
-        if os.path.exists(ruta_excel):
-            wb = load_workbook(ruta_excel)
-            if 'ResumenCliente' in wb.sheetnames:
-                ws = wb['ResumenCliente']
-                for row in ws.iter_rows(min_row=2, values_only=True):
-                    nombre = row[0]
-                    if nombre:
-                        choices.append((nombre, nombre))
+        for row in indices.leer_hoja('ResumenCliente'):
+            nombre = row[0] if row else None
+            if nombre:
+                choices.append((nombre, nombre))
         self.fields['proveedor'].choices = choices
         # Estilos Bootstrap
         self.fields['proveedor'].widget.attrs.update({'class': 'form-control'})
@@ -0,0 +1,554 @@
+"""
+Caché de las hojas del Excel e índices derivados.
+
+Las filas de cada hoja se leen una sola vez por versión del archivo (la
+versión se identifica por fecha de modificación y tamaño). Cuando el archivo
+cambia, ya sea porque lo guardó la aplicación o porque alguien lo editó en
+Excel, se compara la huella de cada hoja dentro del zip (CRC y tamaño de su
+parte XML, según el directorio central) y solo se vuelven a leer las hojas
+cuya parte cambió; las demás conservan sus filas y sus índices. Si las hojas
+están repartidas en varios archivos (libros.py), cada archivo tiene su
+propia caché.
+
+Cada lectura nueva se publica como una versión completa que no se vuelve a
+modificar (salvo para agregar índices), así que una petición puede fijar la
+versión que leyó primero y usarla hasta el final aunque otro hilo publique
+otra. Con el vigilante en marcha (vigilante.py) las lecturas ya no revisan
+el archivo: los cambios externos se cargan en segundo plano y los guardados
+de la propia aplicación se publican en el momento.
+
+Las hojas con cambios que todavía no se pudieron escribir en el archivo
+(pendientes.py) se leen con esos cambios ya aplicados.
+"""
+import contextvars
+import hashlib
+import itertools
+import os
+import re
+import threading
+import zipfile
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+from django.conf import settings
+from openpyxl import load_workbook
+
+from . import cache_disco, lector, libros, pendientes, respaldo
+
+# 'openpyxl' (por defecto) o 'liviano' (lector.py, solo valores y bastante más rápido)
+LECTOR_EXCEL = getattr(settings, 'LECTOR_EXCEL', 'openpyxl')
+# Copia en disco de las hojas leídas y sus índices, para arrancar sin leer el Excel (cache_disco.py)
+CACHE_EN_DISCO = getattr(settings, 'CACHE_EN_DISCO', True)
+ESPERA_GUARDADO = 5  # segundos
+
+_lock = threading.RLock()
+# Un estado por archivo: con la disposición por entidad, guardar un archivo no descarta los demás
+_cache = {}
+_guardados_pendientes = {}
+_vigilado = False
+_versiones = itertools.count(1)
+# Versiones fijadas por la petición en curso: {ruta: estado}
+_fijada = contextvars.ContextVar('indices_version_fijada', default=None)
+
+# Partes que afectan la lectura de todas las hojas (fechas 1904, formatos de número)
+_PARTES_COMUNES = ('xl/workbook.xml', 'xl/styles.xml')
+_PARTE_TEXTOS = 'xl/sharedStrings.xml'
+_TEXTO = re.compile(rb'<si\b.*?</si>|<si\b[^>]*/>', re.S)
+
+
+def firma_excel(ruta):
+    """Identifica la versión actual de un archivo Excel"""
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _huella_textos(textos, cantidad):
+    """Huella de los primeros `cantidad` textos compartidos"""
+    return hashlib.sha256(b''.join(textos[:cantidad])).hexdigest()
+
+
+def huellas_libro(ruta):
+    """
+    Huellas de las partes del libro, leídas del directorio central del zip.
+
+    Devuelve {'comunes', 'hojas': {hoja: (parte, crc, tamaño)}, 'textos'}
+    donde 'textos' son los textos compartidos crudos (<si>...</si>), que las
+    hojas referencian por posición. None si el archivo no es un zip válido.
+    """
+    try:
+        with zipfile.ZipFile(ruta) as zf:
+            partes = {info.filename: (info.CRC, info.file_size) for info in zf.infolist()}
+            hojas = {
+                hoja: (parte,) + partes.get(parte, (None, None))
+                for hoja, parte in respaldo.hojas_del_libro(zf).items()
+            }
+            textos = _TEXTO.findall(zf.read(_PARTE_TEXTOS)) if _PARTE_TEXTOS in partes else []
+    except (OSError, zipfile.BadZipFile):
+        return None
+    return {
+        'comunes': tuple(partes.get(parte) for parte in _PARTES_COMUNES),
+        'hojas': hojas,
+        'textos': textos,
+    }
+
+
+def _hojas_reutilizables(anterior, huellas):
+    """
+    Hojas de la lectura anterior cuya parte no cambió.
+
+    Una hoja sin cambios sigue valiendo si las partes comunes son iguales y
+    los textos compartidos anteriores siguen en las mismas posiciones (al
+    guardar, openpyxl agrega al final los textos nuevos de las hojas
+    siguientes).
+    """
+    if anterior is None or huellas is None or anterior['comunes'] != huellas['comunes']:
+        return set()
+    cantidad = anterior['textos']
+    if len(huellas['textos']) < cantidad or _huella_textos(huellas['textos'], cantidad) != anterior['huella_textos']:
+        return set()
+    return {
+        hoja for hoja, huella in huellas['hojas'].items()
+        if anterior['hojas'].get(hoja) == huella
+    }
+
+
+def _cargar_hojas(ruta, nombres=None):
+    """Lee las hojas indicadas (todas si no se indican); devuelve (filas por hoja, encabezado por hoja)"""
+    if LECTOR_EXCEL == 'liviano':
+        try:
+            return lector.leer_hojas(ruta, nombres)
+        except lector.FormatoNoSoportado as e:
+            print(f"Error en el lector liviano, se usa openpyxl: {e}")
+
+    # En modo de solo lectura openpyxl interpreta únicamente las hojas que se recorren
+    wb = load_workbook(ruta, read_only=True)
+    try:
+        hojas, encabezados = {}, {}
+        for ws in wb.worksheets:
+            if nombres is not None and ws.title not in nombres:
+                continue
+            filas = tuple(ws.iter_rows(values_only=True))
+            encabezados[ws.title] = filas[0] if filas else ()
+            hojas[ws.title] = filas[1:]
+        return hojas, encabezados
+    finally:
+        wb.close()
+
+
+def _leer_estado(ruta, anterior, firma):
+    """
+    Lee el archivo partiendo del estado anterior.
+
+    Las hojas cuya parte no cambió conservan sus filas y sus índices; solo
+    las demás se vuelven a leer.
+    """
+    nuevo = {
+        'firma': firma, 'huellas': None, 'hojas': {}, 'encabezados': {}, 'indices': {}, 'persistentes': set(),
+        'superpuestas': set(),
+    }
+    if firma is None:
+        pendientes.superponer(ruta, nuevo)
+        return nuevo
+
+    huellas = huellas_libro(ruta)
+    # Las hojas con cambios pendientes no tienen en el estado anterior las filas del archivo
+    conservar = _hojas_reutilizables(anterior and anterior['huellas'], huellas)
+    conservar -= (anterior or {}).get('superpuestas', set())
+    for hoja in conservar:
+        nuevo['hojas'][hoja] = anterior['hojas'][hoja]
+        nuevo['encabezados'][hoja] = anterior['encabezados'][hoja]
+        nuevo['indices'].update(
+            (clave, indice) for clave, indice in anterior['indices'].items() if clave[0] == hoja
+        )
+    if conservar:
+        nuevo['persistentes'] = {clave for clave in anterior['persistentes'] if clave in nuevo['indices']}
+
+    por_leer = None if huellas is None else set(huellas['hojas']) - conservar
+    if por_leer is None or por_leer:
+        hojas, encabezados = _cargar_hojas(ruta, por_leer)
+        nuevo['hojas'].update(hojas)
+        nuevo['encabezados'].update(encabezados)
+        _programar_guardado(ruta)
+    if huellas is not None:
+        nuevo['huellas'] = {
+            'comunes': huellas['comunes'],
+            'hojas': huellas['hojas'],
+            'textos': len(huellas['textos']),
+            'huella_textos': _huella_textos(huellas['textos'], len(huellas['textos'])),
+        }
+    pendientes.superponer(ruta, nuevo)
+    return nuevo
+
+
+def _copia(estado):
+    """Copia del estado que se puede leer sin el candado mientras se arma la versión siguiente"""
+    return dict(estado, indices=dict(estado['indices']), persistentes=set(estado['persistentes']))
+
+
+def _publicar(ruta, nuevo):
+    """Publica una versión nueva del archivo (con el candado tomado)"""
+    nuevo['version'] = next(_versiones)
+    _cache[ruta] = nuevo
+    # La réplica de lectura copia la versión nueva en segundo plano
+    from . import replica
+    replica.programar(ruta)
+
+
+def _estado_vigente(ruta):
+    """Última versión publicada del archivo, leyéndolo de nuevo si cambió"""
+    with _lock:
+        estado = _cache.get(ruta)
+        if estado is not None and _vigilado:
+            # Con el vigilante activo los cambios externos se cargan en segundo plano (recargar)
+            return estado
+
+        firma = firma_excel(ruta)
+        if estado is None and CACHE_EN_DISCO and firma is not None:
+            # Al arrancar, la copia en disco hace de lectura anterior y se valida con las huellas del zip
+            estado = cache_disco.cargar(ruta)
+            if estado is not None:
+                estado['firma'] = None
+                estado['persistentes'] = set(estado['indices'])
+        if estado is not None and firma == estado['firma']:
+            return estado
+
+        try:
+            nuevo = _leer_estado(ruta, estado, firma)
+        except Exception as e:
+            # Un archivo a medio escribir por otro programa: se sigue con la versión anterior
+            if estado is None or estado['firma'] is None:
+                raise
+            print(f"Error al leer {ruta}, se usa la versión anterior: {e}")
+            return estado
+        _publicar(ruta, nuevo)
+        return nuevo
+
+
+def _estado_archivo(ruta):
+    """
+    Versión del archivo para la petición en curso.
+
+    Dentro de una petición (VersionExcelMiddleware) la primera lectura de
+    cada archivo fija su versión y las siguientes la reutilizan sin revisar
+    el disco, aunque otro hilo publique una versión nueva mientras tanto.
+    """
+    fijada = _fijada.get()
+    if fijada is not None and ruta in fijada:
+        return fijada[ruta]
+    estado = _estado_vigente(ruta)
+    if fijada is not None:
+        fijada[ruta] = estado
+    return estado
+
+
+def fijar_version():
+    """Empieza a fijar las versiones leídas en el contexto actual; devuelve el token para soltarlas"""
+    return _fijada.set({})
+
+
+def soltar_version(token):
+    _fijada.reset(token)
+
+
+def activar_vigilancia():
+    """A partir de ahora las lecturas no revisan el archivo: lo hace el vigilante (vigilante.py)"""
+    global _vigilado
+    _vigilado = True
+
+
+def refrescar(ruta):
+    """
+    Publica la versión que la aplicación acaba de guardar.
+
+    Se llama después de reemplazar el archivo (temporal + rename), así que
+    la lectura no ve un archivo a medias; se hace sin el candado y los demás
+    lectores siguen con la versión anterior hasta que se publica. La
+    petición que guardó pasa a ver su propio cambio.
+    """
+    fijada = _fijada.get()
+    with _lock:
+        anterior = _cache.get(ruta)
+        if anterior is None and not (fijada and ruta in fijada):
+            return
+        base = _copia(anterior) if anterior is not None else None
+        firma = firma_excel(ruta)
+
+    nuevo = _leer_estado(ruta, base, firma)
+
+    with _lock:
+        # Si otro guardado ya reemplazó el archivo, esta versión no se publica
+        if firma_excel(ruta) == firma:
+            _publicar(ruta, nuevo)
+    if fijada is not None:
+        fijada[ruta] = nuevo
+
+
+def recargar(ruta):
+    """
+    Carga la versión nueva de un archivo que cambió por fuera de la aplicación.
+
+    La lectura se hace sin tomar el candado, así que mientras tanto las
+    peticiones siguen usando la versión anterior; al terminar se reemplaza el
+    estado de una vez. Devuelve True si se cargó una versión nueva.
+    """
+    with _lock:
+        anterior = _cache.get(ruta)
+        if anterior is None:
+            return False
+        firma = firma_excel(ruta)
+        if firma == anterior['firma']:
+            return False
+        base = _copia(anterior)
+
+    nuevo = _leer_estado(ruta, base, firma)
+
+    with _lock:
+        # Si entretanto la aplicación guardó y refrescó el archivo, su estado es más reciente
+        if _cache.get(ruta) is not anterior:
+            return False
+        _publicar(ruta, nuevo)
+    return True
+
+
+def _estado_hoja(sheet_name):
+    """Estado del archivo donde vive la hoja"""
+    return _estado_archivo(libros.ruta_hoja(sheet_name))
+
+
+def leer_hoja(sheet_name):
+    """Devuelve las filas de datos de una hoja (sin encabezado) como tuplas"""
+    return _estado_hoja(sheet_name)['hojas'].get(sheet_name, ())
+
+
+def version_hoja(sheet_name):
+    """Número de la versión publicada del archivo de la hoja que ve la petición"""
+    return _estado_hoja(sheet_name)['version']
+
+
+def leer_encabezados(sheet_name):
+    """Devuelve la fila de encabezados de una hoja"""
+    return _estado_hoja(sheet_name)['encabezados'].get(sheet_name, ())
+
+
+def obtener_indice(sheet_name, nombre, construir, persistente=False):
+    """
+    Devuelve el índice `nombre` de la hoja, construyéndolo si no existe.
+
+    Los índices persistentes (los que dependen solo de las filas de la hoja)
+    se guardan además en la copia en disco.
+    """
+    estado = _estado_hoja(sheet_name)
+    clave = (sheet_name, nombre)
+    indice = estado['indices'].get(clave)
+    if indice is not None:
+        return indice
+    with _lock:
+        if clave not in estado['indices']:
+            estado['indices'][clave] = construir(estado['hojas'].get(sheet_name, ()))
+            if persistente:
+                estado['persistentes'].add(clave)
+                _programar_guardado(libros.ruta_hoja(sheet_name))
+        return estado['indices'][clave]
+
+
+def _programar_guardado(ruta):
+    """Guarda la copia en disco unos segundos después, para juntar varios cambios en una escritura"""
+    with _lock:
+        if not CACHE_EN_DISCO or ruta in _guardados_pendientes:
+            return
+        temporizador = threading.Timer(ESPERA_GUARDADO, _guardar_en_disco, args=(ruta,))
+        temporizador.daemon = True
+        _guardados_pendientes[ruta] = temporizador
+        temporizador.start()
+
+
+def _guardar_en_disco(ruta):
+    with _lock:
+        _guardados_pendientes.pop(ruta, None)
+        estado = _cache.get(ruta)
+        if estado is None or estado['firma'] is None or estado['huellas'] is None:
+            return
+        # Las hojas con cambios pendientes no se guardan: no son las filas del archivo
+        superpuestas = estado.get('superpuestas', set())
+        copia = {
+            clave: {hoja: valor for hoja, valor in estado[clave].items() if hoja not in superpuestas}
+            for clave in ('hojas', 'encabezados')
+        }
+        copia['huellas'] = dict(estado['huellas'], hojas={
+            hoja: huella for hoja, huella in estado['huellas']['hojas'].items() if hoja not in superpuestas
+        })
+        copia['indices'] = {
+            clave: estado['indices'][clave] for clave in estado['persistentes'] if clave[0] not in superpuestas
+        }
+    try:
+        cache_disco.guardar(ruta, copia)
+    except Exception as e:
+        print(f"Error al guardar la caché de {ruta}: {e}")
+
+
+def fecha_de_celda(valor):
+    """Fecha de una celda (datetime, date o 'AAAA-MM-DD'); None si no se puede interpretar"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return None
+
+
+def ordinal_fecha(valor):
+    """Convierte una fecha de celda en un entero ordenable (0 si no hay fecha)"""
+    fecha = fecha_de_celda(valor)
+    return fecha.toordinal() if fecha else 0
+
+
+def id_numerico(valor):
+    return int(valor) if isinstance(valor, (int, float)) else 0
+
+
+class IndiceOrdenado:
+    """Claves ascendentes y la posición de la fila que corresponde a cada una"""
+
+    __slots__ = ('claves', 'posiciones')
+
+    def __init__(self, pares):
+        self.claves = [clave for clave, _ in pares]
+        self.posiciones = [posicion for _, posicion in pares]
+
+    def __len__(self):
+        return len(self.claves)
+
+
+def indice_ordenado(sheet_name, nombre, clave_fila):
+    """
+    Índice de posiciones ordenado por `clave_fila(fila)`.
+
+    La posición se agrega a la clave para que sea única aunque dos filas
+    compartan todos los demás campos.
+    """
+    def construir(filas):
+        return IndiceOrdenado(sorted(
+            (tuple(clave_fila(fila)) + (posicion,), posicion)
+            for posicion, fila in enumerate(filas)
+        ))
+
+    return obtener_indice(sheet_name, nombre, construir, persistente=True)
+
+
+class IndiceFechas:
+    """Posiciones de las filas ordenadas por fecha, para resolver rangos con bisect"""
+
+    __slots__ = ('ordinales', 'posiciones')
+
+    def __init__(self, pares):
+        self.ordinales = [ordinal for ordinal, _ in pares]
+        self.posiciones = [posicion for _, posicion in pares]
+
+    def posiciones_en_rango(self, desde=None, hasta=None):
+        """Posiciones con fecha entre `desde` y `hasta` (inclusive), en orden de fecha"""
+        inicio = bisect_left(self.ordinales, desde.toordinal()) if desde else 0
+        fin = bisect_right(self.ordinales, hasta.toordinal()) if hasta else len(self.ordinales)
+        return self.posiciones[inicio:fin]
+
+
+def indice_fechas(sheet_name, columna=1):
+    """Índice por fecha de una hoja; las filas sin fecha válida quedan fuera"""
+    def construir(filas):
+        pares = []
+        for posicion, fila in enumerate(filas):
+            fecha = fecha_de_celda(fila[columna]) if len(fila) > columna else None
+            if fecha:
+                pares.append((fecha.toordinal(), posicion))
+        pares.sort()
+        return IndiceFechas(pares)
+
+    return obtener_indice(sheet_name, f'fechas:{columna}', construir, persistente=True)
+
+
+def limites_fecha(fecha=None, fecha_inicio=None, fecha_fin=None):
+    """
+    Interpreta una sola vez los filtros de fecha de la petición.
+
+    Devuelve (desde, hasta); una fecha específica tiene prioridad sobre el
+    rango. Lanza ValueError si algún valor no es una fecha 'AAAA-MM-DD'.
+    """
+    def interpretar(valor):
+        if not valor:
+            return None
+        if isinstance(valor, (date, datetime)):
+            return fecha_de_celda(valor)
+        return datetime.strptime(str(valor).strip(), '%Y-%m-%d').date()
+
+    if fecha:
+        dia = interpretar(fecha)
+        return dia, dia
+    return interpretar(fecha_inicio), interpretar(fecha_fin)
+
+
+def filas_en_rango(sheet_name, desde=None, hasta=None, columna=1):
+    """Filas de la hoja dentro del rango de fechas; sin límites devuelve todas"""
+    filas = leer_hoja(sheet_name)
+    if desde is None and hasta is None:
+        return filas
+    return [filas[p] for p in indice_fechas(sheet_name, columna).posiciones_en_rango(desde, hasta)]
+
+
+def posiciones_en_rango(sheet_name, desde=None, hasta=None, columna=1):
+    """Conjunto de posiciones dentro del rango, o None si no hay límites de fecha"""
+    if desde is None and hasta is None:
+        return None
+    return set(indice_fechas(sheet_name, columna).posiciones_en_rango(desde, hasta))
+
+
+def clave_normalizada(valor):
+    """Clave de búsqueda sin distinguir mayúsculas ni espacios alrededor"""
+    return str(valor).strip().lower() if valor is not None else ''
+
+
+def indice_ids(sheet_name):
+    """Id de fila -> posición en la hoja (si un Id se repite vale la primera fila)"""
+    def construir(filas):
+        mapa = {}
+        for posicion, fila in enumerate(filas):
+            if fila and fila[0] is not None:
+                mapa.setdefault(fila[0], posicion)
+        return mapa
+
+    return obtener_indice(sheet_name, 'ids', construir, persistente=True)
+
+
+def posicion_por_id(sheet_name, id_fila):
+    """Posición de la fila con ese Id, o None si no existe"""
+    return indice_ids(sheet_name).get(id_fila)
+
+
+def indice_hash(sheet_name, columna):
+    """Valor normalizado de la columna -> posiciones de las filas, en orden de la hoja"""
+    def construir(filas):
+        mapa = {}
+        for posicion, fila in enumerate(filas):
+            if len(fila) > columna and fila[columna] not in (None, ''):
+                mapa.setdefault(clave_normalizada(fila[columna]), []).append(posicion)
+        return mapa
+
+    return obtener_indice(sheet_name, f'hash:{columna}', construir, persistente=True)
+
+
+def posiciones_por_valor(sheet_name, columna, valor):
+    """Posiciones de las filas cuya columna coincide con el valor (sin distinguir mayúsculas)"""
+    return indice_hash(sheet_name, columna).get(clave_normalizada(valor), [])
+
+
+def ultimo_id(sheet_name):
+    """Mayor Id numérico de la hoja (0 si está vacía)"""
+    def construir(filas):
+        return max((int(fila[0]) for fila in filas if fila and isinstance(fila[0], (int, float))), default=0)
+
+    return obtener_indice(sheet_name, 'ultimo_id', construir, persistente=True)
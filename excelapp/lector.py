@@ -0,0 +1,200 @@
+"""
+Lector liviano de hojas .xlsx.
+
+Solo necesitamos los valores de unas pocas hojas de esquema fijo, así que en
+lugar de construir el modelo completo de openpyxl se recorre el XML de cada
+hoja con un parser incremental y la tabla de textos compartidos. Los
+números con formato de fecha se convierten a datetime con la misma regla que
+openpyxl (formato de número del estilo de la celda), de modo que las filas
+resultantes son iguales a las de `ws.iter_rows(values_only=True)`.
+
+Las fórmulas compartidas, de matriz o de tabla de datos no se interpretan:
+en ese caso se lanza FormatoNoSoportado y quien llama vuelve a openpyxl.
+"""
+import zipfile
+from xml.etree.ElementTree import iterparse, parse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+from . import respaldo
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_FILA = f'{_NS}row'
+_CELDA = f'{_NS}c'
+_VALOR = f'{_NS}v'
+_FORMULA = f'{_NS}f'
+_TEXTO_EN_LINEA = f'{_NS}is'
+_T = f'{_NS}t'
+_R = f'{_NS}r'
+_SI = f'{_NS}si'
+
+
+class FormatoNoSoportado(Exception):
+    """El libro usa algo que el lector liviano no interpreta igual que openpyxl"""
+
+
+def _texto(nodo):
+    """Texto de un <si> o <is>: el <t> directo más los de cada tramo con formato (sin fonética)"""
+    partes = []
+    for hijo in nodo:
+        if hijo.tag == _T:
+            partes.append(hijo.text or '')
+        elif hijo.tag == _R:
+            t = hijo.find(_T)
+            if t is not None and t.text is not None:
+                partes.append(t.text)
+    return ''.join(partes)
+
+
+def _textos_compartidos(zf):
+    try:
+        fuente = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    textos = []
+    with fuente:
+        for _, nodo in iterparse(fuente):
+            if nodo.tag == _SI:
+                textos.append(_texto(nodo).replace('x005F_', ''))
+                nodo.clear()
+    return textos
+
+
+def _formatos_de_fecha(zf):
+    """Estilos de celda cuyo formato de número es de fecha y, entre ellos, los de duración"""
+    try:
+        raiz = parse(zf.open('xl/styles.xml')).getroot()
+    except KeyError:
+        return set(), set()
+
+    propios = {}
+    for formato in raiz.iter(f'{_NS}numFmt'):
+        propios[int(formato.get('numFmtId'))] = formato.get('formatCode')
+
+    fechas, duraciones = set(), set()
+    estilos = raiz.find(f'{_NS}cellXfs')
+    for posicion, xf in enumerate(estilos if estilos is not None else []):
+        id_formato = int(xf.get('numFmtId', 0))
+        codigo = propios[id_formato] if id_formato in propios else BUILTIN_FORMATS.get(id_formato)
+        if is_date_format(codigo):
+            fechas.add(posicion)
+        if is_timedelta_format(codigo):
+            duraciones.add(posicion)
+    return fechas, duraciones
+
+
+def _epoca(zf):
+    raiz = parse(zf.open('xl/workbook.xml')).getroot()
+    propiedades = raiz.find(f'{_NS}workbookPr')
+    fecha1904 = propiedades is not None and propiedades.get('date1904', '').lower() in ('1', 'true')
+    return CALENDAR_MAC_1904 if fecha1904 else CALENDAR_WINDOWS_1900
+
+
+def _numero(valor):
+    if '.' in valor or 'E' in valor or 'e' in valor:
+        return float(valor)
+    return int(valor)
+
+
+def _columna(referencia, cache={}):
+    """Número de columna de una referencia tipo 'AB12'"""
+    letras = referencia.rstrip('0123456789')
+    if letras not in cache:
+        numero = 0
+        for letra in letras:
+            numero = numero * 26 + ord(letra) - 64
+        cache[letras] = numero
+    return cache[letras]
+
+
+class _Contexto:
+    __slots__ = ('textos', 'fechas', 'duraciones', 'epoca')
+
+    def __init__(self, zf):
+        self.textos = _textos_compartidos(zf)
+        self.fechas, self.duraciones = _formatos_de_fecha(zf)
+        self.epoca = _epoca(zf)
+
+
+def _valor_celda(celda, contexto):
+    """Valor de una celda con los mismos tipos que openpyxl (data_only=False)"""
+    tipo = celda.get('t', 'n')
+    formula = celda.find(_FORMULA)
+    if formula is not None:
+        if formula.get('t') in ('shared', 'array', 'dataTable'):
+            raise FormatoNoSoportado(f"Fórmula {formula.get('t')} en {celda.get('r')}")
+        return '=' + (formula.text or '')
+
+    if tipo == 'inlineStr':
+        nodo = celda.find(_TEXTO_EN_LINEA)
+        return _texto(nodo) if nodo is not None else None
+
+    valor = celda.findtext(_VALOR) or None
+    if valor is None:
+        return None
+    if tipo == 'n':
+        valor = _numero(valor)
+        estilo = int(celda.get('s') or 0)
+        if estilo in contexto.fechas:
+            try:
+                return from_excel(valor, contexto.epoca, timedelta=estilo in contexto.duraciones)
+            except (OverflowError, ValueError):
+                return '#VALUE!'
+        return valor
+    if tipo == 's':
+        return contexto.textos[int(valor)]
+    if tipo == 'b':
+        return bool(int(valor))
+    if tipo == 'd':
+        return from_ISO8601(valor)
+    return valor
+
+
+def _leer_filas(fuente, contexto):
+    """Filas de la hoja como tuplas del mismo ancho, desde la fila 1 hasta la última con celdas"""
+    filas = {}
+    ancho = 0
+    numero = 0
+    for _, nodo in iterparse(fuente):
+        if nodo.tag != _FILA:
+            continue
+        numero = int(float(nodo.get('r'))) if nodo.get('r') else numero + 1
+        columna = 0
+        valores = {}
+        for celda in nodo:
+            if celda.tag != _CELDA:
+                continue
+            referencia = celda.get('r')
+            columna = _columna(referencia) if referencia else columna + 1
+            valores[columna] = _valor_celda(celda, contexto)
+        if valores:
+            filas[numero] = valores
+            ancho = max(ancho, max(valores))
+        nodo.clear()
+
+    vacia = (None,) * ancho
+    return tuple(
+        tuple(filas[n].get(c) for c in range(1, ancho + 1)) if n in filas else vacia
+        for n in range(1, max(filas, default=0) + 1)
+    )
+
+
+def leer_hojas(ruta, nombres=None):
+    """
+    Lee las hojas indicadas (todas si no se indican).
+
+    Devuelve (filas por hoja, encabezado por hoja), igual que la lectura con
+    openpyxl de indices.py.
+    """
+    hojas, encabezados = {}, {}
+    with zipfile.ZipFile(ruta) as zf:
+        contexto = _Contexto(zf)
+        for nombre, parte in respaldo.hojas_del_libro(zf).items():
+            if not parte.startswith('xl/worksheets/') or (nombres is not None and nombre not in nombres):
+                continue
+            with zf.open(parte) as fuente:
+                filas = _leer_filas(fuente, contexto)
+            encabezados[nombre] = filas[0] if filas else ()
+            hojas[nombre] = filas[1:]
+    return hojas, encabezados
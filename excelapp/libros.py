@@ -0,0 +1,177 @@
+"""
+Disposición de las hojas en archivos Excel.
+
+Con DISPOSICION_EXCEL = 'unico' (por defecto) todas las hojas viven en
+RUTA_EXCEL. Con 'por_entidad' cada entidad de ENTITY_CONFIG tiene su propio
+archivo junto a RUTA_EXCEL (FinancieroG_proveedor.xlsx, ..._cliente.xlsx,
+..._gastos.xlsx): guardar un movimiento de proveedor solo reescribe el
+archivo de proveedores y los lectores de las otras entidades conservan su
+caché.
+
+Quien necesite un solo archivo puede exportar el libro combinado.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from openpyxl import Workbook, load_workbook
+
+DISPOSICION_EXCEL = getattr(settings, 'DISPOSICION_EXCEL', 'unico')
+
+# Hojas de cada entidad, en el orden del libro combinado
+HOJAS_POR_ENTIDAD = {
+    'proveedor': ('Proveedores', 'Resumen'),
+    'cliente': ('ProveedoresCliente', 'ResumenCliente'),
+    'gastos': ('Gastos',),
+}
+
+_ENTIDAD_DE_HOJA = {hoja: entidad for entidad, hojas in HOJAS_POR_ENTIDAD.items() for hoja in hojas}
+
+
+def por_entidad():
+    return DISPOSICION_EXCEL == 'por_entidad'
+
+
+def ruta_entidad(entidad):
+    base, extension = os.path.splitext(settings.RUTA_EXCEL)
+    return f"{base}_{entidad}{extension}"
+
+
+def ruta_hoja(sheet_name):
+    """Archivo donde vive la hoja según la disposición configurada"""
+    entidad = _ENTIDAD_DE_HOJA.get(sheet_name)
+    if por_entidad() and entidad:
+        return ruta_entidad(entidad)
+    return settings.RUTA_EXCEL
+
+
+def rutas():
+    """Archivos que forman el libro en la disposición actual"""
+    if por_entidad():
+        return [ruta_entidad(entidad) for entidad in HOJAS_POR_ENTIDAD]
+    return [settings.RUTA_EXCEL]
+
+
+def _sincronizar(ruta):
+    """Fuerza a disco el contenido del archivo"""
+    with open(ruta, 'r+b') as f:
+        os.fsync(f.fileno())
+
+
+def _sincronizar_carpeta(ruta):
+    """Fuerza a disco la entrada del archivo en su carpeta (no se puede en Windows)"""
+    try:
+        fd = os.open(os.path.dirname(ruta) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def escribir_atomico(ruta, contenido):
+    """
+    Escribe un archivo mediante temporal + rename para no dejarlo a medias.
+
+    El contenido y la entrada en la carpeta se fuerzan a disco antes de
+    volver, así que lo escrito sobrevive a un corte de luz.
+    """
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    _sincronizar_carpeta(ruta)
+
+
+def guardar_libro(wb, ruta):
+    """
+    Guarda el libro mediante temporal + rename para no dejarlo a medias.
+
+    Una vez reemplazado el archivo se publica su versión nueva en la caché
+    de lectura (indices.refrescar).
+    """
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta) or '.', prefix='.tmp-', suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(temporal)
+        _sincronizar(temporal)
+        if os.path.exists(ruta):
+            shutil.copymode(ruta, temporal)  # mkstemp crea el temporal solo para el dueño
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    _sincronizar_carpeta(ruta)
+
+    from . import indices
+    indices.refrescar(ruta)
+
+
+def _copiar_hoja(origen, destino):
+    for fila in origen.iter_rows(values_only=True):
+        destino.append(fila)
+
+
+def libro_combinado():
+    """Libro con las hojas de todos los archivos de la disposición actual"""
+    combinado = Workbook()
+    combinado.remove(combinado.active)
+    for ruta in rutas():
+        if not os.path.exists(ruta):
+            continue
+        wb = load_workbook(ruta, read_only=True)
+        try:
+            for ws in wb.worksheets:
+                if ws.title not in combinado.sheetnames:
+                    _copiar_hoja(ws, combinado.create_sheet(ws.title))
+        finally:
+            wb.close()
+    return combinado
+
+
+def exportar_combinado():
+    """Contenido .xlsx del libro combinado"""
+    salida = io.BytesIO()
+    libro_combinado().save(salida)
+    return salida.getvalue()
+
+
+def separar(origen=None):
+    """
+    Reparte las hojas de un libro único en los archivos por entidad.
+
+    Las hojas que no pertenecen a ninguna entidad no se copian. No
+    sobrescribe archivos existentes; devuelve las rutas escritas.
+    """
+    origen = origen or settings.RUTA_EXCEL
+    existentes = [ruta_entidad(entidad) for entidad in HOJAS_POR_ENTIDAD if os.path.exists(ruta_entidad(entidad))]
+    if existentes:
+        raise ValueError(f"Ya existe {existentes[0]}")
+
+    wb = load_workbook(origen)
+    escritas = []
+    for entidad, hojas in HOJAS_POR_ENTIDAD.items():
+        ruta = ruta_entidad(entidad)
+        nuevo = Workbook()
+        nuevo.remove(nuevo.active)
+        for hoja in hojas:
+            if hoja in wb.sheetnames:
+                _copiar_hoja(wb[hoja], nuevo.create_sheet(hoja))
+        guardar_libro(nuevo, ruta)
+        escritas.append(ruta)
+    return escritas
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import arranque
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de importación al arrancar un proceso (python -X importtime) y lo registra'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3, help='Intérpretes a medir; se toma el más rápido')
+        parser.add_argument('--top', type=int, default=10, help='Paquetes a mostrar')
+        parser.add_argument('--no-registrar', action='store_true', help='Solo muestra la medición')
+
+    def handle(self, *args, **options):
+        try:
+            medicion = arranque.medir(max(options['repeticiones'], 1))
+        except RuntimeError as e:
+            raise CommandError(f"No se pudo medir el arranque: {e}")
+
+        previa = arranque.anterior()
+        linea = f"Importación al arrancar: {medicion['total_ms']:.1f} ms"
+        if previa:
+            linea += f" (antes {previa['total_ms']:.1f} ms, {medicion['total_ms'] - previa['total_ms']:+.1f} ms)"
+        self.stdout.write(linea)
+
+        paquetes = sorted(medicion['paquetes'].items(), key=lambda item: item[1], reverse=True)
+        for paquete, ms in paquetes[:options['top']]:
+            self.stdout.write(f"  {paquete}: {ms:.1f} ms")
+
+        if 'pandas' in medicion['paquetes']:
+            self.stdout.write(self.style.WARNING('pandas se importa al arrancar; debería cargarse solo al exportar'))
+
+        if not options['no_registrar']:
+            arranque.registrar(medicion)
+            self.stdout.write(self.style.SUCCESS(f"Medición agregada a {arranque.ruta_registro()}"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import cierres
+
+
+class Command(BaseCommand):
+    help = 'Cierra los meses terminados y revisa los cierres alterados por ediciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Cierra (o vuelve a cerrar) un mes específico AAAA-MM')
+        parser.add_argument('--revisar', action='store_true',
+                            help='Vuelve a cerrar solo los meses cerrados cuyas filas cambiaron')
+        parser.add_argument('--listar', action='store_true', help='Lista los cierres y su estado')
+
+    def handle(self, *args, **options):
+        if options['listar']:
+            alterados = cierres.meses_alterados()
+            for mes, cierre in sorted(cierres.cierres().items()):
+                estado = f"ALTERADO ({', '.join(alterados[mes])})" if mes in alterados else 'al día'
+                self.stdout.write(f"{mes}  v{cierre['version']:<3} {cierre['origen']:<12} {estado}")
+            for mes in cierres.meses_pendientes():
+                self.stdout.write(f"{mes}  sin cierre")
+            return
+
+        if options['revisar']:
+            recerrados = cierres.recerrar_alterados(origen='comando')
+            if not recerrados:
+                self.stdout.write("Todos los cierres están al día")
+            for mes in recerrados:
+                self.stdout.write(self.style.WARNING(f"Mes {mes} alterado: se volvió a cerrar"))
+            return
+
+        if options['mes']:
+            try:
+                cierre = cierres.cerrar_mes(options['mes'], origen='comando')
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Mes {cierre['mes']} cerrado (versión {cierre['version']})"))
+            return
+
+        cerrados = cierres.cerrar_pendientes(origen='comando')
+        if not cerrados:
+            self.stdout.write("No hay meses pendientes de cierre")
+        for mes in cerrados:
+            self.stdout.write(self.style.SUCCESS(f"Mes {mes} cerrado"))
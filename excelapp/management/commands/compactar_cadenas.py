@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import archivo, cierres, compactacion
+
+
+class Command(BaseCommand):
+    help = 'Mueve las cadenas de facturas cerradas al libro de cadenas y deja una fila de resumen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo lista las cadenas que se compactarían')
+
+    def handle(self, *args, **options):
+        # Solo se compactan cadenas de meses cerrados
+        for mes in cierres.cerrar_pendientes(origen='compactacion'):
+            self.stdout.write(f"Mes {mes} cerrado")
+
+        for sheet_name in archivo.HOJAS_MOVIMIENTOS:
+            if options['simular']:
+                cerradas = compactacion.cadenas_cerradas(sheet_name)
+                for clave, posiciones in sorted(cerradas.items()):
+                    self.stdout.write(f"{sheet_name}: {clave} ({len(posiciones)} filas)")
+                self.stdout.write(f"{sheet_name}: {len(cerradas)} cadenas para compactar")
+                continue
+
+            try:
+                cadenas, filas = compactacion.compactar(sheet_name)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"{sheet_name}: {cadenas} cadenas compactadas, {filas} filas movidas al archivo"
+            ))
@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from openpyxl import load_workbook
+
+from excelapp import archivo, lector, libros
+
+
+class Command(BaseCommand):
+    help = 'Verifica que el lector liviano dé las mismas filas que openpyxl en los libros de la aplicación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='*', help='Libros a comparar (por defecto los activos y los de archivo)')
+
+    def handle(self, *args, **options):
+        rutas = options['rutas'] or (
+            libros.rutas()
+            + [archivo.ruta_anio(anio) for anio in archivo.anios_archivados()]
+            + [archivo.ruta_cadenas()]
+        )
+
+        diferencias = 0
+        for ruta in rutas:
+            if not os.path.exists(ruta):
+                continue
+
+            inicio = time.perf_counter()
+            wb = load_workbook(ruta)
+            esperado = {ws.title: tuple(ws.iter_rows(values_only=True)) for ws in wb.worksheets}
+            tiempo_openpyxl = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            try:
+                hojas, encabezados = lector.leer_hojas(ruta)
+            except lector.FormatoNoSoportado as e:
+                self.stdout.write(self.style.WARNING(f"{ruta}: {e}"))
+                diferencias += 1
+                continue
+            tiempo_lector = time.perf_counter() - inicio
+
+            self.stdout.write(
+                f"{ruta}: openpyxl {tiempo_openpyxl * 1000:.0f} ms, liviano {tiempo_lector * 1000:.0f} ms"
+            )
+            for nombre, filas in esperado.items():
+                obtenidas = ((encabezados[nombre],) + hojas[nombre]) if encabezados.get(nombre) else ()
+                if filas == obtenidas:
+                    self.stdout.write(f"  {nombre}: {len(filas)} filas iguales")
+                    continue
+                diferencias += 1
+                distinta = next(
+                    (n for n, (a, b) in enumerate(zip(filas, obtenidas), 1) if a != b),
+                    min(len(filas), len(obtenidas)) + 1,
+                )
+                self.stdout.write(self.style.ERROR(
+                    f"  {nombre}: {len(filas)} filas con openpyxl, {len(obtenidas)} con el lector; "
+                    f"la fila {distinta} es distinta"
+                ))
+
+        if diferencias:
+            raise CommandError(f"{diferencias} hojas no coinciden")
+        self.stdout.write(self.style.SUCCESS('El lector liviano coincide con openpyxl'))
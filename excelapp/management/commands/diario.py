@@ -0,0 +1,59 @@
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import diario
+
+
+class Command(BaseCommand):
+    help = 'Consulta el diario de cambios: historia de un registro, hoja en una fecha y verificación'
+
+    def add_arguments(self, parser):
+        acciones = parser.add_subparsers(dest='accion', required=True)
+
+        historial = acciones.add_parser('historial', help='Muestra los cambios de un registro')
+        historial.add_argument('hoja', choices=sorted(diario.HOJAS))
+        historial.add_argument('id', help='Id del registro')
+
+        reconstruir = acciones.add_parser('reconstruir', help='Muestra la hoja tal como estaba en una fecha')
+        reconstruir.add_argument('hoja', choices=sorted(diario.HOJAS))
+        reconstruir.add_argument('--hasta', help='Fecha (AAAA-MM-DD[THH:MM]) o número de evento')
+
+        acciones.add_parser('verificar', help='Comprueba que repetir el diario dé cada hoja vigente')
+
+    def handle(self, *args, **options):
+        accion = options['accion']
+
+        if accion == 'historial':
+            id_fila = int(options['id']) if options['id'].isdigit() else options['id']
+            eventos = diario.historial(options['hoja'], id_fila)
+            if not eventos:
+                raise CommandError(f"El diario de {options['hoja']} no tiene cambios del registro {options['id']}")
+            for evento in eventos:
+                valores = ', '.join('' if valor is None else str(valor) for valor in evento.get('v', ()))
+                self.stdout.write(f"#{evento['n']} {evento['f']} {evento['op']}: {valores}")
+
+        elif accion == 'reconstruir':
+            hasta = options['hasta']
+            if hasta:
+                try:
+                    hasta = int(hasta) if hasta.isdigit() else datetime.fromisoformat(hasta)
+                except ValueError:
+                    raise CommandError("La fecha debe tener el formato AAAA-MM-DD[THH:MM]")
+            for fila in diario.reconstruir(options['hoja'], hasta):
+                self.stdout.write(' | '.join('' if valor is None else str(valor) for valor in fila))
+
+        elif accion == 'verificar':
+            distintas = 0
+            for sheet_name in diario.HOJAS:
+                if not os.path.exists(diario.ruta_diario(sheet_name)):
+                    self.stdout.write(f"{sheet_name}: sin diario")
+                elif diario.verificar(sheet_name):
+                    self.stdout.write(f"{sheet_name}: coincide")
+                else:
+                    distintas += 1
+                    self.stdout.write(self.style.ERROR(f"{sheet_name}: el diario no coincide con la hoja"))
+            if distintas:
+                raise CommandError(f"{distintas} hojas no coinciden con su diario")
+            self.stdout.write(self.style.SUCCESS('El diario coincide con el Excel'))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import libros, respaldo
+
+
+class Command(BaseCommand):
+    help = 'Separa el libro único en un archivo por entidad o vuelve a juntar los archivos en uno'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='accion', required=True)
+
+        separar = subparsers.add_parser('separar', help='Reparte las hojas de RUTA_EXCEL en un archivo por entidad')
+        separar.add_argument('--origen', help='Libro a separar (por defecto RUTA_EXCEL)')
+
+        combinar = subparsers.add_parser('combinar', help='Junta los archivos de la disposición actual en un libro')
+        combinar.add_argument('--destino', help='Archivo de salida (por defecto RUTA_EXCEL)')
+
+    def handle(self, *args, **options):
+        if options['accion'] == 'separar':
+            try:
+                escritas = libros.separar(options['origen'])
+            except (ValueError, FileNotFoundError) as e:
+                raise CommandError(str(e))
+            for ruta in escritas:
+                self.stdout.write(f"Escrito {ruta}")
+            self.stdout.write(self.style.SUCCESS("Configure DISPOSICION_EXCEL = 'por_entidad' para usar los archivos"))
+
+        elif options['accion'] == 'combinar':
+            destino = options['destino'] or settings.RUTA_EXCEL
+            if destino == settings.RUTA_EXCEL:
+                respaldo.crear_instantanea(destino, origen='libro:combinar')
+            libros.guardar_libro(libros.libro_combinado(), destino)
+            self.stdout.write(self.style.SUCCESS(f"Libro combinado en {destino}"))
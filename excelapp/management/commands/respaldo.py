@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import libros, respaldo
+
+
+class Command(BaseCommand):
+    help = 'Crea, lista, restaura y compara respaldos incrementales del Excel'
+
+    def add_arguments(self, parser):
+        acciones = parser.add_subparsers(dest='accion', required=True)
+
+        crear = acciones.add_parser('crear', help='Toma una instantánea del Excel actual')
+        crear.add_argument('--origen', default='manual', help='Etiqueta que se guarda en la instantánea')
+
+        acciones.add_parser('listar', help='Lista las instantáneas disponibles')
+
+        restaurar = acciones.add_parser('restaurar', help='Restaura una instantánea sobre el Excel')
+        restaurar.add_argument('id', nargs='?', help='Id de la instantánea a restaurar')
+        restaurar.add_argument('--fecha', help='Restaura el estado vigente en esa fecha (AAAA-MM-DD[THH:MM])')
+        restaurar.add_argument('--destino', help='Archivo de salida (por defecto el archivo respaldado)')
+
+        diff = acciones.add_parser('diff', help='Compara dos instantáneas')
+        diff.add_argument('id_a')
+        diff.add_argument('id_b')
+
+    def handle(self, *args, **options):
+        accion = options['accion']
+
+        if accion == 'crear':
+            for ruta in libros.rutas():
+                manifiesto = respaldo.crear_instantanea(ruta, origen=options['origen'])
+                if manifiesto is None:
+                    raise CommandError(f"No existe el archivo Excel a respaldar: {ruta}")
+                self.stdout.write(self.style.SUCCESS(f"Instantánea {manifiesto['id']} lista ({manifiesto['archivo']})"))
+
+        elif accion == 'listar':
+            for manifiesto in respaldo.listar_instantaneas():
+                tamano = sum(parte['tamano'] for parte in manifiesto['partes'])
+                self.stdout.write(f"{manifiesto['id']}  {manifiesto['origen']:<20} {tamano:>10} bytes")
+
+        elif accion == 'restaurar':
+            try:
+                if options['fecha']:
+                    # Con la fecha se restaura cada archivo del libro al estado que tenía en ese momento
+                    fecha = datetime.fromisoformat(options['fecha'])
+                    manifiestos = [
+                        respaldo.instantanea_en_fecha(fecha, os.path.basename(ruta)) for ruta in libros.rutas()
+                    ]
+                    if None in manifiestos:
+                        raise CommandError(f"No hay instantáneas anteriores a {options['fecha']}")
+                elif options['id']:
+                    manifiestos = [respaldo.cargar_instantanea(options['id'])]
+                else:
+                    raise CommandError("Indique el id de la instantánea o --fecha")
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            if options['destino'] and len(manifiestos) > 1:
+                raise CommandError("--destino solo se puede usar al restaurar un archivo")
+            for manifiesto in manifiestos:
+                try:
+                    destino = respaldo.restaurar_instantanea(manifiesto, options['destino'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS(f"Instantánea {manifiesto['id']} restaurada en {destino}"))
+
+        elif accion == 'diff':
+            try:
+                cambios = respaldo.comparar_instantaneas(
+                    respaldo.cargar_instantanea(options['id_a']),
+                    respaldo.cargar_instantanea(options['id_b']),
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            if not cambios:
+                self.stdout.write("Sin diferencias")
+            for cambio in cambios:
+                nombre = cambio['hoja'] or cambio['parte']
+                linea = f"{nombre}: {cambio['estado']}"
+                if 'filas_agregadas' in cambio:
+                    linea += (
+                        f" (+{len(cambio['filas_agregadas'])} filas,"
+                        f" -{len(cambio['filas_eliminadas'])} filas,"
+                        f" ~{len(cambio['filas_modificadas'])} filas)"
+                    )
+                self.stdout.write(linea)
@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from excelapp import archivo, cierres
+
+
+class Command(BaseCommand):
+    help = 'Pasa un año terminado a su libro de archivo y arrastra los saldos iniciales al libro activo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, help='Año a archivar (por defecto el año anterior)')
+        parser.add_argument('--listar', action='store_true', help='Lista los años archivados')
+
+    def handle(self, *args, **options):
+        if options['listar']:
+            for anio in archivo.anios_archivados():
+                datos = archivo.manifiesto()['anios'][str(anio)]
+                filas = sum(hoja['filas'] for hoja in datos['hojas'].values())
+                self.stdout.write(f"{anio}  {datos['archivo']}  {filas} filas  ({datos['fecha'][:10]})")
+            return
+
+        anio = options['anio'] or date.today().year - 1
+
+        # Los meses del año deben quedar cerrados antes de que sus filas salgan del libro activo
+        for mes in cierres.cerrar_pendientes(origen='rotacion'):
+            self.stdout.write(f"Mes {mes} cerrado")
+
+        try:
+            resumen = archivo.rotar_anio(anio)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Las aperturas reemplazan a las filas archivadas en el resumen de saldos
+        from excelapp.views import recalcular_resumen
+        recalcular_resumen('proveedor')
+        recalcular_resumen('cliente')
+        cierres.recerrar_alterados(origen='rotacion')
+
+        for sheet_name, datos in resumen.items():
+            self.stdout.write(
+                f"{sheet_name}: {datos['archivadas']} filas archivadas, {datos['aperturas']} saldos iniciales"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Año {anio} archivado en {archivo.ruta_anio(anio)}"))
@@ -0,0 +1,19 @@
+from . import indices
+
+
+class VersionExcelMiddleware:
+    """
+    Fija para toda la petición la versión de los archivos Excel que se leyó
+    primero, de modo que una vista nunca mezcla filas de dos versiones ni
+    espera a que otro hilo termine de guardar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = indices.fijar_version()
+        try:
+            return self.get_response(request)
+        finally:
+            indices.soltar_version(token)
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0004_alter_movimiento_total_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Gasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('categoria', models.CharField(choices=[('Parqueadero', 'Parqueadero'), ('Flete', 'Flete'), ('Varios', 'Varios')], max_length=20)),
+                ('placa', models.CharField(blank=True, max_length=10, null=True)),
+                ('conductor', models.CharField(blank=True, max_length=255, null=True)),
+                ('precio', models.DecimalField(decimal_places=0, max_digits=15)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='resumen',
+            old_name='ahorros',
+            new_name='Abonos',
+        ),
+        migrations.RenameField(
+            model_name='resumen_cliente',
+            old_name='ahorros',
+            new_name='Abonos',
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='estado',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='id_factura',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='estado',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='id_factura',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['proveedor', 'fecha', 'estado', 'detalle', 'total'], name='mov_prov_fecha_cubre'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha', 'estado', 'detalle', 'total'], name='mov_fecha_cubre'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['proveedor', 'fecha', 'estado', 'detalle', 'total'], name='movcli_prov_fecha_cubre'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['fecha', 'estado', 'detalle', 'total'], name='movcli_fecha_cubre'),
+        ),
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['fecha', 'categoria', 'placa', 'precio'], name='gasto_fecha_cubre'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:11
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0005_replica_lectura'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gasto',
+            index=models.Index(fields=['categoria', 'fecha', 'precio'], name='gasto_categoria_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(django.db.models.functions.text.Lower('proveedor'), models.F('fecha'), name='mov_prov_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(django.db.models.functions.text.Lower('estado'), models.F('fecha'), name='mov_estado_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(django.db.models.functions.text.Lower('id_factura'), models.F('fecha'), name='mov_factura_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['id_factura', 'proveedor', 'fecha'], name='mov_factura_prov_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(django.db.models.functions.text.Lower('proveedor'), models.F('fecha'), name='movcli_prov_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(django.db.models.functions.text.Lower('estado'), models.F('fecha'), name='movcli_estado_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(django.db.models.functions.text.Lower('id_factura'), models.F('fecha'), name='movcli_factura_min_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['id_factura', 'proveedor', 'fecha'], name='movcli_factura_prov_fecha'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0006_filtros_listados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gasto',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movimiento',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movimiento_cliente',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0007_fecha_opcional'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_prov_min_fecha',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_estado_min_fecha',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_factura_min_fecha',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento_cliente',
+            name='movcli_prov_min_fecha',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento_cliente',
+            name='movcli_estado_min_fecha',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento_cliente',
+            name='movcli_factura_min_fecha',
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='estado_norm',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='id_factura_norm',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='proveedor_norm',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='estado_norm',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='id_factura_norm',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='proveedor_norm',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['proveedor_norm', 'fecha'], name='mov_prov_norm_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['estado_norm', 'fecha'], name='mov_estado_norm_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['id_factura_norm', 'fecha'], name='mov_factura_norm_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['proveedor_norm', 'fecha'], name='movcli_prov_norm_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['estado_norm', 'fecha'], name='movcli_estado_norm_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento_cliente',
+            index=models.Index(fields=['id_factura_norm', 'fecha'], name='movcli_factura_norm_fecha'),
+        ),
+    ]
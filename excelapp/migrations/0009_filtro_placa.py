@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0008_filtros_normalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasto',
+            name='placa_norm',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excelapp', '0009_filtro_placa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gasto',
+            name='huella_fila',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='gasto',
+            name='id_hoja',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='huella_fila',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='id_hoja',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='huella_fila',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='movimiento_cliente',
+            name='id_hoja',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resumen',
+            name='huella_fila',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='resumen',
+            name='id_hoja',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resumen_cliente',
+            name='huella_fila',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='resumen_cliente',
+            name='id_hoja',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='resumen',
+            name='proveedor',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='resumen_cliente',
+            name='proveedor',
+            field=models.CharField(max_length=255),
+        ),
+    ]
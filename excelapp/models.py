@@ -1,44 +1,93 @@
 from django.db import models
 
 class Movimiento(models.Model):
-    fecha = models.DateField()
+    fecha = models.DateField(blank=True, null=True)
     proveedor = models.CharField(max_length=255)
     detalle = models.CharField(max_length=50)
     obs = models.TextField(blank=True, null=True)
     total = models.DecimalField(max_digits=15, decimal_places=0)
     id_factura = models.CharField(max_length=20, blank=True, null=True)  # NUEVO
     estado = models.CharField(max_length=20, blank=True, null=True)      # NUEVO ('Activa', 'Inactiva', 'Abonado')
+    # Solo los llena la réplica de lectura: el Id de la fila en la hoja (nulo si no es
+    # numérico; `id` es la llave de la réplica) y la huella de la fila, para los cambios por fila
+    id_hoja = models.IntegerField(blank=True, null=True)
+    huella_fila = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    # Solo los llena la réplica de lectura: el valor sin espacios alrededor y en
+    # minúsculas (indices.clave_normalizada, también con tildes y eñes) para los filtros
+    proveedor_norm = models.CharField(max_length=255, blank=True, default='')
+    estado_norm = models.CharField(max_length=20, blank=True, default='')
+    id_factura_norm = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        # Cubren los listados por proveedor y los agregados por fecha de la réplica de lectura
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha', 'estado', 'detalle', 'total'], name='mov_prov_fecha_cubre'),
+            models.Index(fields=['fecha', 'estado', 'detalle', 'total'], name='mov_fecha_cubre'),
+            # Filtros de los listados (consultas.py), sobre los valores normalizados
+            models.Index(fields=['proveedor_norm', 'fecha'], name='mov_prov_norm_fecha'),
+            models.Index(fields=['estado_norm', 'fecha'], name='mov_estado_norm_fecha'),
+            models.Index(fields=['id_factura_norm', 'fecha'], name='mov_factura_norm_fecha'),
+            models.Index(fields=['id_factura', 'proveedor', 'fecha'], name='mov_factura_prov_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.fecha} - {self.proveedor} - {self.total}"
 
 class Resumen(models.Model):
-    proveedor = models.CharField(max_length=255, unique=True)
+    proveedor = models.CharField(max_length=255)
     facturas = models.DecimalField(max_digits=15, decimal_places=0, default=0)
     Abonos = models.DecimalField(max_digits=15, decimal_places=0, default=0)
     saldo = models.DecimalField(max_digits=15, decimal_places=0, default=0)
+    # Solo los llena la réplica de lectura: el Id de la fila en la hoja (nulo si no es
+    # numérico; `id` es la llave de la réplica) y la huella de la fila, para los cambios por fila
+    id_hoja = models.IntegerField(blank=True, null=True)
+    huella_fila = models.CharField(max_length=32, blank=True, default='', db_index=True)
 
     def __str__(self):
         return f"{self.proveedor} - Saldo: {self.saldo}"
 
 
 class Movimiento_Cliente(models.Model):
-    fecha = models.DateField()
+    fecha = models.DateField(blank=True, null=True)
     proveedor = models.CharField(max_length=255)
     detalle = models.CharField(max_length=50)
     obs = models.TextField(blank=True, null=True)
     total = models.DecimalField(max_digits=15, decimal_places=0)
     id_factura = models.CharField(max_length=20, blank=True, null=True)  # NUEVO
     estado = models.CharField(max_length=20, blank=True, null=True)      # NUEVO ('Activa', 'Inactiva', 'Abonado')x
+    # Solo los llena la réplica de lectura: el Id de la fila en la hoja (nulo si no es
+    # numérico; `id` es la llave de la réplica) y la huella de la fila, para los cambios por fila
+    id_hoja = models.IntegerField(blank=True, null=True)
+    huella_fila = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    # Solo los llena la réplica de lectura: el valor sin espacios alrededor y en
+    # minúsculas (indices.clave_normalizada, también con tildes y eñes) para los filtros
+    proveedor_norm = models.CharField(max_length=255, blank=True, default='')
+    estado_norm = models.CharField(max_length=20, blank=True, default='')
+    id_factura_norm = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha', 'estado', 'detalle', 'total'], name='movcli_prov_fecha_cubre'),
+            models.Index(fields=['fecha', 'estado', 'detalle', 'total'], name='movcli_fecha_cubre'),
+            # Filtros de los listados (consultas.py), sobre los valores normalizados
+            models.Index(fields=['proveedor_norm', 'fecha'], name='movcli_prov_norm_fecha'),
+            models.Index(fields=['estado_norm', 'fecha'], name='movcli_estado_norm_fecha'),
+            models.Index(fields=['id_factura_norm', 'fecha'], name='movcli_factura_norm_fecha'),
+            models.Index(fields=['id_factura', 'proveedor', 'fecha'], name='movcli_factura_prov_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.fecha} - {self.proveedor} - {self.total}"
 
 class Resumen_Cliente(models.Model):
-    proveedor = models.CharField(max_length=255, unique=True)
+    proveedor = models.CharField(max_length=255)
     facturas = models.DecimalField(max_digits=15, decimal_places=0, default=0)
     Abonos = models.DecimalField(max_digits=15, decimal_places=0, default=0)
     saldo = models.DecimalField(max_digits=15, decimal_places=0, default=0)
+    # Solo los llena la réplica de lectura: el Id de la fila en la hoja (nulo si no es
+    # numérico; `id` es la llave de la réplica) y la huella de la fila, para los cambios por fila
+    id_hoja = models.IntegerField(blank=True, null=True)
+    huella_fila = models.CharField(max_length=32, blank=True, default='', db_index=True)
 
     def __str__(self):
         return f"{self.proveedor} - Saldo: {self.saldo}"
@@ -50,11 +99,23 @@ class Gasto(models.Model):
         ('Varios', 'Varios'),
     ]
 
-    fecha = models.DateField()
+    fecha = models.DateField(blank=True, null=True)
     categoria = models.CharField(max_length=20, choices=CATEGORIAS)
     placa = models.CharField(max_length=10, blank=True, null=True)
     conductor = models.CharField(max_length=255, blank=True, null=True)
     precio = models.DecimalField(max_digits=15, decimal_places=0)
+    # Solo los llena la réplica de lectura: el Id de la fila en la hoja (nulo si no es
+    # numérico; `id` es la llave de la réplica) y la huella de la fila, para los cambios por fila
+    id_hoja = models.IntegerField(blank=True, null=True)
+    huella_fila = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    # Solo la llena la réplica de lectura: la placa normalizada (indices.clave_normalizada) para el filtro
+    placa_norm = models.CharField(max_length=10, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'categoria', 'placa', 'precio'], name='gasto_fecha_cubre'),
+            models.Index(fields=['categoria', 'fecha', 'precio'], name='gasto_categoria_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.fecha} - {self.categoria} - {self.precio}"
\ No newline at end of file
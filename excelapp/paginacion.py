@@ -0,0 +1,178 @@
+"""
+Paginación por cursor (keyset) sobre índices ya ordenados.
+
+En lugar de ordenar y contar toda la historia para mostrar la página N, la
+página se define por la clave de su último (o primer) elemento. Con bisect
+se ubica esa clave en el índice y se recorren solo las filas necesarias
+para llenar la página. Con filtros, la misma paginación se hace en SQL sobre
+una consulta del ORM (paginar_consulta).
+"""
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from django.db.models import Q
+
+
+def codificar_cursor(clave):
+    texto = json.dumps(list(clave), separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve la clave del cursor o None si no es válido"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        clave = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+    except (ValueError, TypeError):
+        return None
+    return tuple(clave) if isinstance(clave, list) else None
+
+
+class PaginaKeyset:
+    """Página de resultados con cursores hacia la página anterior y la siguiente"""
+
+    def __init__(self, object_list, cursor_anterior=None, cursor_siguiente=None):
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar_keyset(indice, obtener, por_pagina=10, despues=None, antes=None, filtro=None):
+    """
+    Pagina un `IndiceOrdenado` (claves ascendentes) en orden descendente.
+
+    `obtener(posicion)` materializa un elemento y `filtro(posicion)` decide
+    si la fila entra en el resultado. `despues` y `antes` son cursores
+    codificados: el primero pide la página siguiente a esa clave y el segundo
+    la anterior. Solo se recorren las filas hasta completar la página.
+    """
+    claves, posiciones = indice.claves, indice.posiciones
+    clave_despues = decodificar_cursor(despues)
+    clave_antes = decodificar_cursor(antes)
+
+    try:
+        if clave_antes is not None:
+            # Página anterior: claves mayores al cursor, recorridas hacia arriba
+            inicio, paso = bisect_right(claves, clave_antes), 1
+        elif clave_despues is not None:
+            inicio, paso = bisect_left(claves, clave_despues) - 1, -1
+        else:
+            inicio, paso = len(claves) - 1, -1
+    except TypeError:
+        # Cursor con tipos que no corresponden al índice: volver a la primera página
+        clave_antes = clave_despues = None
+        inicio, paso = len(claves) - 1, -1
+
+    encontrados = []
+    i = inicio
+    while 0 <= i < len(claves) and len(encontrados) <= por_pagina:
+        if filtro is None or filtro(posiciones[i]):
+            encontrados.append((claves[i], posiciones[i]))
+        i += paso
+
+    hay_mas = len(encontrados) > por_pagina
+    encontrados = encontrados[:por_pagina]
+
+    if clave_antes is not None:
+        encontrados.reverse()
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = clave_despues is not None, hay_mas
+
+    if not encontrados:
+        return PaginaKeyset([])
+
+    return PaginaKeyset(
+        [obtener(posicion) for _, posicion in encontrados],
+        cursor_anterior=codificar_cursor(encontrados[0][0]) if hay_anterior else None,
+        cursor_siguiente=codificar_cursor(encontrados[-1][0]) if hay_siguiente else None,
+    )
+
+
+def _valores_cursor(clave, claves):
+    """
+    Valores de la base para la clave del cursor, o None si no corresponde a `claves`.
+
+    Los cursores de los índices en memoria llevan al final la posición de la
+    fila donde la consulta lleva su llave; solo cambia el desempate entre filas
+    con la misma clave.
+    """
+    if clave is None or len(clave) != len(claves):
+        return None
+    try:
+        return tuple(de_cursor(valor) for (_, _, de_cursor), valor in zip(claves, clave))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _mas_alla(campos, valores, comparacion):
+    """Condición (a, b, ...) < o > (valores) en orden lexicográfico"""
+    condicion = Q()
+    for i, campo in enumerate(campos):
+        condicion |= Q(**dict(zip(campos[:i], valores[:i])), **{f'{campo}__{comparacion}': valores[i]})
+    return condicion
+
+
+def paginar_consulta(consulta, claves, obtener, campos=(), por_pagina=10, despues=None, antes=None):
+    """
+    Como paginar_keyset, pero sobre una consulta del ORM en orden descendente.
+
+    `claves` son (campo, a_cursor, de_cursor) en orden de prioridad; el último
+    campo tiene que ser único (el Id). El cursor, el orden y el límite van en
+    el SQL, así que solo se leen por_pagina + 1 filas. `obtener(fila)`
+    materializa cada elemento de la página a partir de su fila de values(),
+    que trae además los `campos` que se indiquen.
+    """
+    orden = [campo for campo, _, _ in claves]
+    valores_despues = _valores_cursor(decodificar_cursor(despues), claves)
+    valores_antes = _valores_cursor(decodificar_cursor(antes), claves)
+
+    if valores_antes is not None:
+        # Página anterior: claves mayores al cursor, en orden ascendente
+        consulta = consulta.filter(_mas_alla(orden, valores_antes, 'gt')).order_by(*orden)
+    else:
+        if valores_despues is not None:
+            consulta = consulta.filter(_mas_alla(orden, valores_despues, 'lt'))
+        consulta = consulta.order_by(*(f'-{campo}' for campo in orden))
+
+    filas = list(consulta.values(*orden, *(campo for campo in campos if campo not in orden))[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+
+    if valores_antes is not None:
+        filas.reverse()
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = valores_despues is not None, hay_mas
+
+    if not filas:
+        return PaginaKeyset([])
+
+    def cursor(fila):
+        return codificar_cursor(a_cursor(fila[campo]) for campo, a_cursor, _ in claves)
+
+    return PaginaKeyset(
+        [obtener(fila) for fila in filas],
+        cursor_anterior=cursor(filas[0]) if hay_anterior else None,
+        cursor_siguiente=cursor(filas[-1]) if hay_siguiente else None,
+    )
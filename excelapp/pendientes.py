@@ -0,0 +1,303 @@
+"""
+Cola de escritura del Excel.
+
+Cada guardado de una hoja se anota primero en un diario en disco
+(RUTA_PENDIENTES/<hoja>.json) y después se intenta escribir en el libro.
+Si el archivo está abierto en Excel o bloqueado por OneDrive el cambio no se
+pierde: queda en el diario, las lecturas ya lo muestran (indices.py
+superpone las filas pendientes a las del archivo) y un hilo en segundo plano
+reintenta guardarlo con esperas crecientes hasta que el archivo se libera.
+
+Todos los guardados reemplazan la hoja completa, así que para cada hoja
+basta con el último cambio pendiente; los que agregan filas se suman al
+pendiente anterior.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import openpyxl
+from django.conf import settings
+from openpyxl import load_workbook
+
+from . import libros, respaldo
+
+RUTA_PENDIENTES = getattr(settings, 'RUTA_PENDIENTES', os.path.join(settings.BASE_DIR, 'pendientes'))
+ESPERA_INICIAL = 2    # segundos hasta el primer reintento
+ESPERA_MAXIMA = 60    # tope de la espera entre reintentos
+
+_lock = threading.RLock()
+# hoja -> entrada, cargadas del diario la primera vez. Se reemplaza entero en
+# cada cambio: superponer lo lee sin el candado, porque se llama con el de
+# indices.py tomado y aplicar toma los dos en el orden inverso.
+_entradas = None
+_aplicando = set()    # archivos que se están escribiendo en este momento
+_hilo = None
+_proximo_intento = None
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return {'$fecha_hora': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'$fecha': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {'$decimal': str(valor)}
+    return valor
+
+
+def _de_json(valor):
+    if isinstance(valor, dict):
+        if '$fecha_hora' in valor:
+            return datetime.fromisoformat(valor['$fecha_hora'])
+        if '$fecha' in valor:
+            return date.fromisoformat(valor['$fecha'])
+        if '$decimal' in valor:
+            return Decimal(valor['$decimal'])
+    return valor
+
+
+def _ruta_entrada(hoja):
+    return os.path.join(RUTA_PENDIENTES, f'{hoja}.json')
+
+
+def _guardar_entrada(entrada):
+    contenido = dict(entrada, filas=[[_a_json(v) for v in fila] for fila in entrada['filas']])
+    libros.escribir_atomico(_ruta_entrada(entrada['hoja']), json.dumps(contenido, ensure_ascii=False).encode('utf-8'))
+
+
+def _cargar():
+    """Entradas del diario (con el candado tomado)"""
+    global _entradas
+    if _entradas is None:
+        cargadas = {}
+        if os.path.isdir(RUTA_PENDIENTES):
+            for nombre in sorted(os.listdir(RUTA_PENDIENTES)):
+                if not nombre.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(RUTA_PENDIENTES, nombre), encoding='utf-8') as f:
+                        entrada = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error al leer el cambio pendiente {nombre}: {e}")
+                    continue
+                entrada['filas'] = [[_de_json(v) for v in fila] for fila in entrada['filas']]
+                cargadas[entrada['hoja']] = entrada
+        _entradas = cargadas
+    return _entradas
+
+
+def entradas():
+    """Cambios pendientes, del más antiguo al más reciente"""
+    with _lock:
+        return sorted(_cargar().values(), key=lambda entrada: entrada['fecha'])
+
+
+def hay_pendientes(hojas=None):
+    with _lock:
+        return any(hojas is None or hoja in hojas for hoja in _cargar())
+
+
+def resumen():
+    """Estado de la cola para mostrar en pantalla"""
+    with _lock:
+        return [
+            {
+                'hoja': entrada['hoja'],
+                'fecha': datetime.fromisoformat(entrada['fecha']),
+                'intentos': entrada['intentos'],
+                'error': entrada.get('error', ''),
+                'proximo_intento': _proximo_intento,
+            }
+            for entrada in entradas()
+        ]
+
+
+def encolar(sheet_name, datos, encabezados=None, modo='overwrite'):
+    """
+    Anota el cambio de la hoja en el diario y lo publica para las lecturas.
+
+    Un reemplazo completo descarta el pendiente anterior de la hoja; agregar
+    filas las suma a él.
+    """
+    global _entradas
+    filas = [list(fila) for fila in datos]
+    with _lock:
+        anterior = _cargar().get(sheet_name)
+        # La fecha y los intentos son los del primer cambio que quedó sin escribir
+        entrada = dict(anterior or {'hoja': sheet_name, 'fecha': datetime.now().isoformat(), 'intentos': 0})
+        if anterior is not None and modo != 'overwrite':
+            entrada['filas'] = anterior['filas'] + filas
+        else:
+            entrada.update(modo=modo, encabezados=None, filas=filas)
+        if encabezados:
+            entrada['encabezados'] = list(encabezados)
+        _guardar_entrada(entrada)
+        _entradas = {**_entradas, sheet_name: entrada}
+
+    from . import indices
+    indices.refrescar(libros.ruta_hoja(sheet_name))
+
+
+def superponer(ruta, estado):
+    """
+    Reemplaza en un estado leído del archivo las hojas con cambios pendientes.
+
+    Las filas se normalizan como las devolvería openpyxl al leerlas (fechas
+    como datetime, montos como números) y se rellenan al mismo ancho.
+    """
+    if ruta in _aplicando:
+        return
+    cargadas = _entradas
+    if cargadas is None:
+        with _lock:
+            cargadas = _cargar()
+    pendientes = [entrada for entrada in cargadas.values() if libros.ruta_hoja(entrada['hoja']) == ruta]
+
+    for entrada in pendientes:
+        hoja = entrada['hoja']
+        encabezados = tuple(entrada['encabezados'] or estado['encabezados'].get(hoja, ()))
+        filas = [tuple(_como_celda(valor) for valor in fila) for fila in entrada['filas']]
+        if entrada['modo'] != 'overwrite':
+            filas = list(estado['hojas'].get(hoja, ())) + filas
+        ancho = max([len(encabezados)] + [len(fila) for fila in filas])
+        estado['encabezados'][hoja] = encabezados + (None,) * (ancho - len(encabezados))
+        estado['hojas'][hoja] = tuple(fila + (None,) * (ancho - len(fila)) for fila in filas)
+        estado['indices'] = {clave: indice for clave, indice in estado['indices'].items() if clave[0] != hoja}
+        estado['persistentes'] = {clave for clave in estado['persistentes'] if clave[0] != hoja}
+        estado['superpuestas'].add(hoja)
+
+
+def _como_celda(valor):
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        return datetime(valor.year, valor.month, valor.day)
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    return valor
+
+
+def _escribir_hoja(wb, sheet_name, datos, encabezados=None, modo='overwrite'):
+    """Escribe los datos en la hoja del libro abierto"""
+    if sheet_name not in wb.sheetnames:
+        ws = wb.create_sheet(sheet_name)
+        if encabezados:
+            ws.append(encabezados)
+    else:
+        ws = wb[sheet_name]
+        # Si el modo es 'overwrite', limpiar la hoja
+        if modo == 'overwrite':
+            # Eliminar todas las filas excepto los encabezados
+            if ws.max_row > 1:
+                ws.delete_rows(2, ws.max_row)
+            # Si no hay encabezados, mantener los existentes
+            if encabezados:
+                # Reemplazar encabezados existentes
+                for idx, encabezado in enumerate(encabezados, 1):
+                    ws.cell(row=1, column=idx, value=encabezado)
+
+    # Agregar datos
+    for dato in datos:
+        ws.append(dato)
+
+
+def aplicar(ruta):
+    """
+    Escribe en el archivo sus cambios pendientes.
+
+    Devuelve True si el archivo quedó al día. Si no se pudo escribir (por
+    ejemplo porque está abierto en Excel) los cambios siguen en el diario y
+    se programan los reintentos.
+    """
+    global _entradas
+    with _lock:
+        pendientes = [entrada for entrada in _cargar().values() if libros.ruta_hoja(entrada['hoja']) == ruta]
+        if not pendientes:
+            return True
+        hojas = [entrada['hoja'] for entrada in pendientes]
+
+        try:
+            if os.path.exists(ruta):
+                wb = load_workbook(ruta)
+            else:
+                wb = openpyxl.Workbook()
+                # Eliminar la hoja por defecto si existe
+                if 'Sheet' in wb.sheetnames:
+                    del wb['Sheet']
+            for entrada in pendientes:
+                _escribir_hoja(wb, entrada['hoja'], entrada['filas'], entrada['encabezados'], entrada['modo'])
+
+            # La versión que publica guardar_libro ya tiene los cambios: no se superponen
+            _aplicando.add(ruta)
+            try:
+                libros.guardar_libro(wb, ruta)
+                _entradas = {hoja: entrada for hoja, entrada in _entradas.items() if hoja not in hojas}
+            finally:
+                _aplicando.discard(ruta)
+        except Exception as e:
+            print(f"Error al guardar en Excel, el cambio queda pendiente: {e}")
+            for entrada in pendientes:
+                entrada['intentos'] += 1
+                entrada['error'] = str(e)
+                _guardar_entrada(entrada)
+            _programar_reintentos()
+            return False
+
+        for hoja in hojas:
+            try:
+                os.remove(_ruta_entrada(hoja))
+            except OSError as e:
+                print(f"Error al borrar el cambio pendiente de {hoja}: {e}")
+
+    # El respaldo y los cierres no deben invalidar un guardado que ya quedó en disco
+    try:
+        respaldo.crear_instantanea(ruta, origen=f"guardado:{','.join(hojas)}")
+    except Exception as e:
+        print(f"Error al crear el respaldo: {e}")
+
+    # Si el guardado tocó meses ya cerrados, se vuelven a cerrar solo esos meses
+    from . import cierres
+    for hoja in hojas:
+        try:
+            cierres.recerrar_alterados(hoja)
+        except Exception as e:
+            print(f"Error al actualizar los cierres mensuales: {e}")
+    return True
+
+
+def aplicar_todos():
+    """Intenta escribir todos los cambios pendientes; devuelve True si no quedó ninguno"""
+    rutas = {libros.ruta_hoja(entrada['hoja']) for entrada in entradas()}
+    return all([aplicar(ruta) for ruta in sorted(rutas)])
+
+
+def _reintentar():
+    global _hilo, _proximo_intento
+    espera = ESPERA_INICIAL
+    while True:
+        _proximo_intento = datetime.fromtimestamp(time.time() + espera)
+        time.sleep(espera)
+        al_dia = aplicar_todos()
+        with _lock:
+            if al_dia and not _cargar():
+                _hilo = None
+                _proximo_intento = None
+                return
+        espera = ESPERA_INICIAL if al_dia else min(espera * 2, ESPERA_MAXIMA)
+
+
+def _programar_reintentos():
+    """Arranca el hilo de reintentos si no está corriendo"""
+    global _hilo
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_reintentar, name='cola-excel', daemon=True)
+            _hilo.start()
+
+
+def iniciar():
+    """Al arrancar el servidor, retoma los cambios que quedaron pendientes"""
+    if hay_pendientes():
+        _programar_reintentos()
@@ -0,0 +1,123 @@
+"""
+Registros tipados para las filas de las hojas del Excel.
+
+Cada hoja se convierte una sola vez por versión del archivo en una tupla de
+registros con `__slots__`, paralela a las filas de `indices.leer_hoja` (la
+posición de una fila es la de su registro). Las columnas se ubican por el
+encabezado y las fechas y montos (en pesos enteros) se interpretan al
+cargar, de modo que las vistas y plantillas trabajan con los registros sin
+volver a armar diccionarios en cada petición.
+
+Los registros aceptan `registro.total`, `registro['total']` y `registro[5]`,
+así que sirven donde antes había diccionarios o tuplas.
+"""
+from . import dinero, indices
+
+
+def fecha(valor):
+    return indices.fecha_de_celda(valor)
+
+
+def _normalizar_encabezado(valor):
+    return str(valor).strip().lower().replace('_', '').replace(' ', '') if valor is not None else ''
+
+
+class Registro:
+    """Base de los registros; las subclases definen __slots__, ENCABEZADOS y CONVERSORES"""
+
+    __slots__ = ()
+    ENCABEZADOS = ()    # por campo, los nombres de encabezado aceptados
+    CONVERSORES = {}    # campo -> función que interpreta la celda al cargar
+
+    def __init__(self, *valores):
+        for campo, valor in zip(self.__slots__, valores):
+            setattr(self, campo, valor)
+
+    def __getitem__(self, clave):
+        if isinstance(clave, int):
+            return getattr(self, self.__slots__[clave])
+        try:
+            return getattr(self, clave)
+        except AttributeError:
+            raise KeyError(clave)
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave, defecto)
+
+    def __iter__(self):
+        return (getattr(self, campo) for campo in self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(repr(v) for v in self)})"
+
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+
+class Movimiento(Registro):
+    __slots__ = ('id', 'fecha', 'proveedor', 'detalle', 'obs', 'total', 'id_factura', 'estado')
+    ENCABEZADOS = (('id',), ('fecha',), ('proveedor',), ('detalle',), ('obs',), ('total',),
+                   ('idfactura',), ('estado',))
+    CONVERSORES = {'fecha': fecha, 'total': dinero.a_pesos}
+
+    @property
+    def idfactura(self):
+        return self.id_factura
+
+
+class Resumen(Registro):
+    __slots__ = ('id', 'proveedor', 'facturas', 'abonos', 'saldo')
+    ENCABEZADOS = (('id',), ('proveedor',), ('totalfacturas',), ('totalabonos',), ('saldo',))
+    CONVERSORES = {'facturas': dinero.a_pesos, 'abonos': dinero.a_pesos, 'saldo': dinero.a_pesos}
+
+
+class Gasto(Registro):
+    __slots__ = ('id', 'fecha', 'categoria', 'placa', 'conductor', 'precio')
+    ENCABEZADOS = (('id',), ('fecha',), ('categoria',), ('placa',), ('conductor',), ('precio',))
+    CONVERSORES = {'fecha': fecha, 'precio': dinero.a_pesos}
+
+
+def posiciones_columnas(clase, encabezados):
+    """Columna de cada campo según el encabezado; si no aparece se usa la posición por defecto"""
+    ubicacion = {}
+    for posicion, nombre in enumerate(encabezados or ()):
+        ubicacion.setdefault(_normalizar_encabezado(nombre), posicion)
+    return [
+        next((ubicacion[alias] for alias in nombres if alias in ubicacion), defecto)
+        for defecto, nombres in enumerate(clase.ENCABEZADOS)
+    ]
+
+
+def construir_registros(clase, encabezados, filas):
+    """Convierte las filas en registros; las celdas que faltan quedan vacías"""
+    columnas = posiciones_columnas(clase, encabezados)
+    conversores = [clase.CONVERSORES.get(campo) for campo in clase.__slots__]
+    registros = []
+    for fila in filas:
+        largo = len(fila)
+        valores = []
+        for columna, conversor in zip(columnas, conversores):
+            valor = fila[columna] if columna < largo else ''
+            valores.append(conversor(valor) if conversor else valor)
+        registros.append(clase(*valores))
+    return tuple(registros)
+
+
+def registros_hoja(sheet_name, clase):
+    """Registros de la hoja, construidos una vez por versión del archivo"""
+    return indices.obtener_indice(
+        sheet_name, f'registros:{clase.__name__}',
+        lambda filas: construir_registros(clase, indices.leer_encabezados(sheet_name), filas),
+        persistente=True,
+    )
+
+
+def registros_en_rango(sheet_name, clase, desde=None, hasta=None, columna=1):
+    """Registros con fecha dentro del rango; sin límites devuelve todos"""
+    registros = registros_hoja(sheet_name, clase)
+    if desde is None and hasta is None:
+        return registros
+    return [registros[p] for p in indices.indice_fechas(sheet_name, columna).posiciones_en_rango(desde, hasta)]
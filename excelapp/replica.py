@@ -0,0 +1,299 @@
+"""
+Réplica de lectura de las hojas en SQLite.
+
+El Excel sigue siendo donde se escribe; la base 'lectura' de DATABASES es una
+copia de sus hojas en las tablas de models.py, con índices que cubren los
+filtros y agregados de listados y dashboards, para que esas consultas se
+hagan en SQL sin competir con los guardados. MultiDBRouter
+(myproject/db_router.py) manda a esta base las lecturas de los modelos de la
+aplicación.
+
+Cada fila de la hoja es una fila de la tabla, también las que no tienen un Id
+numérico o lo repiten: `id` es la llave propia de la réplica y el Id de la
+hoja queda en `id_hoja`. Cada fila guarda además su huella, y la huella de la
+tabla (en replica_hojas) es la suma de las de sus filas, así que se puede
+poner al día sin recorrerla entera.
+
+Cada vez que indices.py publica una versión nueva de un archivo se programa
+la copia de sus hojas en segundo plano; ahí, si la tabla no corresponde a
+ninguna versión conocida, se vuelve a copiar entera. Antes de consultar una
+tabla, `asegurar` le aplica en la misma petición solo las filas que cambiaron
+desde la versión que ya tiene (así una vista ve enseguida lo que se acaba de
+guardar) y nunca la copia entera. La huella de la tabla hace de condición:
+si otro proceso ya la cambió, la petición no toca nada. Con ella también
+varios procesos comparten la réplica sin volver a copiarla al arrancar.
+
+El esquema de la base se migra al arrancar (iniciar, desde wsgi.py); si una
+petición la encuentra sin migrar, falla en vez de migrarla ella.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from . import indices, libros, models, registros
+
+ALIAS = 'lectura'
+ESPERA = 1  # segundos; junta varias versiones seguidas en una copia
+# Entra en la huella de lo copiado: se sube cuando cambia lo que se guarda de
+# cada fila, para que la réplica se vuelva a copiar aunque las hojas no cambien
+FORMATO = 4
+
+_lock = threading.RLock()
+# Aparte de _lock: programar se llama con el candado de indices.py tomado y
+# asegurar lee los índices con _lock tomado
+_lock_programadas = threading.Lock()
+_preparada = False
+# hoja -> (filas de indices.leer_hoja, encabezados, huella de la tabla, versión) que tiene la réplica
+_copiadas = {}
+_programadas = {}    # ruta -> temporizador
+
+
+def _id_hoja(valor):
+    return int(valor) if isinstance(valor, (int, float)) else None
+
+
+def _fila_movimiento(registro):
+    return dict(
+        id_hoja=_id_hoja(registro.id), fecha=registro.fecha, proveedor=registro.proveedor or '', detalle=registro.detalle or '',
+        obs=registro.obs, total=registro.total, id_factura=registro.id_factura, estado=registro.estado,
+        proveedor_norm=indices.clave_normalizada(registro.proveedor),
+        estado_norm=indices.clave_normalizada(registro.estado),
+        id_factura_norm=indices.clave_normalizada(registro.id_factura),
+    )
+
+
+def _fila_resumen(registro):
+    return dict(
+        id_hoja=_id_hoja(registro.id), proveedor=registro.proveedor or '', facturas=registro.facturas,
+        Abonos=registro.abonos, saldo=registro.saldo,
+    )
+
+
+def _fila_gasto(registro):
+    return dict(
+        id_hoja=_id_hoja(registro.id), fecha=registro.fecha, categoria=registro.categoria or '', placa=registro.placa,
+        conductor=registro.conductor, precio=registro.precio, placa_norm=indices.clave_normalizada(registro.placa),
+    )
+
+
+# Hoja -> (modelo, clase de registro, conversión del registro a campos del modelo)
+TABLAS = {
+    'Proveedores': (models.Movimiento, registros.Movimiento, _fila_movimiento),
+    'ProveedoresCliente': (models.Movimiento_Cliente, registros.Movimiento, _fila_movimiento),
+    'Resumen': (models.Resumen, registros.Resumen, _fila_resumen),
+    'ResumenCliente': (models.Resumen_Cliente, registros.Resumen, _fila_resumen),
+    'Gastos': (models.Gasto, registros.Gasto, _fila_gasto),
+}
+
+
+def activa():
+    return ALIAS in settings.DATABASES
+
+
+def preparar():
+    """
+    Crea o migra las tablas de la réplica; se llama al arrancar (iniciar), nunca desde una petición.
+    """
+    global _preparada
+    with _lock:
+        if _preparada:
+            return
+        call_command('migrate', 'excelapp', database=ALIAS, verbosity=0)
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS replica_hojas (hoja TEXT PRIMARY KEY, huella TEXT NOT NULL)')
+        _preparada = True
+
+
+def _verificar():
+    """Falla si la base 'lectura' no tiene el esquema al día (con el candado tomado)"""
+    global _preparada
+    if _preparada:
+        return
+    conexion = connections[ALIAS]
+    ejecutor = MigrationExecutor(conexion)
+    faltantes = [
+        migracion for migracion, _ in ejecutor.migration_plan(ejecutor.loader.graph.leaf_nodes())
+        if migracion.app_label == 'excelapp'
+    ]
+    if faltantes or 'replica_hojas' not in conexion.introspection.table_names():
+        raise RuntimeError(
+            "La réplica de lectura no tiene el esquema al día; se prepara al arrancar el servidor "
+            "(replica.iniciar en wsgi.py)"
+        )
+    _preparada = True
+
+
+def _huella_fila(fila):
+    return hashlib.sha256(repr(fila).encode('utf-8')).hexdigest()[:32]
+
+
+def _huella_tabla(encabezados, suma):
+    """Huella de la tabla: el formato, los encabezados y la suma de las huellas de sus filas"""
+    return f"{FORMATO}:{_huella_fila(tuple(encabezados))}:{suma:032x}"
+
+
+def _sumar(suma, huellas, signo=1):
+    return (suma + signo * sum(int(huella, 16) for huella in huellas)) % (1 << 128)
+
+
+def _objetos(sheet_name, filas, encabezados):
+    """
+    Instancias del modelo para las filas; las que no tienen fecha válida se copian con fecha nula.
+
+    Se copian todas: una fila sin Id numérico queda con id_hoja nulo y un Id
+    repetido se copia las veces que aparece.
+    """
+    modelo, clase, convertir = TABLAS[sheet_name]
+    return [
+        modelo(**convertir(registro), huella_fila=_huella_fila(fila))
+        for fila, registro in zip(filas, registros.construir_registros(clase, encabezados, filas))
+    ]
+
+
+def _huella_guardada(sheet_name):
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute('SELECT huella FROM replica_hojas WHERE hoja = %s', [sheet_name])
+        guardada = cursor.fetchone()
+    return guardada[0] if guardada else None
+
+
+def _diferencia(anteriores, actuales):
+    """Tramo que cambió entre dos versiones de la hoja: (filas que salen, filas que entran)"""
+    largo = min(len(anteriores), len(actuales))
+    inicio = 0
+    while inicio < largo and anteriores[inicio] == actuales[inicio]:
+        inicio += 1
+    fin = 0
+    while fin < largo - inicio and anteriores[-1 - fin] == actuales[-1 - fin]:
+        fin += 1
+    return anteriores[inicio:len(anteriores) - fin], actuales[inicio:len(actuales) - fin]
+
+
+def _aplicar_cambios(sheet_name, copiada, filas, encabezados):
+    """
+    Aplica a la tabla solo las filas que cambiaron desde la versión `copiada` (con el candado tomado).
+
+    Devuelve la huella nueva, o None si la tabla ya no tiene la versión
+    copiada (la cambió otro proceso) y hay que copiarla entera.
+    """
+    modelo = TABLAS[sheet_name][0]
+    filas_anteriores, encabezados_anteriores, huella_anterior, _ = copiada
+    if encabezados != encabezados_anteriores:
+        return None
+    salen, entran = _diferencia(filas_anteriores, filas)
+    huellas_salen = [_huella_fila(fila) for fila in salen]
+    objetos = _objetos(sheet_name, entran, encabezados)
+    suma = _sumar(int(huella_anterior.rsplit(':', 1)[1], 16), huellas_salen, -1)
+    huella = _huella_tabla(encabezados, _sumar(suma, [objeto.huella_fila for objeto in objetos]))
+
+    with transaction.atomic(using=ALIAS):
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute(
+                'UPDATE replica_hojas SET huella = %s WHERE hoja = %s AND huella = %s',
+                [huella, sheet_name, huella_anterior],
+            )
+            if cursor.rowcount != 1:
+                return huella if _huella_guardada(sheet_name) == huella else None
+
+        # Se borra una fila de la tabla por cada fila que sale, aunque haya otras iguales
+        faltan = Counter(huellas_salen)
+        quitar = []
+        for lote in range(0, len(faltan), 500):
+            huellas = list(faltan)[lote:lote + 500]
+            for id_fila, huella_fila in modelo.objects.using(ALIAS).filter(huella_fila__in=huellas).values_list('id', 'huella_fila'):
+                if faltan[huella_fila]:
+                    faltan[huella_fila] -= 1
+                    quitar.append(id_fila)
+        for lote in range(0, len(quitar), 500):
+            modelo.objects.using(ALIAS).filter(id__in=quitar[lote:lote + 500]).delete()
+        modelo.objects.using(ALIAS).bulk_create(objetos, batch_size=500)
+    return huella
+
+
+def _copiar_entera(sheet_name, filas, encabezados):
+    """Vuelve a copiar la tabla si su huella no es la de las filas (con el candado tomado); devuelve la huella"""
+    modelo = TABLAS[sheet_name][0]
+    huella = _huella_tabla(encabezados, _sumar(0, [_huella_fila(fila) for fila in filas]))
+    with transaction.atomic(using=ALIAS):
+        if _huella_guardada(sheet_name) != huella:
+            modelo.objects.using(ALIAS).all().delete()
+            modelo.objects.using(ALIAS).bulk_create(_objetos(sheet_name, filas, encabezados), batch_size=500)
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute(
+                    'INSERT OR REPLACE INTO replica_hojas (hoja, huella) VALUES (%s, %s)', [sheet_name, huella],
+                )
+    return huella
+
+
+def asegurar(sheet_name, entera=False):
+    """
+    Deja la tabla de la hoja al día con la versión de la hoja que ve la petición.
+
+    Desde una petición solo se aplican las filas que cambiaron desde la
+    versión que ya tiene la réplica; si la réplica no tiene una versión
+    conocida se consulta como está, hasta que la copia en segundo plano
+    (`entera`) la ponga al día. Si la réplica ya tiene una versión más nueva
+    (la copió otro hilo) se deja así.
+    """
+    if not activa():
+        return
+    filas = indices.leer_hoja(sheet_name)
+    if _copiadas.get(sheet_name, (None,))[0] is filas:
+        return
+    version = indices.version_hoja(sheet_name)
+    encabezados = tuple(indices.leer_encabezados(sheet_name))
+    with _lock:
+        copiada = _copiadas.get(sheet_name)
+        if copiada is not None and (copiada[0] is filas or version < copiada[3]):
+            return
+        _verificar()
+        huella = _aplicar_cambios(sheet_name, copiada, filas, encabezados) if copiada is not None else None
+        if huella is None:
+            if not entera:
+                return
+            huella = _copiar_entera(sheet_name, filas, encabezados)
+        _copiadas[sheet_name] = (filas, encabezados, huella, version)
+
+
+def sincronizar(ruta=None):
+    """Copia a la réplica las hojas del archivo (todas si no se indica) que cambiaron"""
+    for sheet_name in TABLAS:
+        if ruta is None or libros.ruta_hoja(sheet_name) == ruta:
+            asegurar(sheet_name, entera=True)
+
+
+def _copiar(ruta):
+    with _lock_programadas:
+        _programadas.pop(ruta, None)
+    try:
+        sincronizar(ruta)
+    except Exception as e:
+        print(f"Error al actualizar la réplica de lectura: {e}")
+    finally:
+        connections.close_all()
+
+
+def programar(ruta):
+    """Programa la copia del archivo a la réplica (indices.py la llama al publicar una versión)"""
+    if not activa():
+        return
+    with _lock_programadas:
+        if ruta in _programadas:
+            return
+        temporizador = threading.Timer(ESPERA, _copiar, args=(ruta,))
+        temporizador.daemon = True
+        _programadas[ruta] = temporizador
+        temporizador.start()
+
+
+def iniciar():
+    """Al arrancar el servidor prepara el esquema de la réplica y la pone al día en segundo plano"""
+    if activa():
+        preparar()
+        for ruta in libros.rutas():
+            programar(ruta)
@@ -0,0 +1,245 @@
+"""
+Almacén de respaldos incremental y direccionado por contenido.
+
+El .xlsx es un zip de partes XML. Cada parte se guarda como blob comprimido
+con nombre igual a su hash SHA-256; las hojas se parten además en bloques de
+filas para que agregar un movimiento solo genere un bloque nuevo. Una
+instantánea es un manifiesto JSON que lista los blobs de cada parte, así que
+respaldar un libro que casi no cambió cuesta unos pocos kilobytes.
+"""
+import bisect
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import zipfile
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+
+from . import libros
+
+RUTA_RESPALDOS = getattr(settings, 'RUTA_RESPALDOS', os.path.join(settings.BASE_DIR, 'respaldos'))
+FILAS_POR_BLOQUE = 200
+FORMATO_ID = '%Y%m%d-%H%M%S-%f'
+
+_PARTE_HOJA = re.compile(r'^xl/worksheets/sheet\d+\.xml$')
+_INICIO_FILA = re.compile(rb'<row[\s>/]')
+_FILA = re.compile(rb'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+
+
+def _ruta_objeto(hash_hex):
+    return os.path.join(RUTA_RESPALDOS, 'objetos', hash_hex[:2], hash_hex[2:])
+
+
+def _ruta_instantaneas():
+    return os.path.join(RUTA_RESPALDOS, 'instantaneas')
+
+
+def guardar_blob(contenido):
+    """Guarda un blob si no existe todavía y devuelve su hash"""
+    hash_hex = hashlib.sha256(contenido).hexdigest()
+    ruta = _ruta_objeto(hash_hex)
+    if not os.path.exists(ruta):
+        libros.escribir_atomico(ruta, zlib.compress(contenido, 6))
+    return hash_hex
+
+
+def leer_blob(hash_hex):
+    with open(_ruta_objeto(hash_hex), 'rb') as f:
+        return zlib.decompress(f.read())
+
+
+def partir_hoja(xml):
+    """Divide el XML de una hoja en encabezado, bloques de filas y cierre"""
+    inicio = xml.find(b'<sheetData>')
+    fin = xml.rfind(b'</sheetData>')
+    if inicio < 0 or fin < 0:
+        return [xml]
+
+    inicio += len(b'<sheetData>')
+    cortes = [m.start() for m in _INICIO_FILA.finditer(xml, inicio, fin)][FILAS_POR_BLOQUE::FILAS_POR_BLOQUE]
+    limites = [inicio] + cortes + [fin]
+
+    bloques = [xml[:inicio]]
+    for desde, hasta in zip(limites, limites[1:]):
+        bloques.append(xml[desde:hasta])
+    bloques.append(xml[fin:])
+    return bloques
+
+
+def hojas_del_libro(zf):
+    """Relaciona el nombre de cada hoja con su parte dentro del zip"""
+    try:
+        libro = zf.read('xl/workbook.xml').decode('utf-8')
+        relaciones = zf.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    except KeyError:
+        return {}
+
+    destinos = {}
+    for rel in re.finditer(r'<Relationship\b[^>]*>', relaciones):
+        id_rel = re.search(r'\bId="([^"]+)"', rel.group(0))
+        destino = re.search(r'\bTarget="([^"]+)"', rel.group(0))
+        if id_rel and destino:
+            ruta = destino.group(1).lstrip('/')
+            destinos[id_rel.group(1)] = ruta if ruta.startswith('xl/') else f'xl/{ruta}'
+
+    hojas = {}
+    for hoja in re.finditer(r'<sheet\b[^>]*>', libro):
+        nombre = re.search(r'\bname="([^"]+)"', hoja.group(0))
+        id_rel = re.search(r'\br:id="([^"]+)"', hoja.group(0))
+        if nombre and id_rel and id_rel.group(1) in destinos:
+            hojas[html.unescape(nombre.group(1))] = destinos[id_rel.group(1)]
+    return hojas
+
+
+def _ids_instantaneas():
+    """Ids de las instantáneas en orden cronológico (el id es la marca de tiempo)"""
+    carpeta = _ruta_instantaneas()
+    if not os.path.isdir(carpeta):
+        return []
+    return sorted(nombre[:-5] for nombre in os.listdir(carpeta) if nombre.endswith('.json'))
+
+
+def listar_instantaneas():
+    """Devuelve los manifiestos ordenados del más antiguo al más reciente"""
+    return [cargar_instantanea(id_instantanea) for id_instantanea in _ids_instantaneas()]
+
+
+def cargar_instantanea(id_instantanea):
+    ruta = os.path.join(_ruta_instantaneas(), f'{id_instantanea}.json')
+    if not os.path.exists(ruta):
+        raise ValueError(f"No existe la instantánea {id_instantanea}")
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ultima_de_archivo(ids, archivo=None):
+    """Última instantánea de la lista que corresponde al archivo (o la última, sin archivo)"""
+    for id_instantanea in reversed(ids):
+        manifiesto = cargar_instantanea(id_instantanea)
+        if archivo is None or manifiesto.get('archivo') == archivo:
+            return manifiesto
+    return None
+
+
+def instantanea_en_fecha(fecha, archivo=None):
+    """Busca la última instantánea tomada en o antes de la fecha dada (del archivo indicado, si lo hay)"""
+    ids = _ids_instantaneas()
+    posicion = bisect.bisect_right(ids, fecha.strftime(FORMATO_ID))
+    return _ultima_de_archivo(ids[:posicion], archivo)
+
+
+def crear_instantanea(ruta_excel=None, origen='manual'):
+    """Respalda el libro guardando solo los bloques que no existan todavía"""
+    ruta_excel = ruta_excel or settings.RUTA_EXCEL
+    if not os.path.exists(ruta_excel):
+        return None
+
+    partes = []
+    with zipfile.ZipFile(ruta_excel) as zf:
+        hojas = hojas_del_libro(zf)
+        for info in zf.infolist():
+            contenido = zf.read(info.filename)
+            bloques = partir_hoja(contenido) if _PARTE_HOJA.match(info.filename) else [contenido]
+            partes.append({
+                'nombre': info.filename,
+                'tamano': len(contenido),
+                'bloques': [guardar_blob(bloque) for bloque in bloques],
+            })
+
+    # Si nada cambió desde la última instantánea del mismo archivo no se crea otra
+    ultima = _ultima_de_archivo(_ids_instantaneas(), os.path.basename(ruta_excel))
+    if ultima and ultima['partes'] == partes:
+        return ultima
+
+    ahora = datetime.now()
+    manifiesto = {
+        'id': ahora.strftime(FORMATO_ID),
+        'fecha': ahora.isoformat(),
+        'origen': origen,
+        'archivo': os.path.basename(ruta_excel),
+        'hojas': hojas,
+        'partes': partes,
+    }
+    ruta = os.path.join(_ruta_instantaneas(), f"{manifiesto['id']}.json")
+    libros.escribir_atomico(ruta, json.dumps(manifiesto, ensure_ascii=False).encode('utf-8'))
+    return manifiesto
+
+
+def _contenido_parte(parte):
+    return b''.join(leer_blob(hash_hex) for hash_hex in parte['bloques'])
+
+
+def restaurar_instantanea(manifiesto, destino=None):
+    """
+    Reconstruye el libro de una instantánea y lo reemplaza de forma atómica.
+
+    No se restaura mientras el archivo tenga cambios en la cola: el
+    reintento los escribiría encima de la versión restaurada.
+    """
+    from . import indices, pendientes
+
+    # Por defecto vuelve al archivo del que se tomó, junto a RUTA_EXCEL
+    destino = destino or os.path.join(
+        os.path.dirname(settings.RUTA_EXCEL), manifiesto.get('archivo') or os.path.basename(settings.RUTA_EXCEL),
+    )
+
+    # Con el candado de la cola nadie encola ni aplica sobre el archivo mientras se reemplaza
+    with pendientes._lock:
+        hojas = [
+            hoja for grupo in libros.HOJAS_POR_ENTIDAD.values() for hoja in grupo if libros.ruta_hoja(hoja) == destino
+        ]
+        if hojas and pendientes.hay_pendientes(hojas):
+            raise ValueError(f"{os.path.basename(destino)} tiene cambios pendientes de guardar; aplíquelos antes de restaurar")
+
+        # Respaldo del estado actual antes de pisarlo
+        if os.path.exists(destino):
+            crear_instantanea(destino, origen='antes-de-restaurar')
+
+        contenido = io.BytesIO()
+        with zipfile.ZipFile(contenido, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for parte in manifiesto['partes']:
+                zf.writestr(parte['nombre'], _contenido_parte(parte))
+        libros.escribir_atomico(destino, contenido.getvalue())
+
+    indices.refrescar(destino)
+    return destino
+
+
+def _filas_por_numero(xml):
+    return {int(m.group(1)): m.group(0) for m in _FILA.finditer(xml)}
+
+
+def comparar_instantaneas(manifiesto_a, manifiesto_b):
+    """Compara dos instantáneas hoja por hoja y fila por fila"""
+    partes_a = {p['nombre']: p for p in manifiesto_a['partes']}
+    partes_b = {p['nombre']: p for p in manifiesto_b['partes']}
+    nombres_hoja = {parte: hoja for hoja, parte in {**manifiesto_a.get('hojas', {}), **manifiesto_b.get('hojas', {})}.items()}
+
+    cambios = []
+    for nombre in sorted(set(partes_a) | set(partes_b)):
+        parte_a, parte_b = partes_a.get(nombre), partes_b.get(nombre)
+        if parte_a and parte_b and parte_a['bloques'] == parte_b['bloques']:
+            continue
+
+        cambio = {'parte': nombre, 'hoja': nombres_hoja.get(nombre)}
+        if not parte_a:
+            cambio['estado'] = 'agregada'
+        elif not parte_b:
+            cambio['estado'] = 'eliminada'
+        else:
+            cambio['estado'] = 'modificada'
+            if _PARTE_HOJA.match(nombre):
+                filas_a = _filas_por_numero(_contenido_parte(parte_a))
+                filas_b = _filas_por_numero(_contenido_parte(parte_b))
+                cambio['filas_agregadas'] = sorted(set(filas_b) - set(filas_a))
+                cambio['filas_eliminadas'] = sorted(set(filas_a) - set(filas_b))
+                cambio['filas_modificadas'] = sorted(
+                    n for n in set(filas_a) & set(filas_b) if filas_a[n] != filas_b[n]
+                )
+        cambios.append(cambio)
+    return cambios
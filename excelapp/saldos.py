@@ -0,0 +1,296 @@
+"""
+Saldos por proveedor o cliente con sumas acumuladas.
+
+Para cada proveedor se guardan sus movimientos ordenados por fecha junto con
+el saldo acumulado después de cada uno. Con bisect sobre las fechas se
+obtiene en O(log n) el saldo a una fecha, la variación entre dos fechas y el
+tramo de un extracto con saldo corrido.
+
+La factura suma su monto propio (sin el saldo anterior que arrastra la
+cadena) y el abono resta, igual que en el resumen de movimientos. Las filas
+sin fecha válida no se pueden ubicar en el tiempo y quedan fuera.
+
+Las cuentas se guardan por versión del archivo con los demás índices y se
+arman de forma incremental: cuando el archivo cambia solo se recalculan las
+cuentas de los proveedores cuyas filas cambiaron. Lo mismo
+vale para la antigüedad de saldos, que cada cuenta guarda ya repartida por
+tramos hasta que cambian sus movimientos o el día.
+"""
+import copy
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import date
+
+from . import dinero, indices
+
+# Tramos de antigüedad: nombre y días máximos (None = sin límite)
+TRAMOS_ANTIGUEDAD = (('0-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None))
+
+# Detalle de la fila que queda en lugar de una cadena compactada (ver compactacion.py)
+DETALLE_CADENA = 'Resumen cadena'
+
+
+def efecto_en_saldo(fila):
+    """
+    Cuánto mueve el saldo un movimiento: la factura suma su monto propio y el abono resta.
+
+    El resumen de una cadena compactada trae en el total el efecto neto de
+    todos sus movimientos.
+    """
+    detalle = str(fila[3] or '').lower()
+    if detalle == DETALLE_CADENA.lower():
+        return dinero.a_pesos(fila[5])
+    if detalle == 'factura':
+        propio = dinero.monto_en_obs(fila[4])
+        return dinero.a_pesos(fila[5]) if propio is None else propio
+    if detalle == 'abono':
+        return -dinero.a_pesos(fila[5])
+    return 0
+
+
+class CuentaCorriente:
+    """Movimientos de un proveedor en orden de fecha con el saldo después de cada uno"""
+
+    __slots__ = ('proveedor', 'contenido', 'ordinales', 'orden', 'efectos', 'acumulados', 'posiciones',
+                 '_pendientes', '_tramos')
+
+    def __init__(self, proveedor, contenido, posiciones):
+        self.proveedor = proveedor
+        self.contenido = contenido  # filas del proveedor, para detectar cambios
+        pares = []
+        for k, fila in enumerate(contenido):
+            fecha = indices.fecha_de_celda(fila[1]) if len(fila) >= 6 else None
+            if fecha:
+                pares.append((fecha.toordinal(), indices.id_numerico(fila[0]), k))
+        pares.sort()
+
+        self.ordinales = [ordinal for ordinal, _, _ in pares]
+        self.orden = [k for _, _, k in pares]
+        self.efectos = [efecto_en_saldo(contenido[k]) for k in self.orden]
+        self.acumulados = []
+        saldo = 0
+        for efecto in self.efectos:
+            saldo += efecto
+            self.acumulados.append(saldo)
+        self._pendientes = None
+        self._tramos = None
+        self.posiciones = [posiciones[k] for k in self.orden]
+
+    def reubicada(self, posiciones):
+        """
+        La misma cuenta con las posiciones en la hoja de otra versión.
+
+        Devuelve una copia en lugar de modificarla: las peticiones fijadas a
+        la versión anterior siguen usando sus posiciones.
+        """
+        nuevas = [posiciones[k] for k in self.orden]
+        if nuevas == self.posiciones:
+            return self
+        copia = copy.copy(self)
+        copia.posiciones = nuevas
+        return copia
+
+    def _saldo_hasta(self, i):
+        return self.acumulados[i - 1] if i > 0 else 0
+
+    def saldo_al(self, fecha=None):
+        """Saldo al cierre del día indicado (o el saldo actual si no hay fecha)"""
+        if fecha is None:
+            return self._saldo_hasta(len(self.acumulados))
+        return self._saldo_hasta(bisect_right(self.ordinales, fecha.toordinal()))
+
+    def saldo_antes_de(self, fecha):
+        """Saldo al inicio del día indicado"""
+        return self._saldo_hasta(bisect_left(self.ordinales, fecha.toordinal()))
+
+    def tramo(self, desde=None, hasta=None):
+        """Índices [inicio, fin) de los movimientos entre las fechas (inclusive)"""
+        inicio = bisect_left(self.ordinales, desde.toordinal()) if desde else 0
+        fin = bisect_right(self.ordinales, hasta.toordinal()) if hasta else len(self.ordinales)
+        return inicio, max(inicio, fin)
+
+    def variacion(self, desde=None, hasta=None):
+        """Cuánto cambió el saldo entre las dos fechas (inclusive)"""
+        inicio, fin = self.tramo(desde, hasta)
+        return self._saldo_hasta(fin) - self._saldo_hasta(inicio)
+
+    def saldo_cadena_activa(self):
+        """Saldo de la cadena activa, como en el resumen: sus facturas (con lo que arrastran) menos sus abonos"""
+        saldo = 0
+        for fila in self.contenido:
+            if len(fila) < 8 or str(fila[7] or '').lower() != 'activa':
+                continue
+            detalle = str(fila[3] or '').lower()
+            if detalle == 'factura':
+                saldo += dinero.a_pesos(fila[5])
+            elif detalle == 'abono':
+                saldo -= dinero.a_pesos(fila[5])
+        return saldo
+
+    def facturas_abiertas(self, fin, saldo):
+        """
+        Facturas que forman `saldo` con los movimientos [0, fin) y el saldo a favor.
+
+        Los abonos se aplican a las facturas más antiguas primero, así que el
+        saldo lo forman las facturas más recientes. Cada factura conserva su
+        fecha aunque su saldo se haya arrastrado a otra cadena o a la factura
+        de saldo inicial de un año nuevo. Devuelve ([(ordinal, id_factura, pendiente)], a_favor).
+        """
+        from . import archivo
+
+        if saldo <= 0:
+            return [], -saldo
+        facturas, a_favor = deque(), 0
+        for ordinal, k, efecto in zip(self.ordinales[:fin], self.orden[:fin], self.efectos[:fin]):
+            if efecto > 0:
+                usado = min(a_favor, efecto)
+                a_favor -= usado
+                if efecto > usado:
+                    fila = self.contenido[k]
+                    original = archivo.fecha_apertura(fila)
+                    facturas.append([
+                        original.toordinal() if original else ordinal, fila[6] if len(fila) > 6 else '', efecto - usado,
+                    ])
+            elif efecto < 0:
+                pago = -efecto
+                while pago and facturas:
+                    aplicado = min(pago, facturas[0][2])
+                    facturas[0][2] -= aplicado
+                    pago -= aplicado
+                    if not facturas[0][2]:
+                        facturas.popleft()
+                a_favor += pago
+
+        abiertas, resta = [], saldo
+        while resta and facturas:
+            ordinal, id_factura, pendiente = facturas.pop()
+            abiertas.append((ordinal, id_factura, min(pendiente, resta)))
+            resta -= abiertas[-1][2]
+        if resta:
+            # Lo que la cadena debe de más que las facturas con fecha queda con la fecha del último movimiento
+            fila = self.contenido[self.orden[fin - 1]] if fin else ()
+            abiertas.append((self.ordinales[fin - 1] if fin else 0, fila[6] if len(fila) > 6 else '', resta))
+        abiertas.reverse()
+        abiertas.sort(key=lambda factura: factura[0])
+        return abiertas, 0
+
+    def facturas_pendientes(self):
+        """
+        Facturas con saldo por pagar y el saldo a favor que queda.
+
+        El monto lo da la cadena activa (sus facturas menos sus abonos); las
+        fechas, las facturas que lo forman (ver facturas_abiertas).
+        """
+        if self._pendientes is None:
+            self._pendientes = self.facturas_abiertas(len(self.orden), self.saldo_cadena_activa())
+        return self._pendientes
+
+    def antiguedad(self, hoy):
+        """Saldo pendiente repartido en TRAMOS_ANTIGUEDAD según los días de cada factura a `hoy`"""
+        corte = hoy.toordinal()
+        if self._tramos is None or self._tramos[0] != corte:
+            montos = [0] * len(TRAMOS_ANTIGUEDAD)
+            for ordinal, _, pendiente in self.facturas_pendientes()[0]:
+                dias = corte - ordinal
+                for i, (_, limite) in enumerate(TRAMOS_ANTIGUEDAD):
+                    if limite is None or dias <= limite:
+                        montos[i] += pendiente
+                        break
+            self._tramos = (corte, montos)
+        return self._tramos[1]
+
+
+_ultimas = {}  # hoja -> cuentas de la última versión armada, para reusar las que no cambiaron
+
+
+def cuentas(sheet_name):
+    """Cuentas de todos los proveedores de la hoja en la versión que ve la petición"""
+    def construir(filas):
+        anteriores = _ultimas.get(sheet_name, {})
+        actuales = {}
+        for clave, posiciones in indices.indice_hash(sheet_name, 2).items():
+            contenido = tuple(filas[p] for p in posiciones)
+            cuenta = anteriores.get(clave)
+            if cuenta is not None and cuenta.contenido == contenido:
+                cuenta = cuenta.reubicada(posiciones)
+            else:
+                cuenta = CuentaCorriente(contenido[0][2], contenido, posiciones)
+            actuales[clave] = cuenta
+        _ultimas[sheet_name] = actuales
+        return actuales
+
+    return indices.obtener_indice(sheet_name, 'cuentas', construir)
+
+
+def cuenta(sheet_name, proveedor):
+    """Cuenta de un proveedor (sin distinguir mayúsculas), o None si no tiene movimientos"""
+    return cuentas(sheet_name).get(indices.clave_normalizada(proveedor))
+
+
+def extracto(sheet_name, proveedor, desde=None, hasta=None):
+    """
+    Extracto del proveedor entre dos fechas con saldo corrido.
+
+    Devuelve None si el proveedor no tiene movimientos. Las líneas traen la
+    posición de la fila en la hoja, el efecto en el saldo y el saldo después
+    del movimiento.
+    """
+    cuenta_proveedor = cuenta(sheet_name, proveedor)
+    if cuenta_proveedor is None:
+        return None
+
+    inicio, fin = cuenta_proveedor.tramo(desde, hasta)
+    saldo_inicial = cuenta_proveedor._saldo_hasta(inicio)
+    saldo_final = cuenta_proveedor._saldo_hasta(fin)
+    lineas = [
+        {
+            'posicion': cuenta_proveedor.posiciones[i],
+            'efecto': cuenta_proveedor.efectos[i],
+            'saldo': cuenta_proveedor.acumulados[i],
+        }
+        for i in range(inicio, fin)
+    ]
+    return {
+        'proveedor': cuenta_proveedor.proveedor,
+        'desde': desde,
+        'hasta': hasta,
+        'saldo_inicial': saldo_inicial,
+        'saldo_final': saldo_final,
+        'variacion': saldo_final - saldo_inicial,
+        'lineas': lineas,
+    }
+
+
+def reporte_antiguedad(sheet_name, hoy=None):
+    """
+    Antigüedad de saldos de todos los proveedores de la hoja.
+
+    Solo aparecen los que tienen facturas pendientes o saldo a favor. El saldo
+    de cada fila es la suma de los tramos menos el saldo a favor.
+    """
+    hoy = hoy or date.today()
+    filas = []
+    totales = {'tramos': [0] * len(TRAMOS_ANTIGUEDAD), 'a_favor': 0, 'saldo': 0}
+    for cuenta_proveedor in cuentas(sheet_name).values():
+        pendientes, a_favor = cuenta_proveedor.facturas_pendientes()
+        if not pendientes and not a_favor:
+            continue
+        montos = cuenta_proveedor.antiguedad(hoy)
+        saldo = sum(montos) - a_favor
+        filas.append({
+            'proveedor': cuenta_proveedor.proveedor,
+            'tramos': list(montos),
+            'a_favor': a_favor,
+            'saldo': saldo,
+            'facturas': len(pendientes),
+        })
+        totales['tramos'] = [t + m for t, m in zip(totales['tramos'], montos)]
+        totales['a_favor'] += a_favor
+        totales['saldo'] += saldo
+    filas.sort(key=lambda fila: str(fila['proveedor']).lower())
+    return {
+        'corte': hoy,
+        'tramos': [nombre for nombre, _ in TRAMOS_ANTIGUEDAD],
+        'filas': filas,
+        'totales': totales,
+    }
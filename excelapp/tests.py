@@ -0,0 +1,257 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from openpyxl import Workbook, load_workbook
+
+from . import archivo, cierres, indices, libros, pendientes, replica, respaldo, saldos
+
+ENCABEZADOS_MOVIMIENTOS = ('Id', 'Fecha', 'Proveedor', 'Detalle', 'Obs', 'Total', 'IdFactura', 'Estado')
+ENCABEZADOS_RESUMEN = ('Id', 'Proveedor', 'Total Facturas', 'Total Abonos', 'Saldo')
+ENCABEZADOS_GASTOS = ('Id', 'Fecha', 'Categoria', 'Placa', 'Conductor', 'Precio')
+
+# El año cerrado más reciente: rotar_anio no acepta el año en curso
+ANIO = date.today().year - 1
+
+
+def _fecha(mes, dia, anio=ANIO):
+    return datetime(anio, mes, dia)
+
+
+PROVEEDORES = [
+    (1, _fecha(3, 1), 'Ana', 'Factura', 'Compra', 1000, 'F-001', 'Activa'),
+    (2, _fecha(11, 10), 'Ana', 'Factura', 'Compra', 500, 'F-001', 'Activa'),
+    (3, _fecha(12, 5), 'Ana', 'Abono', 'Pago', 300, 'F-001', 'Activa'),
+    (4, _fecha(5, 1), 'Beto', 'Factura', 'Compra', 400, 'F-001', 'Inactiva'),
+    (5, _fecha(6, 1), 'Beto', 'Abono', 'Pago', 400, 'F-001', 'Inactiva'),
+    (6, _fecha(1, 10, ANIO + 1), 'Carla', 'Factura', 'Compra', 200, 'F-001', 'Activa'),
+]
+GASTOS = [
+    (1, _fecha(9, 8), 'Flete', 'ZIW41G', 'Pedro', 5000),
+    (2, _fecha(1, 15, ANIO + 1), 'Peaje', 'ZIW41G', 'Pedro', 700),
+]
+
+
+def _escribir_libro(ruta, gastos=GASTOS):
+    """Libro con las hojas de la aplicación; Gastos va al final para que sus textos nuevos no muevan los de las demás"""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for nombre, encabezados, filas in (
+        ('Proveedores', ENCABEZADOS_MOVIMIENTOS, PROVEEDORES),
+        ('Resumen', ENCABEZADOS_RESUMEN, [(1, 'Ana', 1500, 300, 1200), (2, 'Carla', 200, 0, 200)]),
+        ('ProveedoresCliente', ENCABEZADOS_MOVIMIENTOS, []),
+        ('ResumenCliente', ENCABEZADOS_RESUMEN, []),
+        ('Gastos', ENCABEZADOS_GASTOS, gastos),
+    ):
+        ws = wb.create_sheet(nombre)
+        ws.append(encabezados)
+        for fila in filas:
+            ws.append(fila)
+    wb.save(ruta)
+
+
+def _filas_en_disco(ruta, sheet_name):
+    wb = load_workbook(ruta, read_only=True)
+    try:
+        return [fila for fila in wb[sheet_name].iter_rows(min_row=2, values_only=True)]
+    finally:
+        wb.close()
+
+
+class LibroTemporalTestCase(SimpleTestCase):
+    """
+    Cada prueba trabaja sobre un libro nuevo en una carpeta temporal, con las
+    cachés de los módulos vacías y sin réplica ni hilos en segundo plano.
+    """
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        self.ruta = os.path.join(carpeta, 'FinancieroG.xlsx')
+        _escribir_libro(self.ruta)
+
+        ajustes = override_settings(RUTA_EXCEL=self.ruta, DISPOSICION_EXCEL='unico')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for parche in (
+            mock.patch.object(pendientes, 'RUTA_PENDIENTES', os.path.join(carpeta, 'pendientes')),
+            mock.patch.object(respaldo, 'RUTA_RESPALDOS', os.path.join(carpeta, 'respaldos')),
+            mock.patch.object(cierres, 'RUTA_CIERRES', os.path.join(carpeta, 'cierres')),
+            mock.patch.object(archivo, 'RUTA_ARCHIVO', os.path.join(carpeta, 'archivo')),
+            mock.patch.object(libros, 'DISPOSICION_EXCEL', 'unico'),
+            mock.patch.object(indices, 'CACHE_EN_DISCO', False),
+            mock.patch.object(indices, '_vigilado', False),
+            mock.patch.dict(indices._cache, clear=True),
+            mock.patch.object(pendientes, '_entradas', None),
+            mock.patch.object(archivo, '_cache', {'json': {}, 'libros': {}}),
+            mock.patch.object(cierres, '_cache', {'firma': None, 'cierres': {}}),
+            mock.patch.object(replica, 'programar'),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+        parche = mock.patch.object(pendientes, '_programar_reintentos')
+        self.reintentos = parche.start()
+        self.addCleanup(parche.stop)
+
+    def tocar(self):
+        """Cambia la fecha de modificación del libro, como lo haría otro programa al guardarlo"""
+        stat = os.stat(self.ruta)
+        os.utime(self.ruta, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class RefrescarTests(LibroTemporalTestCase):
+
+    def test_refrescar_conserva_las_hojas_que_no_cambiaron(self):
+        proveedores = indices.leer_hoja('Proveedores')
+        construidos = []
+        indices.obtener_indice('Proveedores', 'prueba', lambda filas: construidos.append('Proveedores') or len(filas))
+        indices.obtener_indice('Gastos', 'prueba', lambda filas: construidos.append('Gastos') or len(filas))
+        version = indices.version_hoja('Gastos')
+
+        wb = load_workbook(self.ruta)
+        wb['Gastos'].append((3, _fecha(10, 1), 'Flete', 'ZIW41G', 'Pedro', 900))
+        libros.guardar_libro(wb, self.ruta)
+
+        self.assertGreater(indices.version_hoja('Gastos'), version)
+        self.assertEqual([fila[0] for fila in indices.leer_hoja('Gastos')], [1, 2, 3])
+        # La hoja sin cambios conserva sus filas y su índice; la que cambió lo reconstruye
+        self.assertIs(indices.leer_hoja('Proveedores'), proveedores)
+        self.assertEqual(indices.obtener_indice('Proveedores', 'prueba', lambda filas: construidos.append('x')), 6)
+        self.assertEqual(indices.obtener_indice('Gastos', 'prueba', lambda filas: construidos.append('Gastos') or len(filas)), 3)
+        self.assertEqual(construidos, ['Proveedores', 'Gastos', 'Gastos'])
+
+    def test_version_fijada_no_ve_cambios_externos_hasta_soltarla(self):
+        token = indices.fijar_version()
+        try:
+            antes = indices.leer_hoja('Gastos')
+            _escribir_libro(self.ruta, gastos=GASTOS[:1])
+            self.tocar()
+            self.assertIs(indices.leer_hoja('Gastos'), antes)
+        finally:
+            indices.soltar_version(token)
+        self.assertEqual([fila[0] for fila in indices.leer_hoja('Gastos')], [1])
+
+    def test_encolar_superpone_las_filas_pendientes(self):
+        proveedores = indices.leer_hoja('Proveedores')
+        indices.obtener_indice('Gastos', 'prueba', len)
+
+        pendientes.encolar('Gastos', [[1, date(ANIO, 9, 8), 'Flete', 'ZIW41G', 'Pedro', Decimal('6000')]])
+
+        # Las filas pendientes se leen como las devolvería openpyxl desde el archivo
+        self.assertEqual(indices.leer_hoja('Gastos'), ((1, _fecha(9, 8), 'Flete', 'ZIW41G', 'Pedro', 6000),))
+        self.assertEqual(indices.leer_encabezados('Gastos'), ENCABEZADOS_GASTOS)
+        self.assertEqual(indices.obtener_indice('Gastos', 'prueba', len), 1)
+        self.assertIs(indices.leer_hoja('Proveedores'), proveedores)
+        self.assertEqual(len(_filas_en_disco(self.ruta, 'Gastos')), 2)
+
+    def test_refrescar_mantiene_la_superposicion_de_otra_hoja(self):
+        indices.leer_hoja('Gastos')
+        pendientes.encolar('Gastos', [[1, date(ANIO, 9, 8), 'Flete', 'ZIW41G', 'Pedro', 6000]])
+
+        # Otro guardado del mismo libro no debe borrar el cambio que sigue pendiente
+        wb = load_workbook(self.ruta)
+        wb['Proveedores'].append((7, _fecha(12, 20), 'Carla', 'Abono', 'Pago', 50, 'F-001', 'Activa'))
+        libros.guardar_libro(wb, self.ruta)
+
+        self.assertEqual(len(indices.leer_hoja('Proveedores')), 7)
+        self.assertEqual([fila[5] for fila in indices.leer_hoja('Gastos')], [6000])
+
+
+class ColaEscrituraTests(LibroTemporalTestCase):
+
+    def bloquear(self):
+        """El libro abierto en Excel: reemplazarlo falla como en Windows"""
+        return mock.patch.object(libros, 'guardar_libro', side_effect=PermissionError(13, 'Permission denied'))
+
+    def test_libro_bloqueado_deja_el_cambio_en_el_diario(self):
+        nueva = [3, date(ANIO, 10, 1), 'Peaje', 'ZIW41G', 'Pedro', 800]
+        with self.bloquear():
+            pendientes.encolar('Gastos', GASTOS + [nueva])
+            self.assertFalse(pendientes.aplicar(self.ruta))
+
+        self.reintentos.assert_called_once()
+        self.assertEqual(len(_filas_en_disco(self.ruta, 'Gastos')), 2)
+        self.assertTrue(pendientes.hay_pendientes(['Gastos']))
+        with open(os.path.join(pendientes.RUTA_PENDIENTES, 'Gastos.json'), encoding='utf-8') as f:
+            entrada = json.load(f)
+        self.assertEqual(entrada['intentos'], 1)
+        self.assertIn('Permission denied', entrada['error'])
+        # Las lecturas ya muestran el cambio
+        self.assertEqual([fila[0] for fila in indices.leer_hoja('Gastos')], [1, 2, 3])
+
+    def test_agregar_se_suma_al_pendiente_y_se_escribe_al_liberar(self):
+        with self.bloquear():
+            pendientes.encolar('Gastos', GASTOS + [(3, _fecha(10, 1), 'Peaje', 'ZIW41G', 'Pedro', 800)])
+            self.assertFalse(pendientes.aplicar(self.ruta))
+            pendientes.encolar('Gastos', [(4, _fecha(10, 2), 'Peaje', 'ZIW41G', 'Pedro', 900)], modo='append')
+            self.assertFalse(pendientes.aplicar(self.ruta))
+        self.assertEqual([fila[0] for fila in indices.leer_hoja('Gastos')], [1, 2, 3, 4])
+        self.assertEqual(pendientes.entradas()[0]['intentos'], 2)
+
+        with mock.patch.object(respaldo, 'crear_instantanea'):
+            self.assertTrue(pendientes.aplicar(self.ruta))
+
+        self.assertFalse(pendientes.hay_pendientes())
+        self.assertFalse(os.path.exists(os.path.join(pendientes.RUTA_PENDIENTES, 'Gastos.json')))
+        en_disco = _filas_en_disco(self.ruta, 'Gastos')
+        self.assertEqual([fila[0] for fila in en_disco], [1, 2, 3, 4])
+        # La versión publicada es la del archivo, sin superponer el cambio una segunda vez
+        self.assertEqual(list(indices.leer_hoja('Gastos')), en_disco)
+
+    def test_diario_sobrevive_al_reinicio(self):
+        with self.bloquear():
+            pendientes.encolar('Gastos', [(1, date(ANIO, 9, 8), 'Flete', 'ZIW41G', 'Pedro', Decimal('6000'))])
+            pendientes.aplicar(self.ruta)
+
+        # Un proceso nuevo carga el diario y superpone el cambio al leer
+        pendientes._entradas = None
+        indices._cache.clear()
+        self.assertEqual(indices.leer_hoja('Gastos'), ((1, _fecha(9, 8), 'Flete', 'ZIW41G', 'Pedro', 6000),))
+        with mock.patch.object(respaldo, 'crear_instantanea'):
+            self.assertTrue(pendientes.aplicar_todos())
+        self.assertEqual(_filas_en_disco(self.ruta, 'Gastos'), [(1, _fecha(9, 8), 'Flete', 'ZIW41G', 'Pedro', 6000)])
+
+
+class RotacionAnioTests(LibroTemporalTestCase):
+
+    def test_rotar_arrastra_los_saldos_al_libro_activo(self):
+        saldos_antes = {clave: cuenta.saldo_al() for clave, cuenta in saldos.cuentas('Proveedores').items()}
+
+        resumen = archivo.rotar_anio(ANIO)
+
+        self.assertEqual(resumen['Proveedores'], {'archivadas': 5, 'aperturas': 2})
+        self.assertEqual(resumen['Gastos'], {'archivadas': 1, 'aperturas': 0})
+        saldos_despues = {clave: cuenta.saldo_al() for clave, cuenta in saldos.cuentas('Proveedores').items()}
+        self.assertEqual(saldos_despues['ana'], saldos_antes['ana'])
+        self.assertEqual(saldos_despues['carla'], saldos_antes['carla'])
+        self.assertNotIn('beto', saldos_despues)
+
+        # Una apertura por factura abierta al 31/12 (FIFO: el abono paga la más antigua), con su fecha original
+        activas = indices.leer_hoja('Proveedores')
+        aperturas = [fila for fila in activas if archivo.es_apertura(fila)]
+        self.assertEqual([fila[0] for fila in aperturas], [7, 8])
+        self.assertEqual([fila[5] for fila in aperturas], [700, 500])
+        self.assertEqual([archivo.fecha_apertura(fila) for fila in aperturas], [date(ANIO, 3, 1), date(ANIO, 11, 10)])
+        self.assertTrue(all(fila[1] == datetime(ANIO + 1, 1, 1) and fila[7] == 'Activa' for fila in aperturas))
+        self.assertEqual([fila[0] for fila in activas if not archivo.es_apertura(fila)], [6])
+
+        self.assertTrue(archivo.anio_archivado(ANIO))
+        self.assertEqual(archivo.manifiesto()['anios'][str(ANIO)]['aperturas']['Proveedores'], {'Ana': 1200})
+        self.assertEqual([fila[0] for fila in _filas_en_disco(archivo.ruta_anio(ANIO), 'Proveedores')], [1, 2, 3, 4, 5])
+        self.assertEqual([fila[0] for fila in _filas_en_disco(self.ruta, 'Gastos')], [2])
+
+        with self.assertRaisesMessage(ValueError, 'ya está archivado'):
+            archivo.rotar_anio(ANIO)
+
+    def test_rotar_no_corre_con_cambios_pendientes(self):
+        pendientes.encolar('Gastos', GASTOS[:1])
+
+        with self.assertRaisesMessage(ValueError, 'cambios pendientes'):
+            archivo.rotar_anio(ANIO)
+        self.assertFalse(archivo.anio_archivado(ANIO))
+        self.assertEqual(len(_filas_en_disco(self.ruta, 'Proveedores')), 6)
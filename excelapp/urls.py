@@ -18,6 +18,8 @@ urlpatterns = [
     path('proveedores/persona/agregar/', views.agregar_persona, name='proveedor_persona_agregar'),
     path('proveedores/persona/editar/<int:id>/', views.editar_proveedor, name='proveedor_persona_editar'),
     path('proveedores/descargar-excel/', views.descargar_excel_proveedor, name='proveedores_descargar_excel'),
+    path('proveedores/estado-cuenta/', views.estado_cuenta_proveedor, name='proveedores_estado_cuenta'),
+    path('proveedores/antiguedad/', views.antiguedad_proveedor, name='proveedores_antiguedad'),
 
 
     # Clientes
@@ -30,6 +32,8 @@ urlpatterns = [
     path('clientes/dashboard/', views.dashboardCliente, name='clientes_dashboard'),
     path('clientes/descargar-excel/', views.descargar_excel_cliente, name='clientes_descargar_excel'),
     path('clientes/persona/editar/<int:id>/', views.editar_cliente, name='cliente_persona_editar'),
+    path('clientes/estado-cuenta/', views.estado_cuenta_cliente, name='clientes_estado_cuenta'),
+    path('clientes/antiguedad/', views.antiguedad_cliente, name='clientes_antiguedad'),
     
     # Gastos
     path('gastos/', views.gastos, name='gastos_lista'),
@@ -38,5 +42,25 @@ urlpatterns = [
     path('gastos/eliminar/<int:id>/', views.eliminar_gasto, name='gasto_eliminar'),
     path('gastos/resumen/', views.resumen_gastos, name='gastos_resumen'),
     path('gastos/dashboard/', views.dashboard_gastos, name='gastos_dashboard'),
+    path('gastos/vehiculos/', views.flota_view, name='gastos_flota'),
+    path('api/gastos/vehiculos/', views.api_flota, name='api_gastos_flota'),
+
+    # Cierres mensuales
+    path('cierres/', views.cierres_view, name='cierres'),
+
+    # Libro completo
+    path('libro/descargar/', views.descargar_libro, name='descargar_libro'),
+    path('pendientes/reintentar/', views.reintentar_pendientes, name='reintentar_pendientes'),
+
+    # Disponibilidad del servidor (calentamiento al arrancar)
+    path('listo/', views.listo, name='listo'),
+
+    # Búsqueda
+    path('buscar/', views.buscar_view, name='buscar'),
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
+
+    # Saldos
+    path('api/proveedores/saldo/', views.api_saldo_proveedor, name='api_proveedores_saldo'),
+    path('api/clientes/saldo/', views.api_saldo_cliente, name='api_clientes_saldo'),
 
 ]
\ No newline at end of file
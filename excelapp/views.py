@@ -1,39 +1,40 @@
 # Librerías estándar de Python
-import calendar
 import io
 import json
-import locale
-import os
 import re
 from collections import defaultdict
 from datetime import date, datetime, timedelta
-from decimal import Decimal
+from urllib.parse import urlencode
 
 # Librerías de terceros
 import openpyxl
-import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
 from openpyxl.utils import get_column_letter
-from openpyxl.utils.dataframe import dataframe_to_rows
 
 # Librerías de Django
-from django.conf import settings
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import Http404, get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.safestring import mark_safe
 
 # Imports locales
+from . import archivo, busqueda, calentamiento, cierres, consultas, diario, dinero, flota, indices, libros, pendientes, registros, saldos
 from .forms import GastoForm, MovimientoClienteForm, MovimientoForm, ProveedorForm
+from .paginacion import paginar_keyset
 
 
-RUTA_EXCEL = settings.RUTA_EXCEL
-# Configurar a español (Colombia por ejemplo)
-locale.setlocale(locale.LC_TIME, 'es_CO.UTF-8') 
+# Nombres de los meses en español, sin depender del locale del sistema
+NOMBRES_MES = (
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+    'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre',
+)
+ABREVIATURAS_MES = tuple(nombre[:3] for nombre in NOMBRES_MES)
+
 # Configuración para tipos de entidad (Proveedores/Clientes)
 ENTITY_CONFIG = {
     'proveedor': {
@@ -71,40 +72,27 @@ ENTITY_CONFIG = {
 
 # Funciones genéricas reutilizables
 def cargar_datos_excel(sheet_name):
-    """Carga datos desde una hoja de Excel específica"""
-    if not os.path.exists(RUTA_EXCEL):
-        return []
-    
+    """Carga datos desde una hoja de Excel específica (leída una vez por versión del archivo)"""
     try:
-        wb = openpyxl.load_workbook(RUTA_EXCEL)
-        if sheet_name not in wb.sheetnames:
-            return []
-        
-        ws = wb[sheet_name]
-        return list(ws.iter_rows(min_row=2, values_only=True))
+        return list(indices.leer_hoja(sheet_name))
     except Exception as e:
         print(f"Error al cargar datos de Excel: {e}")
         return []
 
 def obtener_ultimo_id(sheet_name):
-    """Obtiene el último ID utilizado en una hoja de Excel"""
-    datos = cargar_datos_excel(sheet_name)
-    if not datos:
+    """Obtiene el último ID utilizado en una hoja de Excel (incluidos los años archivados)"""
+    try:
+        return max(indices.ultimo_id(sheet_name), archivo.ultimo_id_archivado(sheet_name))
+    except Exception as e:
+        print(f"Error al leer Excel: {e}")
         return 0
-    
-    # Buscar el máximo ID en la primera columna
-    max_id = 0
-    for fila in datos:
-        if fila and len(fila) > 0 and isinstance(fila[0], (int, float)):
-            max_id = max(max_id, int(fila[0]))
-    
-    return max_id
 
 def generar_id_factura(proveedor, sheet_name):
     """Genera un IdFactura incremental tipo F-001, F-002, ..."""
-    movimientos = cargar_datos_excel(sheet_name)
+    movimientos = indices.leer_hoja(sheet_name)
     max_num = 0
-    for mov in movimientos:
+    for posicion in indices.posiciones_por_valor(sheet_name, 2, proveedor):
+        mov = movimientos[posicion]
         if len(mov) >= 7 and mov[2] == proveedor:  # Asegurarse de que hay al menos 7 columnas y que IdFactura no es None
             id_factura = mov[6]  # columna IdFactura
             if id_factura and isinstance(id_factura, str) and id_factura.startswith('F-'):
@@ -117,51 +105,55 @@ def generar_id_factura(proveedor, sheet_name):
     return nuevo_id
 
 def guardar_en_excel(sheet_name, datos, encabezados=None, modo='overwrite'):
-    """Guarda datos en una hoja de Excel específica"""
+    """
+    Guarda datos en una hoja de Excel específica (solo se reescribe el archivo de esa hoja).
+
+    Los registros que cambian quedan en el diario (diario.py) y el cambio se
+    anota en la cola de escritura (pendientes.py): si el archivo está abierto
+    en Excel queda pendiente, ya se ve en las lecturas y se escribe en cuanto
+    el archivo se libera.
+    """
     try:
-        if os.path.exists(RUTA_EXCEL):
-            wb = load_workbook(RUTA_EXCEL)
-        else:
-            wb = openpyxl.Workbook()
-            # Eliminar la hoja por defecto si existe
-            if 'Sheet' in wb.sheetnames:
-                del wb['Sheet']
-        
-        if sheet_name not in wb.sheetnames:
-            ws = wb.create_sheet(sheet_name)
-            if encabezados:
-                ws.append(encabezados)
-        else:
-            ws = wb[sheet_name]
-            # Si el modo es 'overwrite', limpiar la hoja
-            if modo == 'overwrite':
-                # Eliminar todas las filas excepto los encabezados
-                if ws.max_row > 1:
-                    ws.delete_rows(2, ws.max_row)
-                # Si no hay encabezados, mantener los existentes
-                if encabezados:
-                    # Reemplazar encabezados existentes
-                    for idx, encabezado in enumerate(encabezados, 1):
-                        ws.cell(row=1, column=idx, value=encabezado)
-        
-        # Agregar datos
-        for dato in datos:
-            ws.append(dato)
-        
-        wb.save(RUTA_EXCEL)
-        return True
+        diario.registrar(sheet_name, datos, encabezados, modo)
+        pendientes.encolar(sheet_name, datos, encabezados, modo)
     except Exception as e:
         print(f"Error al guardar en Excel: {e}")
         return False
+    pendientes.aplicar(libros.ruta_hoja(sheet_name))
+    return True
+
+def avisar_mes_cerrado(request, *fechas):
+    """
+    Advierte cuando un cambio cae en un mes que ya tenía cierre.
+
+    El cierre se recalcula al escribir el cambio en el Excel; si quedó en la
+    cola, la huella del mes todavía no coincide y se avisa que falta.
+    """
+    meses = sorted({
+        cierres.clave_mes(fecha) for fecha in map(indices.fecha_de_celda, fechas)
+        if fecha and cierres.mes_cerrado(fecha)
+    })
+    if not meses:
+        return
+    alterados = cierres.meses_alterados()
+    recalculados = [mes for mes in meses if mes not in alterados]
+    por_recalcular = [mes for mes in meses if mes in alterados]
+    if recalculados:
+        messages.warning(request, f"El cambio afecta meses ya cerrados ({', '.join(recalculados)}); su cierre se recalculó.")
+    if por_recalcular:
+        messages.warning(
+            request,
+            f"El cambio afecta meses ya cerrados ({', '.join(por_recalcular)}); su cierre se recalculará "
+            "cuando el cambio quede guardado en el Excel.",
+        )
 
 def normalizar_total(total_raw):
-    """Normaliza el valor total eliminando caracteres no numéricos"""
+    """Normaliza el valor total a pesos enteros (sin signo)"""
     try:
-        total_str = re.sub(r'[^\d]', '', total_raw) if total_raw else '0'
-        return Decimal(total_str) if total_str else Decimal('0')
+        return abs(dinero.desde_texto(total_raw)) if total_raw else 0
     except Exception as e:
         print(f"Error al normalizar total: {e}")
-        return Decimal('0')
+        return 0
 
 def normalizar_fecha(fecha_input):
     if isinstance(fecha_input, str):
@@ -179,63 +171,40 @@ def normalizar_fecha(fecha_input):
 def obtener_movimientos_filtrados(entity_type, proveedor_filtrado=None, fecha_filtrada=None, estado_filtrado=None):
     """Obtiene movimientos filtrados por proveedor, fecha y estado (activo/inactivo)"""
     config = ENTITY_CONFIG[entity_type]
-    movimientos = []
-    
-    datos = cargar_datos_excel(config['sheet_movimientos'])
-    
-    for row in datos:
-        # Asegurarse de que la fila tiene suficientes columnas
-        if len(row) < 8:
-            estado = None # No tiene columna de estado
-        else:
-            estado = row[7].lower()
-
-        # Mapear los datos de la fila a un diccionario
-        mov = {
-            'id': row[0],
-            'fecha': row[1],
-            'proveedor': row[2],
-            'detalle': row[3],
-            'obs': row[4],
-            'total': row[5],
-            'idfactura': row[6] if len(row) > 6 else '',
-            'estado': estado
-        }
-        
-        # Aplicar filtros
-        cumple_proveedor = (not proveedor_filtrado or (mov['proveedor'] and str(mov['proveedor']).strip().lower() == proveedor_filtrado.strip().lower()))
-        cumple_fecha = (not fecha_filtrada or normalizar_fecha(mov['fecha']) == normalizar_fecha(fecha_filtrada))
-        cumple_estado = (not estado_filtrado or (mov['estado'] and mov['estado'] == estado_filtrado.lower()))
-        
-        if cumple_proveedor and cumple_fecha and cumple_estado:
-            movimientos.append(mov)
-    
-    return movimientos
+    desde, hasta = indices.limites_fecha(fecha=fecha_filtrada)
+    if proveedor_filtrado or estado_filtrado:
+        # Proveedor y estado se filtran y ordenan en SQL sobre la réplica de lectura
+        consulta = consultas.movimientos(
+            config['sheet_movimientos'], proveedor=proveedor_filtrado, estado=estado_filtrado, desde=desde, hasta=hasta,
+        )
+        consulta = consulta.order_by('fecha', 'id_hoja', 'id') if desde or hasta else consulta.order_by('id_hoja', 'id')
+        return consultas.registros_de(consulta, registros.Movimiento)
+    movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
+    filas = indices.leer_hoja(config['sheet_movimientos'])
+    if desde is None and hasta is None:
+        posiciones = range(len(filas))
+    else:
+        posiciones = indices.indice_fechas(config['sheet_movimientos']).posiciones_en_rango(desde, hasta)
+    return [movimientos[p] for p in posiciones if len(filas[p]) >= 6]
+
+def parametros_paginacion(request):
+    """Parámetros GET actuales sin los de paginación, para reutilizarlos en los enlaces"""
+    params = request.GET.copy()
+    for clave in ('page', 'despues', 'antes'):
+        params.pop(clave, None)
+    return params.urlencode()
 
 def obtener_resumen_filtrado(entity_type, proveedor_filtrado=None):
     """Obtiene resumen filtrado por proveedor"""
     config = ENTITY_CONFIG[entity_type]
-    datos = []
-    
-    resumen_data = cargar_datos_excel(config['sheet_resumen'])
+    filas = indices.leer_hoja(config['sheet_resumen'])
+    resumen = registros.registros_hoja(config['sheet_resumen'], registros.Resumen)
     
-    for row in resumen_data:
-        if len(row) < 5:
-            continue
-        
-        id = row[0]
-        proveedor = row[1]
-        factura = row[2] or 0
-        ahorro = row[3] or 0
-        saldo = row[4] or 0
-        
-        if proveedor_filtrado:
-            if proveedor == proveedor_filtrado:
-                datos.append((id, proveedor, factura, ahorro, saldo))
-        else:
-            datos.append((id, proveedor, factura, ahorro, saldo))
+    if proveedor_filtrado:
+        posiciones = indices.posiciones_por_valor(config['sheet_resumen'], 1, proveedor_filtrado)
+        return [resumen[p] for p in posiciones if len(filas[p]) >= 5 and resumen[p].proveedor == proveedor_filtrado]
     
-    return datos
+    return [registro for fila, registro in zip(filas, resumen) if len(fila) >= 5]
 
 def recalcular_resumen(entity_type):
     """Recalcula el resumen considerando solo facturas y abonos activos"""
@@ -252,16 +221,12 @@ def recalcular_resumen(entity_type):
         _, fecha, proveedor, detalle, obs, total, id_factura, estado = mov
 
         if proveedor not in resumen_dict:
-            resumen_dict[proveedor] = {
-                'facturas': Decimal('0'),
-                'abonos': Decimal('0'),
-                'saldo': Decimal('0')
-            }
+            resumen_dict[proveedor] = {'facturas': 0, 'abonos': 0, 'saldo': 0}
 
         if detalle.lower() == 'factura':
-            resumen_dict[proveedor]['facturas'] += Decimal(str(total))
+            resumen_dict[proveedor]['facturas'] += dinero.a_pesos(total)
         elif detalle.lower() == 'abono':
-            resumen_dict[proveedor]['abonos'] += Decimal(str(total))
+            resumen_dict[proveedor]['abonos'] += dinero.a_pesos(total)
 
         # Calcular saldo actual
         resumen_dict[proveedor]['saldo'] = resumen_dict[proveedor]['facturas'] - resumen_dict[proveedor]['abonos']
@@ -272,9 +237,9 @@ def recalcular_resumen(entity_type):
         resumen_data.append([
             idx,  # ID incremental
             proveedor,
-            float(valores['facturas']),
-            float(valores['abonos']),
-            float(valores['saldo'])
+            valores['facturas'],
+            valores['abonos'],
+            valores['saldo']
         ])
 
     encabezados = ['Id', 'Proveedor', 'Total Facturas', 'Total Abonos', 'Saldo']
@@ -308,7 +273,7 @@ def recalcular_movimientos_factura(entity_type, id_inicio):
     proveedor = movimientos[fila_inicio][2]
 
     # --- 4. Config inicial ---
-    saldo = Decimal(str(movimientos[fila_inicio][5]))
+    saldo = dinero.a_pesos(movimientos[fila_inicio][5])
 
     # --- 5. Recorrer hacia abajo ---
     for j in range(fila_inicio + 1, len(movimientos)):
@@ -318,14 +283,12 @@ def recalcular_movimientos_factura(entity_type, id_inicio):
         detalle = str(movimientos[j][3]).lower()
 
         if "abono" in detalle:
-            saldo -= Decimal(str(movimientos[j][5]))
+            saldo -= dinero.a_pesos(movimientos[j][5])
 
         elif "factura" in detalle:
-            match = re.search(r":\s*([\d.,]+)", str(movimientos[j][4]))
-            if match:
-                total_factura = Decimal(match.group(1).replace(",", "."))
-            else:
-                total_factura = Decimal(movimientos[j][5])
+            total_factura = dinero.monto_en_obs(movimientos[j][4])
+            if total_factura is None:
+                total_factura = dinero.a_pesos(movimientos[j][5])
             saldo_anterior = saldo
             saldo = saldo_anterior + total_factura  # actualizar saldo acumulado
             # reconstruir observaciones
@@ -335,12 +298,12 @@ def recalcular_movimientos_factura(entity_type, id_inicio):
             else:
                 obs = "Factura"
 
-            total_mensaje = f"{obs} - la factura se realizo por : {int(total_factura)} "
-            obs = f"{total_mensaje} + saldo anterior {int(saldo_anterior)} = total {int(saldo)}"
+            total_mensaje = f"{obs} - la factura se realizo por : {total_factura} "
+            obs = f"{total_mensaje} + saldo anterior {saldo_anterior} = total {saldo}"
 
             # sobrescribir fila
             movimientos[j][4] = obs
-            movimientos[j][5] = int(saldo)
+            movimientos[j][5] = saldo
 
     # --- 6. Guardar ---
     encabezados = ['Id', 'Fecha', 'Proveedor', 'Detalle', 'Obs', 'Total', 'IdFactura', 'Estado']
@@ -353,16 +316,22 @@ def calcular_saldo_factura(id_factura, movimientos_data):
     for movimiento in movimientos_data:
         if len(movimiento) > 6 and movimiento[6] == id_factura:
             if 'factura' in movimiento[3].lower():
-                saldo += float(movimiento[5])
+                saldo += dinero.a_pesos(movimiento[5])
             elif 'abono' in movimiento[3].lower():
-                saldo -= float(movimiento[5])
+                saldo -= dinero.a_pesos(movimiento[5])
     return saldo  # No permitir saldos negativos
 
+def posiciones_proveedor(sheet_name, proveedor):
+    """Posiciones de los movimientos del proveedor, en orden de la hoja"""
+    filas = indices.leer_hoja(sheet_name)
+    return [p for p in indices.posiciones_por_valor(sheet_name, 2, proveedor) if filas[p][2] == proveedor]
+
 def actualizar_estado_facturas(proveedor, id_factura, sheet_name):
     """Actualizar el estado de las facturas de un proveedor"""
     movimientos_data = [list(row) for row in cargar_datos_excel(sheet_name)]
 
-    for i, movimiento in enumerate(movimientos_data):
+    for i in indices.posiciones_por_valor(sheet_name, 6, id_factura):
+        movimiento = movimientos_data[i]
         # Check for the correct provider, invoice detail, and matching invoice ID
         if len(movimiento) > 7 and \
             movimiento[2] == proveedor and \
@@ -377,42 +346,42 @@ def actualizar_estado_facturas(proveedor, id_factura, sheet_name):
 # Vistas para Gastos
 def gastos(request):
     config = ENTITY_CONFIG['gastos']
-    gastos_data = cargar_datos_excel(config['sheet_gastos'])
-    gastos_list = []
-    
-    for gasto in gastos_data:
-        if len(gasto) >= 6:  # Asegurarse de que tiene todos los campos
-            gastos_list.append({
-                'id': gasto[0],
-                'fecha': gasto[1],
-                'categoria': gasto[2],
-                'placa': gasto[3],
-                'conductor': gasto[4],
-                'precio': gasto[5],
-            })
+    gastos_data = indices.leer_hoja(config['sheet_gastos'])
     
     # Filtros
     categoria_filtro = request.GET.get('categoria', '')
     placa_filtro = request.GET.get('placa', '')
     fecha_filtro = request.GET.get('fecha', '')
     
-    if categoria_filtro:
-        gastos_list = [g for g in gastos_list if g['categoria'] == categoria_filtro]
-    if placa_filtro:
-        gastos_list = [g for g in gastos_list if placa_filtro.lower() in g['placa'].lower()]
-    if fecha_filtro:
-        gastos_list = [g for g in gastos_list if normalizar_fecha(g['fecha']) == normalizar_fecha(fecha_filtro)]
+    desde, hasta = indices.limites_fecha(fecha=fecha_filtro)
     
-    # Paginación
-    paginator = Paginator(gastos_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor por fecha (más reciente primero). Con filtros la página sale de
+    # la réplica en SQL; sin filtros se recorre el índice ordenado en memoria
+    if categoria_filtro or placa_filtro or desde or hasta:
+        consulta = consultas.gastos(
+            config['sheet_gastos'], categoria=categoria_filtro, placa=placa_filtro, desde=desde, hasta=hasta,
+        )
+        page_obj = consultas.pagina(
+            consulta, registros.Gasto, despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+        )
+    else:
+        gastos_registros = registros.registros_hoja(config['sheet_gastos'], registros.Gasto)
+        indice = indices.indice_ordenado(
+            config['sheet_gastos'], 'fecha',
+            lambda g: (indices.ordinal_fecha(g[1] if len(g) > 1 else None), indices.id_numerico(g[0] if g else None)),
+        )
+        page_obj = paginar_keyset(
+            indice, gastos_registros.__getitem__, por_pagina=10,
+            despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+            filtro=lambda posicion: len(gastos_data[posicion]) >= 6,
+        )
     
     context = {
         'page_obj': page_obj,
         'categoria_filtro': categoria_filtro,
         'placa_filtro': placa_filtro,
         'fecha_filtro': fecha_filtro,
+        'all_params': parametros_paginacion(request),
     }
     return render(request, 'gastos.html', context)
 
@@ -436,7 +405,7 @@ def agregar_gasto(request):
             fecha = normalizar_fecha(fecha)
             
             # Nueva fila
-            nueva_fila = [nuevo_id, fecha, categoria, placa, conductor, float(precio)]
+            nueva_fila = [nuevo_id, fecha, categoria, placa, conductor, dinero.a_pesos(precio)]
             
             # Agregar a los datos
             gastos_data.append(nueva_fila)
@@ -446,35 +415,27 @@ def agregar_gasto(request):
 
             if guardar_en_excel(config['sheet_gastos'],gastos_data, encabezados, modo='overwrite'):
                 messages.success(request, 'Gasto agregado correctamente.')
+                avisar_mes_cerrado(request, fecha)
                 return redirect('mi_app:gasto_agregar')  # Redirigir a la misma página para ver el resumen actualizado
             else:
                 messages.error(request, 'Error al guardar el gasto. Inténtelo de nuevo.')
     else:
         form = GastoForm()
         
-    # Convertir a objetos Gasto para facilitar el procesamiento
-    gastos = []
-    for gasto in gastos_data:
-        if len(gasto) >= 6:  # Asegurarse de que hay suficientes columnas
-            gastos.append({
-                'fecha': normalizar_fecha(gasto[1]),
-                'categoria': gasto[2],
-                'placa': gasto[3],
-                'conductor': gasto[4],
-                'precio': float(gasto[5]) if gasto[5] else 0
-            })
+    # Registros de gastos con fecha y precio ya interpretados
+    gastos = [g for g in registros.registros_hoja(config['sheet_gastos'], registros.Gasto) if g.fecha]
     
     # Calcular totales
     hoy = date.today()
-    total_hoy = sum(g['precio'] for g in gastos if g['fecha'] == hoy)
-    total_mes = sum(g['precio'] for g in gastos if g['fecha'].month == hoy.month and g['fecha'].year == hoy.year)
+    total_hoy = sum(g.precio for g in gastos if g.fecha == hoy)
+    total_mes = sum(g.precio for g in gastos if g.fecha.month == hoy.month and g.fecha.year == hoy.year)
     
     # Resumen por categoría
     categorias = {}
     for gasto in gastos:
-        if gasto['categoria'] not in categorias:
-            categorias[gasto['categoria']] = 0
-        categorias[gasto['categoria']] += gasto['precio']
+        if gasto.categoria not in categorias:
+            categorias[gasto.categoria] = 0
+        categorias[gasto.categoria] += gasto.precio
     
     total_general = sum(categorias.values())
     resumen_categorias = []
@@ -487,7 +448,7 @@ def agregar_gasto(request):
         })
     
     # Últimos 5 gastos
-    ultimos_gastos = sorted(gastos, key=lambda x: x['fecha'], reverse=True)[:5]
+    ultimos_gastos = sorted(gastos, key=lambda x: x.fecha, reverse=True)[:5]
     
     context = {
         'form': form,
@@ -505,12 +466,8 @@ def editar_gasto(request, id):
     # Cargar gastos
     config = ENTITY_CONFIG['gastos']
     gastos_data = cargar_datos_excel(config['sheet_gastos'])
-    gasto_editar = None
-    
-    for gasto in gastos_data:
-        if gasto[0] == id:
-            gasto_editar = gasto
-            break
+    posicion = indices.posicion_por_id(config['sheet_gastos'], id)
+    gasto_editar = gastos_data[posicion] if posicion is not None else None
     
     if not gasto_editar:
         messages.error(request, 'Gasto no encontrado.')
@@ -533,15 +490,13 @@ def editar_gasto(request, id):
             fecha = normalizar_fecha(fecha)
 
             # Actualizar la fila en gastos_data
-            for i, gasto in enumerate(gastos_data):
-                if gasto[0] == id:
-                    gastos_data[i] = [id, fecha, categoria, placa, conductor, float(precio)]
-                    break
+            gastos_data[posicion] = [id, fecha, categoria, placa, conductor, dinero.a_pesos(precio)]
             
             # Guardar en Excel
             encabezados = ['Id', 'Fecha', 'Categoria', 'Placa', 'Conductor', 'Precio']
             if guardar_en_excel(config['sheet_gastos'], gastos_data, encabezados, modo='overwrite'):
                 messages.success(request, 'Gasto actualizado correctamente.')
+                avisar_mes_cerrado(request, gasto_editar[1], fecha)
                 return redirect('gastos')
             else:
                 messages.error(request, 'Error al actualizar el gasto.')
@@ -563,11 +518,8 @@ def eliminar_gasto(request, id):
     gastos_data = cargar_datos_excel(config['sheet_gastos'])
     
     # Buscar el gasto por ID
-    gasto_encontrado = None
-    for gasto in gastos_data:
-        if gasto[0] == id:
-            gasto_encontrado = gasto
-            break
+    posicion = indices.posicion_por_id(config['sheet_gastos'], id)
+    gasto_encontrado = gastos_data[posicion] if posicion is not None else None
     
     if gasto_encontrado is None:
         messages.error(request, 'El gasto no existe.')
@@ -575,12 +527,13 @@ def eliminar_gasto(request, id):
     
     if request.method == 'POST':
         # Eliminar el gasto de la lista
-        gastos_data.remove(gasto_encontrado)
+        del gastos_data[posicion]
         
         # Guardar los datos actualizados
         encabezados = ['Id', 'Fecha', 'Categoria', 'Placa', 'Conductor', 'Precio']
         if guardar_en_excel(config['sheet_gastos'], gastos_data, encabezados, modo='overwrite'):
             messages.success(request, 'Gasto eliminado correctamente.')
+            avisar_mes_cerrado(request, gasto_encontrado[1])
         else:
             messages.error(request, 'Error al eliminar el gasto.')
         
@@ -600,46 +553,35 @@ def eliminar_gasto(request, id):
 
 def resumen_gastos(request):
     config = ENTITY_CONFIG['gastos']
-    gastos_data = cargar_datos_excel(config['sheet_gastos'])
     
     # Verificar si se solicita descargar Excel
     download = request.GET.get('download', '')
     
-    # Convertir a lista de diccionarios
-    gastos_list = []
-    for gasto in gastos_data:
-        if len(gasto) >= 6:
-            gastos_list.append({
-                'id': gasto[0],
-                'fecha': normalizar_fecha(gasto[1]),
-                'categoria': gasto[2],
-                'placa': gasto[3],
-                'conductor': gasto[4],
-                'precio': float(gasto[5]) if gasto[5] else 0,
-            })
-    
     # Filtros
     categoria_filtro = request.GET.get('categoria', '')
     fecha_inicio = request.GET.get('fecha_inicio', '')
     fecha_fin = request.GET.get('fecha_fin', '')
     
-    if categoria_filtro:
-        gastos_list = [g for g in gastos_list if g['categoria'] == categoria_filtro]
-        
-    if fecha_inicio:
-        gastos_list = [g for g in gastos_list if g['fecha'] >= normalizar_fecha(fecha_inicio)]
-
-    if fecha_fin:
-        gastos_list = [ g for g in gastos_list if g['fecha'] <= normalizar_fecha(fecha_fin)]
-
-    # Ordenar por fecha ascendente
-    gastos_list.sort(key=lambda x: x['fecha'])
-    
-    # Agrupar por categoría
-    resumen_categoria = {}
-    for gasto in gastos_list:
-        cat = gasto['categoria']
-        resumen_categoria[cat] = resumen_categoria.get(cat, 0) + gasto['precio']
+    desde, hasta = indices.limites_fecha(fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+    
+    # Los totales de la hoja vigente se agrupan en SQL sobre la réplica; los años archivados se suman aparte
+    consulta = consultas.gastos(config['sheet_gastos'], categoria=categoria_filtro, desde=desde, hasta=hasta)
+    archivados = [
+        g for g in archivo.registros_archivados(config['sheet_gastos'], registros.Gasto, desde, hasta)
+        if g.fecha and (not categoria_filtro or g.categoria == categoria_filtro)
+    ]
+    
+    # Agrupar por categoría, en el orden en que aparece cada una por fecha ascendente
+    por_categoria = {}
+    for posicion, gasto in enumerate(archivados):
+        total, orden = por_categoria.get(gasto.categoria, (0, (gasto.fecha, 0, posicion)))
+        por_categoria[gasto.categoria] = (total + gasto.precio, orden)
+    for cat, total, primera, primer_id in consultas.totales_por(consulta, 'precio', 'categoria'):
+        anterior, orden = por_categoria.get(cat, (0, (primera, 1, primer_id)))
+        por_categoria[cat] = (anterior + total, min(orden, (primera, 1, primer_id)))
+    resumen_categoria = {
+        cat: total for cat, (total, orden) in sorted(por_categoria.items(), key=lambda item: item[1][1])
+    }
     
     # Calcular el total general
     total_general = sum(resumen_categoria.values())
@@ -656,21 +598,25 @@ def resumen_gastos(request):
     
     # Si se solicita descargar Excel
     if download == 'excel':
-        return generar_excel_gastos(gastos_list, resumen_categoria)
+        gastos_list = archivados + [
+            g for g in registros.registros_en_rango(config['sheet_gastos'], registros.Gasto, desde, hasta)
+            if g.fecha and (not categoria_filtro or g.categoria == categoria_filtro)
+        ]
+        gastos_list.sort(key=lambda x: x.fecha)
+        return generar_excel_gastos([g.como_dict() for g in gastos_list], resumen_categoria)
     
     # Gastos por mes
-    gastos_por_mes = {}
-    for gasto in gastos_list:       
-        mes_key = f"{gasto['fecha'].year}-{gasto['fecha'].month:02d}"
-        if mes_key not in gastos_por_mes:
-            gastos_por_mes[mes_key] = 0
-        gastos_por_mes[mes_key] += gasto['precio']
+    gastos_por_mes = consultas.totales_por_mes(consulta, 'precio')
+    for gasto in archivados:
+        mes_key = (f"{gasto.fecha.year}-{gasto.fecha.month:02d}",)
+        gastos_por_mes[mes_key] = gastos_por_mes.get(mes_key, 0) + gasto.precio
+    gastos_por_mes = {mes_key: gastos_por_mes[(mes_key,)] for (mes_key,) in sorted(gastos_por_mes)}
     
     # Formatear gastos por mes para la plantilla
     gastos_por_mes_formateados = []
     for mes_key, total in gastos_por_mes.items():
         año, mes = mes_key.split('-')
-        nombre_mes = datetime.strptime(mes, '%m').strftime('%B')
+        nombre_mes = NOMBRES_MES[int(mes) - 1]
         gastos_por_mes_formateados.append({
             'ano': año,
             'mes': nombre_mes,
@@ -689,6 +635,10 @@ def resumen_gastos(request):
 
 def generar_excel_gastos(gastos_list, resumen_categoria):
     """Genera un archivo Excel con los gastos y totales por categoría con estilos aplicados"""
+    # pandas solo se usa aquí: se importa al exportar para no cargarlo al arrancar
+    import pandas as pd
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
     # Crear DataFrame con los gastos
     df_gastos = pd.DataFrame(gastos_list)
     
@@ -811,18 +761,7 @@ def generar_excel_gastos(gastos_list, resumen_categoria):
 
 def dashboard_gastos(request):
     config = ENTITY_CONFIG['gastos']
-    gastos_data = cargar_datos_excel(config['sheet_gastos'])
-    gastos_list = []
-    
-    for gasto in gastos_data:
-        if len(gasto) >= 6:
-            gastos_list.append({
-                'fecha': normalizar_fecha(gasto[1]),
-                'categoria': gasto[2],
-                'placa': gasto[3],
-                'conductor': gasto[4],
-                'precio': gasto[5],
-            })
+    gastos_list = [g for g in registros.registros_hoja(config['sheet_gastos'], registros.Gasto) if g.fecha]
     
     # Aplicar filtros
     categoria_filtro = request.GET.get('categoria', '')
@@ -830,74 +769,106 @@ def dashboard_gastos(request):
     fecha_fin = request.GET.get('fecha_fin', '')
     placa_filtro = request.GET.get('placa', '')
     
-    
-    gastos_filtrados = gastos_list
+    # El rango de fechas se resuelve con el índice de fechas
+    desde, hasta = indices.limites_fecha(fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+    if desde or hasta:
+        gastos_filtrados = [
+            g for g in archivo.registros_en_rango(config['sheet_gastos'], registros.Gasto, desde, hasta)
+            if g.fecha
+        ]
+    elif placa_filtro:
+        # Sin rango de fechas, la placa se resuelve con el índice por placa
+        gastos_registros = registros.registros_hoja(config['sheet_gastos'], registros.Gasto)
+        gastos_filtrados = [
+            gastos_registros[p]
+            for p in indices.posiciones_por_valor(config['sheet_gastos'], 3, placa_filtro)
+            if gastos_registros[p].fecha
+        ]
+    else:
+        gastos_filtrados = gastos_list
     
     if categoria_filtro:
-        gastos_filtrados = [g for g in gastos_filtrados if g['categoria'] == categoria_filtro]
-    
-    if fecha_inicio:
-        gastos_filtrados = [g for g in gastos_filtrados if g['fecha'] >= normalizar_fecha(fecha_inicio)]
-    
-    if fecha_fin:
-        gastos_filtrados = [g for g in gastos_filtrados if g['fecha'] <= normalizar_fecha(fecha_fin)]
+        gastos_filtrados = [g for g in gastos_filtrados if g.categoria == categoria_filtro]
     
     if placa_filtro:
-        gastos_filtrados = [g for g in gastos_filtrados if g['placa'] == placa_filtro]
+        gastos_filtrados = [g for g in gastos_filtrados if g.placa == placa_filtro]
     
     # Gastos por categoría
-    gastos_por_categoria = defaultdict(float)
+    gastos_por_categoria = defaultdict(int)
     for gasto in gastos_filtrados:
-        cat = gasto['categoria']
-        gastos_por_categoria[cat] += gasto['precio']
+        cat = gasto.categoria
+        gastos_por_categoria[cat] += gasto.precio
     
     # Top 5 gastos más altos
-    top_gastos = sorted(gastos_filtrados, key=lambda x: x['precio'], reverse=True)[:5]
+    top_gastos = sorted(gastos_filtrados, key=lambda x: x.precio, reverse=True)[:5]
+    
+    # Sin filtros, las series mensuales salen de los cierres mensuales (y del mes abierto en vivo)
+    # Con filtros se recorren los gastos filtrados
+    sin_filtros = not (categoria_filtro or placa_filtro or desde or hasta)
+    agregados_mes = cierres.agregados_mensuales(config['sheet_gastos']) if sin_filtros else {}
+    gastos_en_vivo = [] if sin_filtros else gastos_filtrados
     
     # Gastos por mes
-    gastos_por_mes = defaultdict(float)
-    for gasto in gastos_filtrados:
+    gastos_por_mes = defaultdict(int)
+    for mes_key, agregado in agregados_mes.items():
+        gastos_por_mes[mes_key] = agregado['total']
+    for gasto in gastos_en_vivo:
         try:
-            fecha = gasto['fecha']
+            fecha = gasto.fecha
             mes_key = f"{fecha.year}-{fecha.month:02d}"
-            gastos_por_mes[mes_key] += gasto['precio']
+            gastos_por_mes[mes_key] += gasto.precio
         except:
             continue
     
     # Preparar datos para gráficos
     meses_ordenados = sorted(gastos_por_mes.keys())
-    meses_labels = [f"{calendar.month_abbr[int(m.split('-')[1])]} {m.split('-')[0]}" for m in meses_ordenados]
+    meses_labels = [f"{ABREVIATURAS_MES[int(m.split('-')[1]) - 1]} {m.split('-')[0]}" for m in meses_ordenados]
     gastos_mensuales = [gastos_por_mes[m] for m in meses_ordenados]
     
-    # Gastos por placa
-    gastos_por_placa = defaultdict(float)
-    for gasto in gastos_filtrados:
-        if gasto['placa']:
-            gastos_por_placa[gasto['placa']] += gasto['precio']
-    
-    # Top 5 placas con más gastos
-    top_placas = sorted(gastos_por_placa.items(), key=lambda x: x[1], reverse=True)[:5]
-    
-    # Gastos por conductor
-    gastos_por_conductor = defaultdict(float)
-    for gasto in gastos_filtrados:
-        if gasto['conductor']:
-            gastos_por_conductor[gasto['conductor']] += gasto['precio']
-    
-    # Top 5 conductores con más gastos
-    top_conductores = sorted(gastos_por_conductor.items(), key=lambda x: x[1], reverse=True)[:5]
+    if sin_filtros:
+        # Sin filtros, los top de placas y conductores salen de los acumulados del libro de flota
+        top_placas = [(a.nombre, a.total, a.promedio) for a in flota.ranking(config['sheet_gastos'], 'placa', 5)]
+        top_conductores = [(a.nombre, a.total) for a in flota.ranking(config['sheet_gastos'], 'conductor', 5)]
+    else:
+        # Gastos por placa (total y cantidad, para el promedio por gasto)
+        gastos_por_placa = defaultdict(int)
+        cantidad_por_placa = defaultdict(int)
+        for gasto in gastos_filtrados:
+            if gasto.placa:
+                gastos_por_placa[gasto.placa] += gasto.precio
+                cantidad_por_placa[gasto.placa] += 1
+        
+        # Top 5 placas con más gastos
+        top_placas = [
+            (placa, total, round(total / cantidad_por_placa[placa]))
+            for placa, total in sorted(gastos_por_placa.items(), key=lambda x: x[1], reverse=True)[:5]
+        ]
+        
+        # Gastos por conductor
+        gastos_por_conductor = defaultdict(int)
+        for gasto in gastos_filtrados:
+            if gasto.conductor:
+                gastos_por_conductor[gasto.conductor] += gasto.precio
+        
+        # Top 5 conductores con más gastos
+        top_conductores = sorted(gastos_por_conductor.items(), key=lambda x: x[1], reverse=True)[:5]
     
     # Gastos por categoría y mes (para gráfico de barras apiladas)
-    gastos_por_categoria_mes = defaultdict(lambda: defaultdict(float))
+    gastos_por_categoria_mes = defaultdict(lambda: defaultdict(int))
     categorias = set()
     
-    for gasto in gastos_filtrados:
+    for mes_key, agregado in agregados_mes.items():
+        for categoria, total in agregado['por_categoria'].items():
+            categorias.add(categoria)
+            gastos_por_categoria_mes[mes_key][categoria] += total
+    
+    for gasto in gastos_en_vivo:
         try:
-            fecha = gasto['fecha']
+            fecha = gasto.fecha
             mes_key = f"{fecha.year}-{fecha.month:02d}"
-            categoria = gasto['categoria']
+            categoria = gasto.categoria
             categorias.add(categoria)
-            gastos_por_categoria_mes[mes_key][categoria] += gasto['precio']
+            gastos_por_categoria_mes[mes_key][categoria] += gasto.precio
         except:
             continue
     
@@ -918,7 +889,7 @@ def dashboard_gastos(request):
         })
     
     # Calcular totales y promedios
-    total_gastos = sum([g['precio'] for g in gastos_filtrados])
+    total_gastos = sum([g.precio for g in gastos_filtrados])
     
     # Promedio mensual
     num_meses = len(meses_ordenados) or 1
@@ -928,7 +899,7 @@ def dashboard_gastos(request):
     categoria_mayor_gasto = max(gastos_por_categoria.items(), key=lambda x: x[1], default=('N/A', 0))
     
     # Lista de placas únicas para el filtro
-    placas_unicas = sorted(set([g['placa'] for g in gastos_list if g['placa']]))
+    placas_unicas = sorted(set([g.placa for g in gastos_list if g.placa]))
     
     context = {
         'gastos_por_categoria': gastos_por_categoria,
@@ -953,6 +924,132 @@ def dashboard_gastos(request):
     
     return render(request, 'dashboard_gastos.html', context)
 
+def _detalle_flota(sheet_name, agrupacion, valor):
+    """Detalle de una placa o un conductor con etiquetas de mes para los gráficos"""
+    acumulado = flota.acumulado(sheet_name, agrupacion, valor)
+    if acumulado is None:
+        return None
+    detalle = acumulado.como_dict()
+    detalle['meses'] = [
+        f"{ABREVIATURAS_MES[int(m.split('-')[1]) - 1]} {m.split('-')[0]}" for m in detalle['por_mes']
+    ]
+    return detalle
+
+def flota_view(request):
+    """Libro de costos por vehículo y por conductor, con el detalle del seleccionado"""
+    config = ENTITY_CONFIG['gastos']
+    placa = request.GET.get('placa', '').strip()
+    conductor = request.GET.get('conductor', '').strip()
+
+    detalle = None
+    if placa:
+        detalle = _detalle_flota(config['sheet_gastos'], 'placa', placa)
+    elif conductor:
+        detalle = _detalle_flota(config['sheet_gastos'], 'conductor', conductor)
+    if (placa or conductor) and detalle is None:
+        messages.warning(request, f"No hay gastos registrados para {placa or conductor}")
+
+    return render(request, 'flota.html', {
+        'placas': flota.ranking(config['sheet_gastos'], 'placa'),
+        'conductores': flota.ranking(config['sheet_gastos'], 'conductor'),
+        'placa': placa,
+        'conductor': conductor,
+        'detalle': detalle,
+        'meses_detalle': json.dumps(detalle['meses']) if detalle else '[]',
+        'valores_detalle': json.dumps(list(detalle['por_mes'].values())) if detalle else '[]',
+    })
+
+def api_flota(request):
+    """Totales por placa y por conductor en JSON; con `placa` o `conductor` devuelve solo ese detalle"""
+    config = ENTITY_CONFIG['gastos']
+    for agrupacion in ('placa', 'conductor'):
+        valor = request.GET.get(agrupacion, '').strip()
+        if valor:
+            acumulado = flota.acumulado(config['sheet_gastos'], agrupacion, valor)
+            if acumulado is None:
+                return JsonResponse({'error': f'No hay gastos registrados para {valor}'}, status=404)
+            return JsonResponse(acumulado.como_dict())
+
+    return JsonResponse({
+        'placas': [a.como_dict() for a in flota.ranking(config['sheet_gastos'], 'placa')],
+        'conductores': [a.como_dict() for a in flota.ranking(config['sheet_gastos'], 'conductor')],
+    })
+
+def cierres_view(request):
+    """Lista los cierres mensuales y permite cerrar los meses pendientes o volver a cerrar uno"""
+    if request.method == 'POST':
+        accion = request.POST.get('accion')
+        try:
+            if accion == 'cerrar_pendientes':
+                cerrados = cierres.cerrar_pendientes()
+                if cerrados:
+                    messages.success(request, f"Meses cerrados: {', '.join(cerrados)}")
+                else:
+                    messages.info(request, 'No hay meses pendientes de cierre.')
+            elif accion == 'recerrar':
+                cierre = cierres.cerrar_mes(request.POST.get('mes', ''))
+                messages.success(request, f"Mes {cierre['mes']} cerrado de nuevo (versión {cierre['version']}).")
+            elif accion == 'revisar':
+                recerrados = cierres.recerrar_alterados()
+                if recerrados:
+                    messages.warning(request, f"Meses alterados que se volvieron a cerrar: {', '.join(recerrados)}")
+                else:
+                    messages.info(request, 'Todos los cierres están al día.')
+        except ValueError as e:
+            messages.error(request, str(e))
+        return redirect('mi_app:cierres')
+
+    alterados = cierres.meses_alterados()
+    meses = []
+    for mes, cierre in sorted(cierres.cierres().items(), reverse=True):
+        hojas = cierre['hojas']
+        meses.append({
+            'mes': mes,
+            'version': cierre['version'],
+            'fecha': datetime.fromisoformat(cierre['fecha']),
+            'origen': cierre['origen'],
+            'alteradas': cierre.get('alteradas', []),
+            'pendiente_revision': alterados.get(mes, []),
+            'facturas_proveedores': hojas['Proveedores']['agregado']['facturas'],
+            'abonos_proveedores': hojas['Proveedores']['agregado']['abonos'],
+            'facturas_clientes': hojas['ProveedoresCliente']['agregado']['facturas'],
+            'abonos_clientes': hojas['ProveedoresCliente']['agregado']['abonos'],
+            'gastos': hojas['Gastos']['agregado']['total'],
+        })
+
+    return render(request, 'cierres.html', {
+        'meses': meses,
+        'pendientes': cierres.meses_pendientes(),
+    })
+
+def descargar_libro(request):
+    """Descarga el libro completo en un solo archivo, aunque las entidades se guarden por separado"""
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    filename = f"libro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    libros.libro_combinado().save(response)
+    return response
+
+def reintentar_pendientes(request):
+    """Intenta escribir ya los cambios pendientes, sin esperar al próximo reintento"""
+    if request.method == 'POST':
+        if pendientes.aplicar_todos():
+            messages.success(request, "Los cambios pendientes se guardaron en el Excel.")
+        else:
+            messages.warning(request, "El Excel sigue bloqueado; los cambios se guardarán en cuanto se libere.")
+    # Se vuelve a la página de la que vino solo si es de este mismo sitio
+    destino = request.META.get('HTTP_REFERER')
+    if not destino or not url_has_allowed_host_and_scheme(
+        destino, allowed_hosts={request.get_host()}, require_https=request.is_secure(),
+    ):
+        destino = reverse('mi_app:index')
+    return redirect(destino)
+
+def listo(request):
+    """Avance del calentamiento al arrancar; responde 503 mientras no termina, para usarla como sonda"""
+    estado = calentamiento.estado()
+    return JsonResponse(estado, status=200 if estado['listo'] else 503)
+
 # Vistas genéricas
 def movimiento_view(request, entity_type):
     """Vista genérica para movimientos de proveedores o clientes"""
@@ -962,15 +1059,35 @@ def movimiento_view(request, entity_type):
     proveedor_filtrado = request.GET.get('proveedor', None)
     fecha_filtrada = request.GET.get('fecha', None)
     
-    movimientos = obtener_movimientos_filtrados(entity_type, proveedor_filtrado, fecha_filtrada,"Activa")
+    datos = indices.leer_hoja(config['sheet_movimientos'])
+    desde, hasta = indices.limites_fecha(fecha=fecha_filtrada)
     resumen = cargar_datos_excel(config['sheet_resumen'])
     resumen_filtrado = obtener_resumen_filtrado(entity_type, proveedor_filtrado)
     
-    movimientos.sort(key=lambda x: x['fecha'] if x['fecha'] else datetime.min.date(), reverse=True)
+    # Solo los activos, con paginación por cursor por fecha (más reciente primero). Con filtros
+    # la página sale de la réplica en SQL; sin filtros se recorre el índice ordenado en memoria
+    if proveedor_filtrado or desde or hasta:
+        consulta = consultas.movimientos(
+            config['sheet_movimientos'], proveedor=proveedor_filtrado, estado='Activa', desde=desde, hasta=hasta,
+        )
+        page_obj = consultas.pagina(
+            consulta, registros.Movimiento, despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+        )
+    else:
+        movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
 
-    paginator = Paginator(movimientos, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        def activa(posicion):
+            fila = datos[posicion]
+            return len(fila) >= 8 and bool(fila[7]) and indices.clave_normalizada(fila[7]) == 'activa'
+
+        indice = indices.indice_ordenado(
+            config['sheet_movimientos'], 'fecha',
+            lambda row: (indices.ordinal_fecha(row[1] if len(row) > 1 else None), indices.id_numerico(row[0] if row else None)),
+        )
+        page_obj = paginar_keyset(
+            indice, movimientos.__getitem__, por_pagina=10,
+            despues=request.GET.get('despues'), antes=request.GET.get('antes'), filtro=activa,
+        )
     
     return render(request, config['movimiento_form_template'], {
         'form': form,
@@ -979,8 +1096,8 @@ def movimiento_view(request, entity_type):
         'resumen_Filtrado': resumen_filtrado,
         'proveedor_filtrado': proveedor_filtrado,
         'fecha_filtrada': fecha_filtrada,
-        'paginator': paginator,
         'page_obj': page_obj,
+        'all_params': parametros_paginacion(request),
     })
 
 def resumen_view(request, entity_type):
@@ -1034,32 +1151,30 @@ def resumen_movimiento_view(entity_type, filtrar_proveedor):
     """Recalcula el resumen considerando solo facturas y abonos"""
     config = ENTITY_CONFIG[entity_type]
 
-    movimientos = [list(row) for row in cargar_datos_excel(config['sheet_movimientos'])]
+    filas = indices.leer_hoja(config['sheet_movimientos'])
+    movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
 
-    # Filtrar solo los movimientos 
-    movimientos = [mov for mov in movimientos if len(mov) >= 8]
-
-    resumen_dict = {}
+    # Las cadenas compactadas aportan los totales que se guardaron al compactarlas
+    resumen_dict = {
+        proveedor: {**totales, 'saldo': totales['facturas'] - totales['abonos']}
+        for proveedor, totales in archivo.totales_compactados(config['sheet_movimientos']).items()
+    }
 
-    for mov in movimientos:
-        _, fecha, proveedor, detalle, obs, total, id_factura, estado = mov
+    for fila, mov in zip(filas, movimientos):
+        # Solo los movimientos completos
+        if len(fila) < 8:
+            continue
+        proveedor, detalle, obs, total = mov.proveedor, mov.detalle, mov.obs, mov.total
 
         if proveedor not in resumen_dict:
-            resumen_dict[proveedor] = {
-                'facturas': Decimal('0'),
-                'abonos': Decimal('0'),
-                'saldo': Decimal('0')
-            }
+            resumen_dict[proveedor] = {'facturas': 0, 'abonos': 0, 'saldo': 0}
 
         if detalle.lower() == 'factura':
-            match = re.search(r":\s*([\d.,]+)", str(obs))
-            if match:
-                total_factura = Decimal(match.group(1).replace(",", "."))
-                resumen_dict[proveedor]['facturas'] += total_factura
-            else:
-                resumen_dict[proveedor]['facturas'] += Decimal(str(total))            
+            # Las facturas encadenadas incluyen el saldo anterior; se suma solo su monto propio
+            total_factura = dinero.monto_en_obs(obs)
+            resumen_dict[proveedor]['facturas'] += total if total_factura is None else total_factura
         elif detalle.lower() == 'abono':
-            resumen_dict[proveedor]['abonos'] += Decimal(str(total))
+            resumen_dict[proveedor]['abonos'] += total
 
         # Calcular saldo actual
         resumen_dict[proveedor]['saldo'] = resumen_dict[proveedor]['facturas'] - resumen_dict[proveedor]['abonos']
@@ -1069,9 +1184,9 @@ def resumen_movimiento_view(entity_type, filtrar_proveedor):
     for proveedor, datos in resumen_dict.items():
         resumen.append({
             'proveedor': proveedor,
-            'facturas': float(datos['facturas']),
-            'abonos': float(datos['abonos']),
-            'saldo': float(datos['saldo'])
+            'facturas': datos['facturas'],
+            'abonos': datos['abonos'],
+            'saldo': datos['saldo']
         })
 
     resumen.sort(key=lambda x: x['proveedor'])
@@ -1094,8 +1209,7 @@ def movimientos_list_view(request, entity_type):
     fecha_inicio = request.GET.get('fecha_inicio', '').strip()
     fecha_fin = request.GET.get('fecha_fin', '').strip()
     
-    movimientos = []
-    datos = cargar_datos_excel(config['sheet_movimientos'])
+    datos = indices.leer_hoja(config['sheet_movimientos'])
     resumen = cargar_datos_excel(config['sheet_resumen'])
     
     # Obtener lista única de proveedores para el filtro
@@ -1104,67 +1218,42 @@ def movimientos_list_view(request, entity_type):
         if len(row) > 1:  # Asegurarse de que hay al menos 2 columnas
             proveedores_unicos.add(row[1])
     
-    for mov_data in datos:
-        # Saltar filas que no tienen suficientes columnas
-        if len(mov_data) < 6:  # Mínimo necesario para los campos básicos
-            continue
-        
-        # Asegurar que tenemos al menos 8 columnas (rellenar con valores vacíos si es necesario)
-        while len(mov_data) < 8:
-            mov_data.append('')
-            
-        mov_id, fecha_raw, proveedor, detalle, obs, total, id_factura, estado = mov_data
-        
-        
-        # Filtrar por proveedor
-        if proveedor_filtrado and (not proveedor or str(proveedor).strip().lower() != proveedor_filtrado.lower()):
-            continue
-            
-        # Filtrar por estado
-        if estado_filtrado and (not estado or str(estado).strip().lower() != estado_filtrado.lower()):
-            continue
-            
-        # Filtrar por ID de factura
-        if id_factura_filtrado and (not id_factura or str(id_factura).strip().lower() != id_factura_filtrado.lower()):
-            continue
-
-        # Si hay fecha específica, ignorar rango
-        if fecha_filtrada:
-            if not fecha_raw or normalizar_fecha(fecha_raw) != normalizar_fecha(fecha_filtrada):
-                continue
-        else:
-            # Filtrar por rango de fechas
-            if fecha_inicio and (not fecha_raw or normalizar_fecha(fecha_raw) < normalizar_fecha(fecha_inicio)):
-                continue
-
-            if fecha_fin and (not fecha_raw or normalizar_fecha(fecha_raw) > normalizar_fecha(fecha_fin)):
-                continue
-        
-        # Si llegamos aquí, el movimiento pasa todos los filtros
-        movimientos.append({
-            'id': mov_id,
-            'fecha': fecha_raw.date() if fecha_raw else None,
-            'proveedor': proveedor,
-            'detalle': detalle,
-            'obs': obs,
-            'total': total,
-            'id_factura': id_factura,
-            'estado': estado
-        })
-    
-    # Ordenar movimientos por fecha (más reciente primero)
-    #movimientos.sort(key=lambda x: x['fecha'] if x['fecha'] else datetime.min.date(), reverse=True)
-    movimientos.sort(key=lambda x: (x.get('id_factura'), x.get('fecha')), reverse=True)
+    # Si hay fecha específica, se ignora el rango
+    desde, hasta = indices.limites_fecha(fecha_filtrada, fecha_inicio, fecha_fin)
     
-    # Paginación
-    paginator = Paginator(movimientos, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Preparar parámetros para mantener en la paginación
-    all_params = request.GET.copy()
-    if 'page' in all_params:
-        del all_params['page']
+    # Paginación por cursor por (IdFactura, fecha), de mayor a menor. Con filtros la página sale
+    # de la réplica en SQL; sin filtros se recorre el índice ordenado en memoria
+    if proveedor_filtrado or estado_filtrado or id_factura_filtrado or desde or hasta:
+        consulta = consultas.movimientos(
+            config['sheet_movimientos'], proveedor=proveedor_filtrado, estado=estado_filtrado,
+            id_factura=id_factura_filtrado, desde=desde, hasta=hasta,
+        )
+        page_obj = consultas.pagina(
+            consulta, registros.Movimiento, factura=True,
+            despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+        )
+    else:
+        movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
+        indice = indices.indice_ordenado(
+            config['sheet_movimientos'], 'factura_fecha',
+            lambda row: (
+                str(row[6] or '') if len(row) > 6 else '',
+                indices.ordinal_fecha(row[1] if len(row) > 1 else None),
+                indices.id_numerico(row[0] if row else None),
+            ),
+        )
+        page_obj = paginar_keyset(
+            indice, movimientos.__getitem__, por_pagina=10,
+            despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+            filtro=lambda posicion: len(datos[posicion]) >= 6,
+        )
+
+    # Las filas de una cadena compactada se leen del archivo solo cuando se piden
+    archivadas = []
+    if request.GET.get('archivadas') and proveedor_filtrado and id_factura_filtrado:
+        archivadas = archivo.movimientos_de_cadena(
+            config['sheet_movimientos'], proveedor_filtrado, id_factura_filtrado
+        )
     
     return render(request, config['movimientos_template'], {
         'resumen': resumen,
@@ -1176,9 +1265,10 @@ def movimientos_list_view(request, entity_type):
         'fecha_filtrada': fecha_filtrada,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
-        'paginator': paginator,
         'page_obj': page_obj,
-        'all_params': all_params.urlencode()  # Para mantener todos los parámetros en los enlaces de paginación
+        'archivadas': archivadas,
+        'detalle_cadena': saldos.DETALLE_CADENA,
+        'all_params': parametros_paginacion(request)  # Para mantener todos los parámetros en los enlaces de paginación
     })
 
 def agregar_persona_view(request, entity_type):
@@ -1193,11 +1283,10 @@ def agregar_persona_view(request, entity_type):
             # Validar si ya existe en Excel
             resumen_data = cargar_datos_excel(config['sheet_resumen'])
             
-            existe = False
-            for row in resumen_data:
-                if len(row) > 1 and row[1] == nombre:
-                    existe = True
-                    break
+            existe = any(
+                resumen_data[p][1] == nombre
+                for p in indices.posiciones_por_valor(config['sheet_resumen'], 1, nombre)
+            )
             
             if existe:
                 messages.info(request, "La persona ya existe en el archivo Excel. ❌")
@@ -1256,7 +1345,8 @@ def dashboard_view(request, entity_type):
         if len(row) < 5:
             continue
             
-        id, proveedor, factura, abonos, saldo = row[0], row[1], row[2] or 0, row[3] or 0, row[4] or 0
+        id, proveedor = row[0], row[1]
+        factura, abonos, saldo = dinero.a_pesos(row[2]), dinero.a_pesos(row[3]), dinero.a_pesos(row[4])
         
         # Filtrar por proveedor si se especificó
         if proveedor_filtrado and proveedor != proveedor_filtrado:
@@ -1275,8 +1365,28 @@ def dashboard_view(request, entity_type):
     if total_facturado > 0:
         porcentaje_abono = (total_abonado / total_facturado) * 100
     
-    # Cargar datos de movimientos
-    movimientos_data = cargar_datos_excel(config['sheet_movimientos'])
+    # Cargar datos de movimientos (el rango de fechas se resuelve con el índice de fechas)
+    desde, hasta = indices.limites_fecha(fecha_inicio=fecha_inicio_str, fecha_fin=fecha_fin_str)
+    if id_factura_filtrado:
+        # Con filtro de factura los totales por mes se agrupan en SQL sobre la réplica; los años archivados se suman abajo
+        consulta = consultas.de_factura(
+            config['sheet_movimientos'], id_factura_filtrado, proveedor=proveedor_filtrado, desde=desde, hasta=hasta,
+        )
+        for (prov, detalle, mes_ano), total in consultas.totales_por_mes(consulta, 'total', 'proveedor', 'detalle').items():
+            por_mes = facturas_por_mes if detalle == 'Factura' else abonos_por_mes
+            por_mes.setdefault(prov, {})[mes_ano] = total
+        movimientos_data = archivo.filas_archivadas(config['sheet_movimientos'], desde, hasta)
+    else:
+        # Sin filtro de factura los totales por mes salen de los cierres mensuales (y del mes abierto en vivo)
+        movimientos_data = []
+        for mes_ano, agregado in cierres.agregados_mensuales(config['sheet_movimientos'], desde, hasta).items():
+            for prov, totales in agregado['por_proveedor'].items():
+                if proveedor_filtrado and prov != proveedor_filtrado:
+                    continue
+                if totales['facturas']:
+                    facturas_por_mes.setdefault(prov, {})[mes_ano] = totales['facturas']
+                if totales['abonos']:
+                    abonos_por_mes.setdefault(prov, {})[mes_ano] = totales['abonos']
     for row in movimientos_data:
         if len(row) < 8:  # Asegurarse de que hay al menos 8 columnas (incluyendo id_factura)
             continue
@@ -1295,12 +1405,6 @@ def dashboard_view(request, entity_type):
             fecha = normalizar_fecha(fecha_str)
         except Exception:
             continue  # si no se puede convertir, se salta
-
-        # Filtrar por rango de fechas si se especificó
-        if fecha_inicio_str and fecha < normalizar_fecha(fecha_inicio_str):
-            continue
-        if fecha_fin_str and fecha > normalizar_fecha(fecha_fin_str):
-            continue
         
         # Convertir fecha a mes-año
         mes_ano = fecha.strftime('%Y-%m')
@@ -1308,12 +1412,12 @@ def dashboard_view(request, entity_type):
         # Facturas (detalle == 'Factura')
         if detalle == 'Factura':
             facturas_por_mes.setdefault(prov, {})
-            facturas_por_mes[prov][mes_ano] = facturas_por_mes[prov].get(mes_ano, 0) + (total or 0)
+            facturas_por_mes[prov][mes_ano] = facturas_por_mes[prov].get(mes_ano, 0) + dinero.a_pesos(total)
         
         # Abonos (detalle == 'Abono')
         if detalle == 'Abono':
             abonos_por_mes.setdefault(prov, {})
-            abonos_por_mes[prov][mes_ano] = abonos_por_mes[prov].get(mes_ano, 0) + (total or 0)
+            abonos_por_mes[prov][mes_ano] = abonos_por_mes[prov].get(mes_ano, 0) + dinero.a_pesos(total)
     
     # Meses únicos combinando facturas y abonos
     meses = set()
@@ -1387,7 +1491,10 @@ def guardar_movimiento_view(request, entity_type):
             movimientos_data = cargar_datos_excel(config['sheet_movimientos'])
             
             if detalle.lower() == 'factura':
-                filtra_data = [mov for mov in movimientos_data if len(mov) >= 8 and mov[2] == proveedor and mov[7].lower() == 'activa']
+                filtra_data = [
+                    movimientos_data[p] for p in posiciones_proveedor(config['sheet_movimientos'], proveedor)
+                    if len(movimientos_data[p]) >= 8 and movimientos_data[p][7].lower() == 'activa'
+                ]
                 saldo_anterior = 0
 
                 if filtra_data:
@@ -1402,11 +1509,11 @@ def guardar_movimiento_view(request, entity_type):
                     movimientos_data = actualizar_estado_facturas(proveedor, id_anterior, config['sheet_movimientos'])
 
                 if saldo_anterior != 0:
-                    total_mensaje = f"{obs} - la factura se realizo por : {int(total)} "
-                    total +=  Decimal(str(saldo_anterior))
-                    obs = f"{total_mensaje} + saldo anterior {int(saldo_anterior)} = total {int(total)}"
+                    total_mensaje = f"{obs} - la factura se realizo por : {total} "
+                    total += saldo_anterior
+                    obs = f"{total_mensaje} + saldo anterior {saldo_anterior} = total {total}"
                     if total < 0:
-                        messages.error(request, f"No se puede guardar la factura, debe ser mayor al saldo: {int(saldo_anterior)}.")
+                        messages.error(request, f"No se puede guardar la factura, debe ser mayor al saldo: {saldo_anterior}.")
                         return redirect(config['url_index'])
 
                 id_factura = generar_id_factura(proveedor, config['sheet_movimientos'])
@@ -1419,7 +1526,7 @@ def guardar_movimiento_view(request, entity_type):
                     proveedor,
                     detalle,
                     obs,
-                    float(total),
+                    total,
                     id_factura,
                     'Activa'  # La factura sigue activa
                 ]
@@ -1429,8 +1536,9 @@ def guardar_movimiento_view(request, entity_type):
             elif detalle.lower() == 'abono':
                 # Buscar factura activa del proveedor
                 id_factura_activa = None
-                for row in movimientos_data:
-                    if len(row) >= 8 and row[2] == proveedor and row[7] == 'Activa' and row[3].lower() == 'factura':
+                for posicion in posiciones_proveedor(config['sheet_movimientos'], proveedor):
+                    row = movimientos_data[posicion]
+                    if len(row) >= 8 and row[7] == 'Activa' and row[3].lower() == 'factura':
                         id_factura_activa = row[6]
                         break
 
@@ -1446,7 +1554,7 @@ def guardar_movimiento_view(request, entity_type):
                     proveedor,
                     detalle,
                     obs,
-                    float(total),
+                    total,
                     id_factura_activa,
                     'Activa'  # La factura sigue activa
                 ]
@@ -1457,6 +1565,7 @@ def guardar_movimiento_view(request, entity_type):
             if guardar_en_excel(config['sheet_movimientos'], movimientos_data, encabezados, modo='overwrite'):
                 recalcular_resumen(entity_type)
                 messages.success(request, f'Movimiento de {detalle} para {proveedor} guardado correctamente.')
+                avisar_mes_cerrado(request, fecha)
                 return redirect(config['url_index'])
             else:
                 messages.error(request, 'Error al guardar el movimiento. Inténtelo de nuevo.')
@@ -1473,25 +1582,22 @@ def editar_movimiento_view(request, entity_type, index):
     
     # Buscar el movimiento en Excel
     movimientos_data = cargar_datos_excel(config['sheet_movimientos'])
+    posicion = indices.posicion_por_id(config['sheet_movimientos'], index)
     mov = None
     
-    for row in movimientos_data:
-        if row and len(row) > 0 and row[0] == index:
-            mov = {
-                'id': row[0],
-                'fecha': row[1],
-                'proveedor': row[2],
-                'detalle': row[3],
-                'obs': row[4],
-                'total': row[5],
-                'idfactura': row[6],
-                'estado': row[7]
-            }
-            break
+    if posicion is not None:
+        mov = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)[posicion]
     
     if not mov:
         messages.error(request, 'Movimiento no encontrado.')
         raise Http404("Movimiento no encontrado")
+
+    # El resumen de una cadena compactada no se edita: se muestran sus movimientos archivados
+    if mov.detalle == saldos.DETALLE_CADENA:
+        messages.error(request, 'La cadena está compactada y no se puede editar.')
+        url_lista = 'mi_app:proveedores_movimientos' if entity_type == 'proveedor' else 'mi_app:clientes_movimientos'
+        parametros = urlencode({'proveedor': mov.proveedor, 'id_factura': mov.id_factura, 'archivadas': 1})
+        return redirect(f"{reverse(url_lista)}?{parametros}")
     
     if request.method == 'POST':
         form = config['form'](request.POST)
@@ -1501,55 +1607,53 @@ def editar_movimiento_view(request, entity_type, index):
             
             obs = ''
             # Actualizar el movimiento en la lista
-            for i, row in enumerate(movimientos_data):
-                if row and len(row) > 0 and row[0] == index:
-                    if data['detalle'].lower() == 'factura':
-                        proveedor = data['proveedor']
-
-                        # Buscar facturas anteriores del mismo proveedor
-                        facturas_previas = [
-                            r for r in movimientos_data[:i]
-                            if r[2] == proveedor and str(r[3]).lower() == 'factura'
-                        ]
-
-                        es_primera_factura = len(facturas_previas) == 0
-
-                        if not es_primera_factura:
-                            match = re.search(r"saldo anterior\s+(-?\d+)", row[4], re.IGNORECASE)
-                            if match:
-                                saldo_anterior = int(match.group(1))
-                            if saldo_anterior != 0:
-                                total = int(data['total'])
-                                total_mensaje = f"{data['obs']} - la factura se realizo por : {int(data['total'])} "
-                                total +=  Decimal(str(saldo_anterior))
-                                obs = f"{total_mensaje} + saldo anterior {int(saldo_anterior)} = total {int(total)}"
-                        else:
-                            total = int(data['total'])
-                            obs = data['obs']
-
-                        movimientos_data[i] = [
-                            index,
-                            normalizar_fecha(data['fecha']),
-                            data['proveedor'],
-                            data['detalle'],
-                            obs,
-                            total,
-                            mov['idfactura'],  # Preserve the original 'IdFactura'
-                            mov['estado'] 
-                        ]
-                        break
-                    else:
-                        movimientos_data[i] = [
-                            index,
-                            normalizar_fecha(data['fecha']),
-                            data['proveedor'],
-                            data['detalle'],
-                            data['obs'],
-                            float(data['total']),
-                            mov['idfactura'],  # Preserve the original 'IdFactura'
-                            mov['estado'] 
-                        ]
-                        break
+            i = posicion
+            row = movimientos_data[i]
+            if data['detalle'].lower() == 'factura':
+                proveedor = data['proveedor']
+
+                # Buscar facturas anteriores del mismo proveedor
+                facturas_previas = [
+                    p for p in posiciones_proveedor(config['sheet_movimientos'], proveedor)
+                    if p < i and str(movimientos_data[p][3]).lower() in ('factura', saldos.DETALLE_CADENA.lower())
+                ]
+
+                es_primera_factura = len(facturas_previas) == 0
+
+                if not es_primera_factura:
+                    match = re.search(r"saldo anterior\s+(-?\d+)", row[4], re.IGNORECASE)
+                    if match:
+                        saldo_anterior = int(match.group(1))
+                    if saldo_anterior != 0:
+                        total = dinero.a_pesos(data['total'])
+                        total_mensaje = f"{data['obs']} - la factura se realizo por : {total} "
+                        total += saldo_anterior
+                        obs = f"{total_mensaje} + saldo anterior {saldo_anterior} = total {total}"
+                else:
+                    total = dinero.a_pesos(data['total'])
+                    obs = data['obs']
+
+                movimientos_data[i] = [
+                    index,
+                    normalizar_fecha(data['fecha']),
+                    data['proveedor'],
+                    data['detalle'],
+                    obs,
+                    total,
+                    mov.idfactura,  # Preserve the original 'IdFactura'
+                    mov.estado 
+                ]
+            else:
+                movimientos_data[i] = [
+                    index,
+                    normalizar_fecha(data['fecha']),
+                    data['proveedor'],
+                    data['detalle'],
+                    data['obs'],
+                    dinero.a_pesos(data['total']),
+                    mov.idfactura,  # Preserve the original 'IdFactura'
+                    mov.estado 
+                ]
             
             # Guardar en Excel
             encabezados = ['Id', 'Fecha', 'Proveedor', 'Detalle', 'Obs', 'Total', 'IdFactura', 'Estado']
@@ -1561,6 +1665,7 @@ def editar_movimiento_view(request, entity_type, index):
                 recalcular_resumen(entity_type)
                 # Mensaje de éxito
                 messages.success(request, f'Se movimiento Modifico el registro correctamente.')
+                avisar_mes_cerrado(request, mov.fecha, movimientos_data[i][1])
 
                 return redirect(config['url_index'])
             else:
@@ -1570,23 +1675,23 @@ def editar_movimiento_view(request, entity_type, index):
     else:
         obs = ''
         # Convertir fecha a formato string para el formulario
-        if isinstance(mov['fecha'], datetime):
-            fecha_str = mov['fecha'].strftime('%Y-%m-%d')
+        if isinstance(mov.fecha, date):
+            fecha_str = mov.fecha.strftime('%Y-%m-%d')
         try:
-            match = re.search(r"^(.*?)\s*-", mov['obs'])
+            match = re.search(r"^(.*?)\s*-", mov.obs)
             if match:
                 obs = match.group(1).strip()
             else:
-                obs = mov['obs']
+                obs = mov.obs
         except:
-            obs = mov['obs']
+            obs = mov.obs
             
         initial_data = {
             'fecha': fecha_str,
-            'proveedor': mov['proveedor'],
-            'detalle': mov['detalle'],
+            'proveedor': mov.proveedor,
+            'detalle': mov.detalle,
             'obs': obs,
-            'total': mov['total'],
+            'total': mov.total,
         }
         form = config['form'](initial=initial_data)
 
@@ -1594,8 +1699,74 @@ def editar_movimiento_view(request, entity_type, index):
     
     return render(request, config['editar_template'], {'form': form, 'id': index})
 
+def generar_excel_antiguedad(entity_type, reporte):
+    """Genera el Excel de antigüedad de saldos con una fila por proveedor o cliente y totales"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Antigüedad de saldos"
+
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    total_font = Font(bold=True, size=11)
+    total_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+
+    encabezados = ['Proveedor/Cliente', 'Facturas'] + [f"{t} días" for t in reporte['tramos']] + ['Saldo a favor', 'Saldo']
+
+    titulo = f"Antigüedad de saldos - {entity_type.capitalize()} - Corte {reporte['corte'].strftime('%d/%m/%Y')}"
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(encabezados))
+    ws.cell(row=1, column=1, value=titulo).font = Font(bold=True, size=14)
+
+    for col_num, encabezado in enumerate(encabezados, 1):
+        celda = ws.cell(row=3, column=col_num, value=encabezado)
+        celda.font = header_font
+        celda.fill = header_fill
+        celda.alignment = Alignment(horizontal='center')
+        celda.border = border
+
+    fila = 4
+    for item in reporte['filas'] + [None]:
+        if item is None:
+            totales = reporte['totales']
+            valores = ['TOTAL', sum(f['facturas'] for f in reporte['filas'])] + totales['tramos'] + [totales['a_favor'], totales['saldo']]
+        else:
+            valores = [item['proveedor'], item['facturas']] + item['tramos'] + [item['a_favor'], item['saldo']]
+        for col_num, valor in enumerate(valores, 1):
+            celda = ws.cell(row=fila, column=col_num, value=valor)
+            celda.border = border
+            if col_num > 2:
+                celda.number_format = '"$"#,##0'
+            if item is None:
+                celda.font = total_font
+                celda.fill = total_fill
+        fila += 1
+
+    for column, width in enumerate([25, 10] + [15] * (len(encabezados) - 2), 1):
+        ws.column_dimensions[get_column_letter(column)].width = width
+
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    filename = f"antiguedad_{entity_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    wb.save(response)
+    return response
+
+def antiguedad_view(request, entity_type):
+    """Antigüedad de saldos pendientes por proveedor o cliente (0-30, 31-60, 61-90 y 90+ días)"""
+    config = ENTITY_CONFIG[entity_type]
+    reporte = saldos.reporte_antiguedad(config['sheet_movimientos'])
+    return render(request, 'antiguedad.html', {
+        'titulo': 'Proveedores' if entity_type == 'proveedor' else 'Clientes',
+        'reporte': reporte,
+        'url_descarga': reverse(f"mi_app:{'proveedores' if entity_type == 'proveedor' else 'clientes'}_descargar_excel"),
+        'url_estado_cuenta': reverse(f"mi_app:{'proveedores' if entity_type == 'proveedor' else 'clientes'}_estado_cuenta"),
+    })
+
 def descargar_excel_entidad(request, entity_type):
     """Vista para descargar un archivo Excel con los movimientos de una entidad específica con filtros completos"""
+    if request.GET.get('reporte') == 'antiguedad':
+        reporte = saldos.reporte_antiguedad(ENTITY_CONFIG[entity_type]['sheet_movimientos'])
+        return generar_excel_antiguedad(entity_type, reporte)
+
     try:
         config = ENTITY_CONFIG[entity_type]
         
@@ -1607,106 +1778,57 @@ def descargar_excel_entidad(request, entity_type):
         fecha_inicio = request.GET.get('fecha_inicio', '').strip()
         fecha_fin = request.GET.get('fecha_fin', '').strip()
         
-        # Obtener todos los movimientos y luego filtrar
-        movimientos_data = cargar_datos_excel(config['sheet_movimientos'])
+        # Las fechas del filtro se interpretan una sola vez y se resuelven con el índice de fechas
+        try:
+            desde, hasta = indices.limites_fecha(fecha_especifica, fecha_inicio, fecha_fin)
+            if desde is None and hasta is None:
+                posiciones = range(len(indices.leer_hoja(config['sheet_movimientos'])))
+            else:
+                posiciones = indices.indice_fechas(config['sheet_movimientos']).posiciones_en_rango(desde, hasta)
+        except ValueError:
+            desde = hasta = None
+            posiciones = []  # Fecha de filtro inválida: ningún movimiento cumple
+        filas = indices.leer_hoja(config['sheet_movimientos'])
+        movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
+        # Asegurar que tenemos al menos 6 columnas
+        candidatos = [movimientos[posicion] for posicion in posiciones if len(filas[posicion]) >= 6]
+        # Si el rango llega a años archivados se suman sus movimientos
+        candidatos = archivo.registros_archivados(
+            config['sheet_movimientos'], registros.Movimiento, desde, hasta
+        ) + candidatos
         movimientos_filtrados = []
         
-        for row in movimientos_data:
-            # Asegurar que tenemos al menos 8 columnas
-            if len(row) < 6:
-                continue
-                
-            # Rellenar con valores vacíos si es necesario
-            while len(row) < 8:
-                row.append('')
-                
-            mov_id, fecha_raw, proveedor, detalle, obs, total, id_factura, estado = row
-            
-            mov = {
-                'id': mov_id,
-                'fecha': fecha_raw,
-                'proveedor': proveedor,
-                'detalle': detalle,
-                'obs': obs,
-                'total': total,
-                'id_factura': id_factura,
-                'estado': estado
-            }
-            
+        for mov in candidatos:
             # Aplicar filtros
             cumple_proveedor = True
             cumple_estado = True
             cumple_id_factura = True
-            cumple_fecha_especifica = True
-            cumple_fecha_inicio = True
-            cumple_fecha_fin = True
             
             # Filtro por proveedor
             if nombre_entidad:
-                prov = mov['proveedor'] or ''
+                prov = mov.proveedor or ''
                 cumple_proveedor = (str(prov).strip().lower() == nombre_entidad.strip().lower())
             
             # Filtro por estado
             if estado_filtrado:
-                est = mov['estado'] or ''
+                est = mov.estado or ''
                 cumple_estado = (str(est).strip().lower() == estado_filtrado.strip().lower())
             
             # Filtro por ID de factura
             if id_factura_filtrado:
-                id_fact = mov['id_factura'] or ''
+                id_fact = mov.id_factura or ''
                 cumple_id_factura = (str(id_fact).strip().lower() == id_factura_filtrado.strip().lower())
             
-            # Normalizar la fecha del movimiento
-            try:
-                fecha_mov = normalizar_fecha(mov['fecha'])
-            except Exception:
-                fecha_mov = None
-
-            # Inicializar banderas
-            cumple_fecha_especifica = True
-            cumple_fecha_inicio = True
-            cumple_fecha_fin = True
-
-            # Filtro por fecha específica
-            if fecha_especifica:
-                try:
-                    fecha_especifica_dt = normalizar_fecha(fecha_especifica)
-                    cumple_fecha_especifica = fecha_mov and (fecha_mov == fecha_especifica_dt)
-                except Exception:
-                    cumple_fecha_especifica = False
-            else:
-                # Filtro por rango de fechas
-                if fecha_inicio:
-                    try:
-                        fecha_inicio_dt = normalizar_fecha(fecha_inicio)
-                        cumple_fecha_inicio = fecha_mov and (fecha_mov >= fecha_inicio_dt)
-                    except Exception:
-                        cumple_fecha_inicio = False
-
-                if fecha_fin:
-                    try:
-                        fecha_fin_dt = normalizar_fecha(fecha_fin)
-                        cumple_fecha_fin = fecha_mov and (fecha_mov <= fecha_fin_dt)
-                    except Exception:
-                        cumple_fecha_fin = False
-
-            # Determinar qué filtros aplicar
-            if fecha_especifica:
-                # Solo usar filtro de fecha específica
-                if cumple_proveedor and cumple_estado and cumple_id_factura and cumple_fecha_especifica:
-                    movimientos_filtrados.append(mov)
-            else:
-                # Usar filtros de rango de fechas
-                if cumple_proveedor and cumple_estado and cumple_id_factura and cumple_fecha_inicio and cumple_fecha_fin:
-                    movimientos_filtrados.append(mov)
+            if cumple_proveedor and cumple_estado and cumple_id_factura:
+                movimientos_filtrados.append(mov)
 
         
-        movimientos_filtrados.sort(key=lambda x: (x['id_factura'] or '', x['fecha']))
+        movimientos_filtrados.sort(key=lambda x: (x.id_factura or '', x.fecha))
 
         # Agrupar movimientos por ID de factura para calcular saldos
         movimientos_por_factura = {}
         for mov in movimientos_filtrados:
-            id_factura = mov['id_factura'] or 'SIN_FACTURA'
+            id_factura = mov.id_factura or 'SIN_FACTURA'
             if id_factura not in movimientos_por_factura:
                 movimientos_por_factura[id_factura] = []
             movimientos_por_factura[id_factura].append(mov)
@@ -1716,10 +1838,10 @@ def descargar_excel_entidad(request, entity_type):
         for id_factura, movimientos in movimientos_por_factura.items():
             saldo = 0
             for mov in movimientos:
-                total_valor = float(mov['total'] or 0)
-                if 'factura' in str(mov['detalle']).lower():
+                total_valor = mov.total
+                if 'factura' in str(mov.detalle).lower():
                     saldo -= total_valor
-                elif 'abono' in str(mov['detalle']).lower():
+                elif 'abono' in str(mov.detalle).lower():
                     saldo += total_valor
             saldos_por_factura[id_factura] = saldo
         
@@ -1795,10 +1917,10 @@ def descargar_excel_entidad(request, entity_type):
         id_factura_anterior = None
         
         # Ordenar movimientos por ID de factura para agruparlos
-        movimientos_filtrados.sort(key=lambda x: x['id_factura'] or '')
+        movimientos_filtrados.sort(key=lambda x: x.id_factura or '')
         
         for mov in movimientos_filtrados:
-            id_factura_actual = mov['id_factura'] or 'SIN_FACTURA'
+            id_factura_actual = mov.id_factura or 'SIN_FACTURA'
             
             # Si cambió el ID de factura, agregar fila de saldo
             if id_factura_anterior and id_factura_anterior != id_factura_actual:
@@ -1821,11 +1943,11 @@ def descargar_excel_entidad(request, entity_type):
                 fila += 1
             
             # ID
-            ws.cell(row=fila, column=1, value=mov['id'])
+            ws.cell(row=fila, column=1, value=mov.id)
             
             # Fecha
-            fecha = mov['fecha']
-            if isinstance(fecha, datetime):
+            fecha = mov.fecha
+            if isinstance(fecha, date):
                 fecha = fecha.strftime('%d/%m/%Y')
             elif isinstance(fecha, str):
                 # Intentar convertir string a fecha y luego formatear
@@ -1845,34 +1967,33 @@ def descargar_excel_entidad(request, entity_type):
             ws.cell(row=fila, column=2, value=fecha)
             
             # Proveedor/Cliente
-            ws.cell(row=fila, column=3, value=mov['proveedor'])
+            ws.cell(row=fila, column=3, value=mov.proveedor)
             
             # Detalle
-            ws.cell(row=fila, column=4, value=mov['detalle'])
+            ws.cell(row=fila, column=4, value=mov.detalle)
             
             # Observaciones
-            ws.cell(row=fila, column=5, value=mov['obs'] or '')
+            ws.cell(row=fila, column=5, value=mov.obs or '')
             
             # Total - aplicar formato de moneda
-            total_valor = float(mov['total'] or 0)
+            total_valor = mov.total
             celda_total = ws.cell(row=fila, column=6, value=total_valor)
             celda_total.style = moneda_style
             
             # ID Factura
-            ws.cell(row=fila, column=7, value=mov['id_factura'] or '')
+            ws.cell(row=fila, column=7, value=mov.id_factura or '')
             
             # Estado
-            ws.cell(row=fila, column=8, value=mov['estado'] or '')
+            ws.cell(row=fila, column=8, value=mov.estado or '')
             
             # Sumar a totales - CORREGIDO: Usar siempre el mismo valor para consistencia
-            if 'factura' in str(mov['detalle']).lower():
-                obs = str(mov.get('obs', '')).lower()
-                match = re.search(r":\s*([\d.,]+)", obs)
-                if match:
-                    total_valor = float(match.group(1).replace(",", "."))
+            if 'factura' in str(mov.detalle).lower():
+                monto_propio = dinero.monto_en_obs(mov.obs)
+                if monto_propio is not None:
+                    total_valor = monto_propio
 
                 total_facturas += total_valor
-            elif 'abono' in str(mov['detalle']).lower():
+            elif 'abono' in str(mov.detalle).lower():
                 total_abonos += total_valor
             
             fila += 1
@@ -1966,17 +2087,17 @@ def editar_persona_view(request, entity_type, id=None):
         resumen_data = cargar_datos_excel(config['sheet_resumen'])
         
         # Buscar la persona por ID
-        for row in resumen_data:
-            if len(row) > 0 and row[0] == id:
-                persona = {
-                    'id': row[0],
-                    'proveedor': row[1],
-                    'facturas': row[2] if len(row) > 2 else 0,
-                    'abonos': row[3] if len(row) > 3 else 0,
-                    'saldo': row[4] if len(row) > 4 else 0
-                }
-                nombre_original = row[1]  # Guardar el nombre original para luego
-                break
+        posicion = indices.posicion_por_id(config['sheet_resumen'], id)
+        if posicion is not None:
+            row = resumen_data[posicion]
+            persona = {
+                'id': row[0],
+                'proveedor': row[1],
+                'facturas': row[2] if len(row) > 2 else 0,
+                'abonos': row[3] if len(row) > 3 else 0,
+                'saldo': row[4] if len(row) > 4 else 0
+            }
+            nombre_original = row[1]  # Guardar el nombre original para luego
                 
         if not persona:
             # Si no se encuentra en Excel, mostrar error 404
@@ -1996,8 +2117,9 @@ def editar_persona_view(request, entity_type, id=None):
             resumen_data = cargar_datos_excel(config['sheet_resumen'])
             existe_excel = False
             
-            for row in resumen_data:
-                if len(row) > 1 and row[1] == nombre_nuevo:  # Nombre está en la segunda columna
+            for p in indices.posiciones_por_valor(config['sheet_resumen'], 1, nombre_nuevo):
+                row = resumen_data[p]
+                if row[1] == nombre_nuevo:  # Nombre está en la segunda columna
                     if es_edicion and row[0] == id:
                         # Es la misma persona que estamos editando, no es un duplicado
                         continue
@@ -2013,16 +2135,13 @@ def editar_persona_view(request, entity_type, id=None):
                 
                 if es_edicion:
                     # Actualizar la fila existente en los datos de Excel
-                    for i, row in enumerate(resumen_data):
-                        if len(row) > 0 and row[0] == id:
-                            resumen_data[i] = [
-                                id,
-                                nombre_nuevo,
-                                persona['facturas'],
-                                persona['abonos'],
-                                persona['saldo']
-                            ]
-                            break
+                    resumen_data[posicion] = [
+                        id,
+                        nombre_nuevo,
+                        persona['facturas'],
+                        persona['abonos'],
+                        persona['saldo']
+                    ]
                 else:
                     # Crear nueva persona
                     nuevo_id = obtener_ultimo_id(config['sheet_resumen']) + 1
@@ -2040,9 +2159,8 @@ def editar_persona_view(request, entity_type, id=None):
                         # Convert to list of lists if necessary
                         movimientos_data = [list(row) for row in movimientos_data]
                         # Actualizar todos los registros con el nombre antiguo
-                        for i, row in enumerate(movimientos_data):
-                            if len(row) > 2 and row[2] == nombre_original:  # Nombre en columna 2
-                                movimientos_data[i][2] = nombre_nuevo  # Actualizar nombre
+                        for i in posiciones_proveedor(config['sheet_movimientos'], nombre_original):
+                            movimientos_data[i][2] = nombre_nuevo  # Actualizar nombre
                         
                         # Guardar los datos actualizados en Excel - HOJA DE MOVIMIENTOS
                         encabezados_mov = ['Id', 'Fecha', 'Proveedor', 'Detalle', 'Obs', 'Total', 'Id_Factura', 'Estado']
@@ -2100,9 +2218,9 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     for row in resumen_proveedores:
         if len(row) < 5:
             continue
-        factura = row[2] or 0
-        abonos = row[3] or 0
-        saldo = row[4] or 0
+        factura = dinero.a_pesos(row[2])
+        abonos = dinero.a_pesos(row[3])
+        saldo = dinero.a_pesos(row[4])
         
         total_facturado_proveedores += factura
         total_abonado_proveedores += abonos
@@ -2126,9 +2244,9 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     for row in resumen_clientes:
         if len(row) < 5:
             continue
-        factura = row[2] or 0
-        abonos = row[3] or 0
-        saldo = row[4] or 0
+        factura = dinero.a_pesos(row[2])
+        abonos = dinero.a_pesos(row[3])
+        saldo = dinero.a_pesos(row[4])
         
         total_facturado_clientes += factura
         total_abonado_clientes += abonos
@@ -2145,14 +2263,14 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     
     # Calcular estadísticas de gastos
     total_gastos = 0
-    gastos_por_categoria = defaultdict(float)
+    gastos_por_categoria = defaultdict(int)
     gastos_recientes = []
     
     for row in movimientos_gastos:
         if len(row) >= 6:
-            fecha, categoria, placa, conductor, precio = row[1], row[2], row[3], row[4], row[5] or 0
-            total_gastos += float(precio)
-            gastos_por_categoria[categoria] += float(precio)
+            fecha, categoria, placa, conductor, precio = row[1], row[2], row[3], row[4], dinero.a_pesos(row[5])
+            total_gastos += precio
+            gastos_por_categoria[categoria] += precio
             
             # Agregar a gastos recientes
             if fecha:
@@ -2169,7 +2287,7 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
 
     # Ordenar gastos por fecha (más recientes primero)
     gastos_recientes.sort(key=lambda x: x['fecha'], reverse=True)
-    top_gastos = sorted(gastos_recientes, key=lambda x: float(x['precio'] or 0), reverse=True)[:5]
+    top_gastos = sorted(gastos_recientes, key=lambda x: x['precio'], reverse=True)[:5]
     
     # Calcular porcentajes
     porcentaje_abono_proveedores = (total_abonado_proveedores / total_facturado_proveedores * 100) if total_facturado_proveedores > 0 else 0
@@ -2185,7 +2303,7 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     # Agregar movimientos de proveedores
     for row in movimientos_proveedores:
         if len(row) >= 6:
-            fecha, proveedor, detalle, observacion, total = row[1], row[2], row[3], row[4], row[5] or 0
+            fecha, proveedor, detalle, observacion, total = row[1], row[2], row[3], row[4], dinero.a_pesos(row[5])
             if fecha:
                 todos_movimientos.append({
                     'fecha': fecha,
@@ -2199,7 +2317,7 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     # Agregar movimientos de clientes (si existen)
     for row in movimientos_clientes:
         if len(row) >= 6:
-            fecha, cliente, detalle, observacion, total = row[1], row[2], row[3], row[4], row[5] or 0
+            fecha, cliente, detalle, observacion, total = row[1], row[2], row[3], row[4], dinero.a_pesos(row[5])
             if fecha:
                 todos_movimientos.append({
                     'fecha': fecha,
@@ -2218,27 +2336,28 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
             'tipo': 'Gasto',
             'detalle': 'Gasto',
             'observacion': f"{gasto['placa']} - {gasto['conductor']}" if gasto['placa'] and gasto['conductor'] else gasto['categoria'],
-            'total': -float(gasto['precio'] or 0)
+            'total': -gasto['precio']
         })
     
     # Ordenar movimientos por fecha (más recientes primero)
     todos_movimientos.sort(key=lambda x: x['fecha'], reverse=True)
     movimientos_recientes = todos_movimientos[:10]
       
+    # Tendencia de los últimos 180 días: los meses cerrados salen de los cierres mensuales
     seis_meses_atras = datetime.now() - timedelta(days=180)
-    facturacion_mensual = defaultdict(float)
-    abonos_mensual = defaultdict(float)
-    gastos_mensual = defaultdict(float)
-    
-    for mov in todos_movimientos:
-        if mov['fecha'] >= seis_meses_atras:
-            mes = mov['fecha'].strftime('%Y-%m')
-            if mov['detalle'] == 'Factura':
-                facturacion_mensual[mes] += mov['total']
-            elif mov['detalle'] == 'Abono':
-                abonos_mensual[mes] += abs(mov['total'])
-            elif mov['detalle'] == 'Gasto':
-                gastos_mensual[mes] += abs(mov['total'])
+    desde_tendencia = seis_meses_atras.date() + timedelta(days=1)
+    facturacion_mensual = defaultdict(int)
+    abonos_mensual = defaultdict(int)
+    gastos_mensual = defaultdict(int)
+    
+    for config in (config_proveedor, config_cliente):
+        for mes, agregado in cierres.agregados_mensuales(config['sheet_movimientos'], desde_tendencia).items():
+            if agregado['facturas']:
+                facturacion_mensual[mes] += agregado['facturas']
+            if agregado['abonos']:
+                abonos_mensual[mes] += agregado['abonos']
+    for mes, agregado in cierres.agregados_mensuales(config_gastos['sheet_gastos'], desde_tendencia).items():
+        gastos_mensual[mes] += agregado['total']
     
     # Ordenar meses
     meses_ordenados = sorted(facturacion_mensual.keys())
@@ -2289,6 +2408,147 @@ def index_view(request, entity_type_proveedor, entity_type_cliente, entity_type_
     
     return render(request, 'index.html', context)
 
+def _parametros_busqueda(request):
+    consulta = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo', '').strip()
+    try:
+        pagina = int(request.GET.get('pagina', 1))
+    except ValueError:
+        pagina = 1
+    return consulta, tipo, pagina
+
+def _buscar_con_enlaces(consulta, tipo, pagina, por_pagina=20):
+    """Ejecuta la búsqueda y agrega a cada resultado el enlace para editarlo"""
+    urls_editar = {
+        'Proveedor': 'mi_app:movimiento_proveedor_editar',
+        'Cliente': 'mi_app:movimiento_cliente_editar',
+        'Gasto': 'mi_app:gasto_editar',
+    }
+    resultado = busqueda.buscar(consulta, pagina=pagina, por_pagina=por_pagina, tipo=tipo or None)
+    for item in resultado['resultados']:
+        item['url'] = reverse(urls_editar[item['tipo']], args=[item['id']]) if isinstance(item['id'], int) else ''
+    return resultado
+
+def buscar_view(request):
+    """Búsqueda de texto en observaciones, proveedores, facturas, placas y conductores"""
+    consulta, tipo, pagina = _parametros_busqueda(request)
+    resultado = _buscar_con_enlaces(consulta, tipo, pagina) if consulta else None
+    
+    all_params = request.GET.copy()
+    all_params.pop('pagina', None)
+    
+    return render(request, 'buscar.html', {
+        'q': consulta,
+        'tipo': tipo,
+        'resultado': resultado,
+        'all_params': all_params.urlencode(),
+    })
+
+def api_buscar(request):
+    """Resultados de búsqueda en JSON, ordenados por relevancia y paginados"""
+    consulta, tipo, pagina = _parametros_busqueda(request)
+    try:
+        por_pagina = min(max(int(request.GET.get('por_pagina', 20)), 1), 100)
+    except ValueError:
+        por_pagina = 20
+    return JsonResponse(_buscar_con_enlaces(consulta, tipo, pagina, por_pagina))
+
+def _extracto_con_detalle(entity_type, proveedor, desde, hasta):
+    """Extracto del proveedor con los datos de cada movimiento para mostrarlo"""
+    config = ENTITY_CONFIG[entity_type]
+    extracto = saldos.extracto(config['sheet_movimientos'], proveedor, desde, hasta)
+    if extracto is None:
+        return None
+    movimientos = registros.registros_hoja(config['sheet_movimientos'], registros.Movimiento)
+    for linea in extracto['lineas']:
+        mov = movimientos[linea['posicion']]
+        linea.update({
+            'id': mov.id,
+            'fecha': mov.fecha,
+            'detalle': mov.detalle,
+            'obs': mov.obs,
+            'id_factura': mov.id_factura,
+            'estado': mov.estado,
+            'cargo': max(linea['efecto'], 0),
+            'abono': max(-linea['efecto'], 0),
+        })
+    return extracto
+
+def estado_cuenta_view(request, entity_type):
+    """Extracto de un proveedor o cliente entre dos fechas con saldo corrido"""
+    config = ENTITY_CONFIG[entity_type]
+    proveedor = request.GET.get('proveedor', '').strip()
+    fecha_inicio = request.GET.get('fecha_inicio', '')
+    fecha_fin = request.GET.get('fecha_fin', '')
+
+    try:
+        desde, hasta = indices.limites_fecha(fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+    except ValueError:
+        messages.error(request, "Las fechas deben tener el formato AAAA-MM-DD")
+        desde = hasta = None
+
+    extracto = _extracto_con_detalle(entity_type, proveedor, desde, hasta) if proveedor else None
+    if proveedor and extracto is None:
+        messages.warning(request, f"{proveedor} no tiene movimientos registrados")
+    elif extracto:
+        url_editar = f"mi_app:movimiento_{entity_type}_editar"
+        for linea in extracto['lineas']:
+            linea['url'] = reverse(url_editar, args=[linea['id']]) if isinstance(linea['id'], int) else ''
+
+    proveedores = sorted(cuenta.proveedor for cuenta in saldos.cuentas(config['sheet_movimientos']).values())
+
+    return render(request, 'estado_cuenta.html', {
+        'entity_type': entity_type,
+        'titulo': 'Proveedores' if entity_type == 'proveedor' else 'Clientes',
+        'proveedores': proveedores,
+        'proveedor_filtrado': proveedor,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'extracto': extracto,
+        'url_api': reverse(f"mi_app:api_{'proveedores' if entity_type == 'proveedor' else 'clientes'}_saldo"),
+        'all_params': request.GET.urlencode(),
+    })
+
+def api_saldo_view(request, entity_type):
+    """
+    Saldo de un proveedor o cliente en JSON.
+
+    Con `fecha` devuelve el saldo a esa fecha; con `fecha_inicio`/`fecha_fin`
+    devuelve el saldo inicial, el final, la variación y los movimientos del
+    rango con su saldo corrido.
+    """
+    config = ENTITY_CONFIG[entity_type]
+    proveedor = request.GET.get('proveedor', '').strip()
+    if not proveedor:
+        return JsonResponse({'error': 'Falta el parámetro proveedor'}, status=400)
+
+    try:
+        fecha = indices.limites_fecha(fecha=request.GET.get('fecha'))[0]
+        desde, hasta = indices.limites_fecha(
+            fecha_inicio=request.GET.get('fecha_inicio'), fecha_fin=request.GET.get('fecha_fin'),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}, status=400)
+
+    cuenta = saldos.cuenta(config['sheet_movimientos'], proveedor)
+    if cuenta is None:
+        return JsonResponse({'error': f'{proveedor} no tiene movimientos registrados'}, status=404)
+
+    if fecha:
+        # Solo el saldo a la fecha: no hace falta recorrer los movimientos
+        return JsonResponse({
+            'proveedor': cuenta.proveedor,
+            'fecha': fecha.isoformat(),
+            'saldo': cuenta.saldo_al(fecha),
+        })
+
+    extracto = _extracto_con_detalle(entity_type, proveedor, desde, hasta)
+    extracto['desde'] = desde.isoformat() if desde else None
+    extracto['hasta'] = hasta.isoformat() if hasta else None
+    for linea in extracto['lineas']:
+        linea['fecha'] = linea['fecha'].isoformat()
+    return JsonResponse(extracto)
+
 # Vistas específicas para proveedores y clientes
 def descargar_excel_proveedor(request):
     return descargar_excel_entidad(request, 'proveedor')
@@ -2346,4 +2606,23 @@ def editar_proveedor(request, id):
     return editar_persona_view(request, 'proveedor', id)
 
 def editar_cliente(request, id):
-    return editar_persona_view(request, 'cliente', id)
\ No newline at end of file
+    return editar_persona_view(request, 'cliente', id)
+
+def estado_cuenta_proveedor(request):
+    return estado_cuenta_view(request, 'proveedor')
+
+def estado_cuenta_cliente(request):
+    return estado_cuenta_view(request, 'cliente')
+
+def api_saldo_proveedor(request):
+    return api_saldo_view(request, 'proveedor')
+
+def api_saldo_cliente(request):
+    return api_saldo_view(request, 'cliente')
+
+
+def antiguedad_proveedor(request):
+    return antiguedad_view(request, 'proveedor')
+
+def antiguedad_cliente(request):
+    return antiguedad_view(request, 'cliente')
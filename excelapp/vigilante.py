@@ -0,0 +1,119 @@
+"""
+Vigilante de cambios externos al Excel.
+
+El libro se abre a menudo directamente en Excel o lo reemplaza la
+sincronización de OneDrive mientras la aplicación está en marcha. Un hilo en
+segundo plano vigila la carpeta de los archivos del libro (inotify en Linux;
+en otros sistemas, o si inotify no está disponible, revisa la firma de los
+archivos cada INTERVALO_VIGILANCIA segundos) y, cuando uno cambia, carga la
+versión nueva con indices.recargar. Mientras tanto las peticiones siguen
+usando la versión anterior, sin esperar a la lectura.
+
+Se arranca desde myproject/wsgi.py, así que solo corre en el servidor y no
+en los comandos de manage.py.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from . import indices, libros
+
+VIGILAR_EXCEL = getattr(settings, 'VIGILAR_EXCEL', True)
+INTERVALO = getattr(settings, 'INTERVALO_VIGILANCIA', 2)  # segundos entre revisiones sin inotify
+REVISION = 60   # con inotify, revisión de respaldo por si se perdió algún evento
+ESPERA = 0.5    # segundos sin eventos antes de recargar (Excel y OneDrive escriben en varios pasos)
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_EVENTO = struct.Struct('iIII')  # wd, mask, cookie, len
+
+_hilo = None
+
+
+class _Inotify:
+    """Eventos de inotify de unas carpetas, leídos con ctypes"""
+
+    def __init__(self, carpetas):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        mascara = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        for carpeta in carpetas:
+            if libc.inotify_add_watch(self.fd, os.fsencode(carpeta), mascara) < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f'inotify_add_watch {carpeta}')
+
+    def nombres(self, espera):
+        """Nombres de los archivos con eventos dentro de `espera` segundos (vacío si no hubo)"""
+        listos, _, _ = select.select([self.fd], [], [], espera)
+        if not listos:
+            return set()
+        try:
+            datos = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        nombres = set()
+        posicion = 0
+        while posicion + _EVENTO.size <= len(datos):
+            largo = _EVENTO.unpack_from(datos, posicion)[3]
+            inicio = posicion + _EVENTO.size
+            nombres.add(os.fsdecode(datos[inicio:inicio + largo].rstrip(b'\0')))
+            posicion = inicio + largo
+        return nombres
+
+
+def _abrir_inotify(rutas):
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return _Inotify({os.path.dirname(os.path.abspath(ruta)) for ruta in rutas})
+    except (OSError, AttributeError) as e:
+        print(f"Error al iniciar inotify, se revisará el Excel cada {INTERVALO} s: {e}")
+        return None
+
+
+def _vigilar():
+    rutas = libros.rutas()
+    nombres = {os.path.basename(ruta) for ruta in rutas}
+    inotify = _abrir_inotify(rutas)
+
+    reintentar = False
+    while True:
+        if inotify is None:
+            time.sleep(INTERVALO)
+        elif nombres & inotify.nombres(INTERVALO if reintentar else REVISION):
+            # Se espera a que terminen de escribir el archivo antes de leerlo
+            while nombres & inotify.nombres(ESPERA):
+                pass
+
+        reintentar = False
+        for ruta in rutas:
+            try:
+                if indices.recargar(ruta):
+                    print(f"Excel modificado por fuera de la aplicación, recargado: {ruta}")
+            except Exception as e:
+                # Puede estar a medio escribir; se intenta de nuevo en la próxima revisión
+                print(f"Error al recargar {ruta}: {e}")
+                reintentar = True
+
+
+def iniciar():
+    """Arranca el vigilante (una sola vez por proceso)"""
+    global _hilo
+    if _hilo is not None or not VIGILAR_EXCEL:
+        return
+    indices.activar_vigilancia()
+    _hilo = threading.Thread(target=_vigilar, name='vigilante-excel', daemon=True)
+    _hilo.start()
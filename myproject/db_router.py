@@ -1,14 +1,28 @@
 class MultiDBRouter:
+    """
+    Lecturas de los modelos de la aplicación a la réplica de lectura.
+
+    Las tablas de excelapp en la base 'lectura' son una copia de las hojas
+    del Excel (ver excelapp/replica.py); el resto de las apps (sesiones,
+    usuarios, admin) vive solo en 'default'.
+    """
+
+    def _replica(self, model):
+        from django.conf import settings
+        return model._meta.app_label == 'excelapp' and 'lectura' in settings.DATABASES
+
     def db_for_write(self, model, **hints):
-        # Por defecto escribe en SQLite
+        # Por defecto escribe en SQLite; la réplica solo la escribe replica.py con using('lectura')
         return 'default'
 
     def db_for_read(self, model, **hints):
-        return 'default'
+        return 'lectura' if self._replica(model) else 'default'
 
     def allow_relation(self, obj1, obj2, **hints):
         return True
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        # Migrar todas las apps a ambas bases
+        # La réplica solo tiene las tablas de la aplicación
+        if db == 'lectura':
+            return app_label == 'excelapp'
         return True
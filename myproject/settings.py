@@ -30,6 +30,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'excelapp.middleware.VersionExcelMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
@@ -45,6 +46,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'excelapp.context_processors.escrituras_pendientes',
             ],
         },
     },
@@ -58,8 +60,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Réplica de lectura de las hojas del Excel (ver excelapp/replica.py); WAL para
+    # que las consultas no esperen a la copia de una hoja
+    'lectura': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL;'},
+    },
 }
+DATABASE_ROUTERS = ['myproject.db_router.MultiDBRouter']
 
 LANGUAGE_CODE = 'es'
 TIME_ZONE = 'America/Bogota'
@@ -70,4 +80,41 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-RUTA_EXCEL = os.path.join(BASE_DIR, 'FinancieroG.xlsx')
\ No newline at end of file
+RUTA_EXCEL = os.path.join(BASE_DIR, 'FinancieroG.xlsx')
+
+# 'unico': todas las hojas en RUTA_EXCEL; 'por_entidad': un archivo por entidad
+# junto a RUTA_EXCEL (ver excelapp/libros.py y el comando `libro separar`)
+DISPOSICION_EXCEL = 'unico'
+
+# Lector de las hojas: 'openpyxl' o 'liviano' (ver excelapp/lector.py y el
+# comando `comparar_lector`, que verifica que ambos den las mismas filas)
+LECTOR_EXCEL = 'openpyxl'
+
+# Copia en disco (<libro>.cache) de las hojas ya leídas y sus índices, para que
+# después de reiniciar no haya que volver a leer el Excel (ver excelapp/cache_disco.py)
+CACHE_EN_DISCO = True
+
+# Vigilante de cambios externos al Excel (Excel abierto a mano, OneDrive): recarga
+# en segundo plano; sin inotify revisa cada INTERVALO_VIGILANCIA segundos
+VIGILAR_EXCEL = True
+INTERVALO_VIGILANCIA = 2
+
+# Calentamiento al arrancar: lee las hojas, arma índices y agregados y renderiza
+# el inicio en segundo plano; el avance se consulta en /listo/ (ver excelapp/calentamiento.py)
+CALENTAR_AL_ARRANCAR = False
+
+# Cola de escritura: cambios que no se pudieron guardar porque el Excel estaba
+# abierto o bloqueado; se reintentan en segundo plano (ver excelapp/pendientes.py)
+RUTA_PENDIENTES = os.path.join(BASE_DIR, 'pendientes')
+
+# Diario de cambios por registro de cada hoja, solo se le agregan líneas (ver excelapp/diario.py)
+RUTA_DIARIO = os.path.join(BASE_DIR, 'diario')
+
+# Respaldos incrementales (ver excelapp/respaldo.py)
+RUTA_RESPALDOS = os.path.join(BASE_DIR, 'respaldos')
+
+# Cierres mensuales (ver excelapp/cierres.py)
+RUTA_CIERRES = os.path.join(BASE_DIR, 'cierres')
+
+# Libros de archivo de los años cerrados (ver excelapp/archivo.py)
+RUTA_ARCHIVO = os.path.join(BASE_DIR, 'archivo')
@@ -14,3 +14,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'excelapp.settings')
 
 application = get_wsgi_application()
+
+# Recarga en segundo plano el Excel cuando se edita por fuera de la aplicación (ver excelapp/vigilante.py)
+from excelapp import vigilante  # noqa: E402
+
+vigilante.iniciar()
+
+# Retoma la escritura de los cambios que quedaron pendientes (ver excelapp/pendientes.py)
+from excelapp import pendientes  # noqa: E402
+
+pendientes.iniciar()
+
+# Pone al día la réplica de lectura de las hojas (ver excelapp/replica.py)
+from excelapp import replica  # noqa: E402
+
+replica.iniciar()